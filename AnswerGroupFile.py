@@ -1,5 +1,9 @@
 
-from typing import Generic, TypeVar, List, Optional, Any
+from typing import Generic, TypeVar, List, Optional, Any, Dict, Sequence, Iterator
+
+import numpy as np
+
+NO_LABEL = -1  # the label code for an AnswerGroupTable row that hasn't been labeled.
 
 
 class AnswerGroup():
@@ -10,6 +14,8 @@ class AnswerGroup():
     It might also have a "Label" - used by the computer to train this table and/or to check correctness. But for a
         simple recommendation for a user input, this isn't needed.
     """
+    __slots__ = ("answers", "label")
+
     def __init__(self, question_name_list: List[str], answer_list: List[Any], label: Optional[str] = None):
         self.answers = {}
 
@@ -39,6 +45,127 @@ class AnswerGroup():
         return result
 
 
+class AnswerGroupTable:
+    """
+    An "AnswerGroupTable" holds many AnswerGroups' worth of data at once, as columns: one NumPy array per attribute, and
+    one array of small-integer label codes (the position of each row's label in label_names, or NO_LABEL). This takes a
+    few bytes per row, rather than a dictionary and a Python object per row.
+
+    table[i] gives a lightweight AnswerGroupRow that reads from (and writes labels into) the table, and that can be
+    used anywhere an AnswerGroup can - with Conditions, Nodes and DecisionTree.predict.
+    """
+    def __init__(self,
+                 columns: Dict[str, np.ndarray],
+                 label_codes: Optional[np.ndarray] = None,
+                 label_names: Optional[Sequence[str]] = None):
+        """
+        :param columns: the values for each attribute, one array per attribute, all the same length
+        :param label_codes: the label code of each row; if not given, the rows are unlabeled.
+        :param label_names: the label that each label code stands for
+        """
+        self.columns = columns
+        num_rows = len(next(iter(columns.values()))) if len(columns) > 0 else 0
+        if label_codes is None:
+            label_codes = np.full(num_rows, NO_LABEL, dtype=np.int8)
+        self.label_codes = label_codes
+        self.label_names: List[str] = list(label_names) if label_names is not None else []
+
+    @classmethod
+    def from_answer_groups(cls,
+                           groups: List[AnswerGroup],
+                           question_name_list: Sequence[str],
+                           label_names: Optional[Sequence[str]] = None) -> "AnswerGroupTable":
+        """
+        copies a list of AnswerGroups into a new table.
+        :param groups: the AnswerGroups to copy
+        :param question_name_list: the attributes to copy
+        :param label_names: the labels to expect, in order. (Any others we find are added to the end.)
+        :return: the new table
+        """
+        label_names = list(label_names) if label_names is not None else []
+        columns = {name: np.array([ag.get_attribute_for_name(name) for ag in groups]) for name in question_name_list}
+        table = cls(columns, label_names=label_names)
+        for i, ag in enumerate(groups):
+            table.set_label_for_row(i, ag.get_label())
+        return table
+
+    def __len__(self):
+        return len(self.label_codes)
+
+    def __getitem__(self, row: int) -> "AnswerGroupRow":
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(f"Row {row} is out of range for a table with {len(self)} rows.")
+        return AnswerGroupRow(self, row)
+
+    def __iter__(self) -> Iterator["AnswerGroupRow"]:
+        for row in range(len(self)):
+            yield AnswerGroupRow(self, row)
+
+    def label_code_for(self, label: Optional[str]) -> int:
+        """
+        :param label: a label, or None for "unlabeled"
+        :return: the code for that label, adding it to label_names if it is new.
+        """
+        if label is None:
+            return NO_LABEL
+        if label not in self.label_names:
+            self.label_names.append(label)
+        return self.label_names.index(label)
+
+    def get_label_for_row(self, row: int) -> Optional[str]:
+        code = self.label_codes[row]
+        if code == NO_LABEL:
+            return None
+        return self.label_names[code]
+
+    def set_label_for_row(self, row: int, label: Optional[str]):
+        self.label_codes[row] = self.label_code_for(label)
+
+    def labels(self) -> List[Optional[str]]:
+        """
+        :return: the label of every row, as strings (or None, for unlabeled rows).
+        """
+        names = np.array(self.label_names + [None], dtype=object)
+        return list(names[self.label_codes])  # (NO_LABEL = -1 picks out the None at the end.)
+
+    def as_array(self, question_name_list: Sequence[str]) -> np.ndarray:
+        """
+        :param question_name_list: the attributes we want, in order
+        :return: an (N, number of attributes) array, with one column per attribute - e.g., for predict_batch.
+        """
+        return np.column_stack([self.columns[name] for name in question_name_list])
+
+
+class AnswerGroupRow():
+    """
+    one row of an AnswerGroupTable, which behaves like an AnswerGroup without holding any data of its own.
+    """
+    __slots__ = ("table", "row")
+
+    def __init__(self, table: AnswerGroupTable, row: int):
+        self.table = table
+        self.row = row
+
+    def get_attribute_for_name(self, name: str):
+        return self.table.columns[name][self.row].item()
+
+    def get_label(self) -> Optional[str]:
+        return self.table.get_label_for_row(self.row)
+
+    def set_label(self, label: str):
+        self.table.set_label_for_row(self.row, label)
+
+    def __repr__(self):
+        result = ""
+        for key in self.table.columns.keys():
+            result += f"{key}:{self.get_attribute_for_name(key)}\t"
+        if self.get_label() is not None:
+            result += f"--> [{self.get_label()}]"
+        return result
+
+
 # test code. Run this particular file to see it work.
 if __name__=="__main__":
     ag_demo = AnswerGroup(question_name_list=["A","B","C"], answer_list=[0,1,2], label="*")
@@ -0,0 +1,279 @@
+"""
+times building and predicting with DecisionTrees over a range of data sizes and tree settings, and writes the results
+as JSON, so that we can see how the code scales and notice when a change makes it slower. Run it with, e.g.,
+
+    python BenchmarkMain.py --output results.json
+    python BenchmarkMain.py --baseline results.json        (exits with 1 if anything got slower than --tolerance)
+
+The data comes from a made-up map (see make_benchmark_map), so no window or image file is needed.
+"""
+import argparse
+import contextlib
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import DecisionTree as decision_tree_module
+from DecisionTree import DecisionTree
+from DecisionTree3Main import generate_N_data_table
+
+MAP_WIDTH = 800
+MAP_HEIGHT = 600
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+DEFAULT_MAX_DEPTHS = [10, 25]
+DEFAULT_DIVISIONS = [5, 9]
+DEFAULT_SPLITTERS = ["grid", "histogram", "summed_area"]
+PREDICT_ONE_SAMPLE_SIZE = 10_000  # predicting one point at a time is slow, so we only time this many points.
+DEFAULT_TOLERANCE = 0.25  # a result is a regression if its throughput is this fraction below the baseline's.
+
+
+def make_benchmark_map(width: int = MAP_WIDTH, height: int = MAP_HEIGHT) -> np.ndarray:
+    """
+    draws a made-up map in the same format as "land&water desaturated.png" - water is the pixels whose blue channel is
+    above DecisionTree3Main.WATER_THRESHOLD. It has a round lake, an island in the lake, and a wavy coastline, so that
+    trees have some real work to do.
+    :return: a (height, width, 3) uint8 image.
+    """
+    y, x = np.mgrid[0:height, 0:width]
+    in_lake = (x - 0.3 * width) ** 2 + (y - 0.45 * height) ** 2 < (0.15 * width) ** 2
+    on_island = (x - 0.32 * width) ** 2 + (y - 0.42 * height) ** 2 < (0.04 * width) ** 2
+    in_sea = y > 0.65 * height + 0.08 * height * np.sin(x / (0.04 * width)) + 0.03 * height * np.sin(x / (0.011 * width))
+    is_water = (in_lake & ~on_island) | in_sea
+    image = np.full((height, width, 3), 64, dtype=np.uint8)
+    image[is_water, 0] = 255
+    return image
+
+
+@contextlib.contextmanager
+def tree_settings(max_depth: int, max_divisions: int) -> Iterator[None]:
+    """
+    temporarily changes DecisionTree's MAX_DEPTH and MAX_DIVISIONS_PER_RANGE.
+    """
+    old_settings = (decision_tree_module.MAX_DEPTH, decision_tree_module.MAX_DIVISIONS_PER_RANGE)
+    decision_tree_module.MAX_DEPTH = max_depth
+    decision_tree_module.MAX_DIVISIONS_PER_RANGE = max_divisions
+    try:
+        yield
+    finally:
+        decision_tree_module.MAX_DEPTH, decision_tree_module.MAX_DIVISIONS_PER_RANGE = old_settings
+
+
+def time_operation(operation: Callable[[], Any], repeats: int, measure_memory: bool) -> Tuple[float, Optional[int], Any]:
+    """
+    runs operation repeats times and keeps the fastest time (the one least disturbed by whatever else the machine is
+    doing). Memory is measured on one extra run, since tracemalloc slows everything down.
+    :return: the fastest time in seconds, the peak memory allocated in bytes (or None), and the last result.
+    """
+    best_seconds = float("inf")
+    result = None
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        result = operation()
+        best_seconds = min(best_seconds, time.perf_counter() - start_time)
+    peak_bytes = None
+    if measure_memory:
+        tracemalloc.start()
+        try:
+            operation()
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return best_seconds, peak_bytes, result
+
+
+def benchmark_case(N: int,
+                   max_depth: int,
+                   max_divisions: int,
+                   splitter: str,
+                   map_image: np.ndarray,
+                   repeats: int,
+                   measure_memory: bool,
+                   seed: int) -> List[Dict[str, Any]]:
+    """
+    builds a tree from N points with these settings, and times each of the ways it can predict.
+    :return: one result per operation.
+    """
+    training_data, _ = generate_N_data_table(N, label_data=True, rng=seed, map_image=map_image)
+    testing_data, _ = generate_N_data_table(N, label_data=False, rng=seed + 1, map_image=map_image)
+    testing_array = testing_data.as_array(["x", "y"])
+    sample = [testing_data[i] for i in range(min(N, PREDICT_ONE_SAMPLE_SIZE))]
+    bounds = (0, 0, map_image.shape[1], map_image.shape[0])
+    tree = DecisionTree()
+
+    def build():
+        tree.build_tree(training_data, bounds, splitter=splitter)
+
+    def predict_one_at_a_time():
+        for answer_group in sample:
+            tree.predict(answer_group)
+
+    def predict_batch():
+        tree.predict_batch(testing_array)
+
+    def predict_raster():
+        tree.predict_raster(map_image.shape[1], map_image.shape[0])
+
+    def enable_raster_lookup():
+        tree.decision_tree_root = tree.decision_tree_root  # (throws away the old lookup, so we time building one.)
+        tree.enable_raster_lookup(map_image.shape[1], map_image.shape[0])
+
+    # (name, operation, how many points it handles). The order matters: the raster lookup, once made, is used by
+    # predict and predict_batch, so those come first.
+    operations = [("build_tree", build, N),
+                  ("predict", predict_one_at_a_time, len(sample)),
+                  ("predict_batch", predict_batch, N),
+                  ("predict_raster", predict_raster, map_image.shape[0] * map_image.shape[1]),
+                  ("enable_raster_lookup", enable_raster_lookup, map_image.shape[0] * map_image.shape[1]),
+                  ("predict_batch_raster_lookup", predict_batch, N)]
+    results: List[Dict[str, Any]] = []
+    with tree_settings(max_depth, max_divisions):
+        for name, operation, num_items in operations:
+            seconds, peak_bytes, _ = time_operation(operation, repeats, measure_memory)
+            results.append({"operation": name,
+                            "splitter": splitter,
+                            "N": N,
+                            "max_depth": max_depth,
+                            "max_divisions": max_divisions,
+                            "items": num_items,
+                            "seconds": seconds,
+                            "items_per_second": num_items / seconds if seconds > 0 else float("inf"),
+                            "peak_bytes": peak_bytes,
+                            "num_nodes": len(tree.compile()),
+                            "max_depth_used": tree.max_depth_used})
+    return results
+
+
+def result_key(result: Dict[str, Any]) -> Tuple:
+    """
+    :return: what identifies a result, so that we can match it with the same result in another run.
+    """
+    return result["operation"], result["splitter"], result["N"], result["max_depth"], result["max_divisions"]
+
+
+def scaling_curves(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    for each operation and group of settings, fits seconds ~ N ** exponent across the data sizes. An exponent near 1
+    means the time grows in proportion to N; near 0 means it hardly depends on N.
+    :return: one curve per operation and group of settings, with its points and exponent.
+    """
+    curves: Dict[Tuple, List[Tuple[int, float]]] = {}
+    for result in results:
+        operation, splitter, N, max_depth, max_divisions = result_key(result)
+        curves.setdefault((operation, splitter, max_depth, max_divisions), []).append((N, result["seconds"]))
+    output: List[Dict[str, Any]] = []
+    for (operation, splitter, max_depth, max_divisions), points in curves.items():
+        points.sort()
+        exponent = None
+        if len(points) > 1 and all(seconds > 0 for _, seconds in points):
+            exponent = float(np.polyfit(np.log([N for N, _ in points]), np.log([s for _, s in points]), 1)[0])
+        output.append({"operation": operation,
+                       "splitter": splitter,
+                       "max_depth": max_depth,
+                       "max_divisions": max_divisions,
+                       "points": points,
+                       "exponent": exponent})
+    return output
+
+
+def find_regressions(results: List[Dict[str, Any]],
+                     baseline_results: List[Dict[str, Any]],
+                     tolerance: float) -> List[Dict[str, Any]]:
+    """
+    :param results: this run's results
+    :param baseline_results: the results of an earlier run to compare against
+    :param tolerance: how far below the baseline's throughput a result may fall before we call it a regression
+    :return: the results that got slower, with their baseline throughput and how much slower they got.
+    """
+    baseline = {result_key(result): result for result in baseline_results}
+    regressions: List[Dict[str, Any]] = []
+    for result in results:
+        old_result = baseline.get(result_key(result))
+        if old_result is None:
+            continue
+        ratio = result["items_per_second"] / old_result["items_per_second"]
+        if ratio < 1 - tolerance:
+            regressions.append({**result,
+                                "baseline_items_per_second": old_result["items_per_second"],
+                                "throughput_ratio": ratio})
+    return regressions
+
+
+def run_benchmarks(sizes: List[int],
+                   max_depths: List[int],
+                   divisions: List[int],
+                   splitters: List[str],
+                   repeats: int = 3,
+                   measure_memory: bool = True,
+                   seed: int = 0,
+                   log: Callable[[str], None] = print) -> Dict[str, Any]:
+    """
+    runs every combination of the given sizes and settings.
+    :return: the report - the environment, the settings, every result, and the scaling curves.
+    """
+    map_image = make_benchmark_map()
+    results: List[Dict[str, Any]] = []
+    for splitter in splitters:
+        for max_depth in max_depths:
+            for max_divisions in divisions:
+                for N in sizes:
+                    log(f"Benchmarking N={N}, splitter={splitter}, MAX_DEPTH={max_depth}, "
+                        f"MAX_DIVISIONS_PER_RANGE={max_divisions}...")
+                    results += benchmark_case(N, max_depth, max_divisions, splitter, map_image, repeats,
+                                              measure_memory, seed)
+    return {"environment": {"python": sys.version,
+                            "numpy": np.__version__,
+                            "platform": platform.platform(),
+                            "processor": platform.processor()},
+            "settings": {"sizes": sizes,
+                         "max_depths": max_depths,
+                         "divisions": divisions,
+                         "splitters": splitters,
+                         "repeats": repeats,
+                         "seed": seed},
+            "results": results,
+            "scaling": scaling_curves(results)}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark DecisionTree building and prediction.")
+    parser.add_argument("--sizes", type=lambda s: int(float(s)), nargs="+", default=DEFAULT_SIZES,
+                        help="the numbers of training points to try (e.g., 1e3 1e5)")
+    parser.add_argument("--max-depths", type=int, nargs="+", default=DEFAULT_MAX_DEPTHS)
+    parser.add_argument("--divisions", type=int, nargs="+", default=DEFAULT_DIVISIONS,
+                        help="values of MAX_DIVISIONS_PER_RANGE to try")
+    parser.add_argument("--splitters", nargs="+", default=DEFAULT_SPLITTERS)
+    parser.add_argument("--repeats", type=int, default=3, help="how many times to time each operation (best is kept)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the (slow) peak memory measurements")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="where to write the JSON report (default: print it)")
+    parser.add_argument("--baseline", help="a JSON report from an earlier run to check for regressions against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.sizes, args.max_depths, args.divisions, args.splitters, args.repeats,
+                            not args.no_memory, args.seed, log=lambda message: print(message, file=sys.stderr))
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            report["regressions"] = find_regressions(report["results"], json.load(baseline_file)["results"],
+                                                     args.tolerance)
+        for regression in report["regressions"]:
+            print(f"REGRESSION: {regression['operation']} ({regression['splitter']}, N={regression['N']}, "
+                  f"MAX_DEPTH={regression['max_depth']}, MAX_DIVISIONS_PER_RANGE={regression['max_divisions']}) ran at "
+                  f"{100 * regression['throughput_ratio']:3.1f}% of the baseline's speed.", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, "w") as output_file:
+            output_file.write(text)
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
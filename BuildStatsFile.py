@@ -0,0 +1,137 @@
+from typing import Callable, Dict, List, Optional
+
+
+class NodeStats:
+    """
+    what happened when the builder made one node of the tree.
+    """
+    __slots__ = ("depth", "num_items", "is_leaf", "scoring_seconds", "partition_seconds", "gini_index")
+
+    def __init__(self,
+                 depth: int,
+                 num_items: int,
+                 is_leaf: bool,
+                 scoring_seconds: float,
+                 partition_seconds: float = 0.0,
+                 gini_index: Optional[float] = None):
+        """
+        :param depth: the depth of the node in the tree
+        :param num_items: how many AnswerGroups reached the node
+        :param is_leaf: whether the node became a LeafNode (otherwise it is a BranchNode)
+        :param scoring_seconds: time spent counting labels and scoring the candidate conditions
+        :param partition_seconds: time spent splitting the node's rows between its children (0 for a leaf)
+        :param gini_index: the Gini index of the chosen condition (None for a leaf)
+        """
+        self.depth = depth
+        self.num_items = num_items
+        self.is_leaf = is_leaf
+        self.scoring_seconds = scoring_seconds
+        self.partition_seconds = partition_seconds
+        self.gini_index = gini_index
+
+    def __repr__(self):
+        kind = "leaf" if self.is_leaf else f"branch (gini {self.gini_index:3.3f})"
+        return f"{kind} at depth {self.depth}, N={self.num_items}, scoring {self.scoring_seconds:0.6f}s, " \
+               f"partitioning {self.partition_seconds:0.6f}s"
+
+
+class DepthSummary:
+    """
+    totals for all the nodes at one depth of the tree.
+    """
+    def __init__(self, depth: int):
+        self.depth = depth
+        self.num_branches = 0
+        self.num_leaves = 0
+        self.num_items = 0
+        self.scoring_seconds = 0.0
+        self.partition_seconds = 0.0
+        self.gini_index_total = 0.0
+
+    def add(self, node_stats: NodeStats):
+        if node_stats.is_leaf:
+            self.num_leaves += 1
+        else:
+            self.num_branches += 1
+            self.gini_index_total += node_stats.gini_index
+        self.num_items += node_stats.num_items
+        self.scoring_seconds += node_stats.scoring_seconds
+        self.partition_seconds += node_stats.partition_seconds
+
+    @property
+    def mean_gini_index(self) -> Optional[float]:
+        """
+        :return: the average Gini index of the conditions chosen at this depth, or None if there are no branches here.
+        """
+        return None if self.num_branches == 0 else self.gini_index_total / self.num_branches
+
+
+class BuildStats:
+    """
+    collects a NodeStats for every node made while building a tree, so that we can see where the training time goes.
+    Pass one to DecisionTree.build_tree; when it is left out, the builder does no timing or record-keeping at all.
+
+        stats = BuildStats()
+        tree.build_tree(training_data, bounds, stats=stats)
+        print(stats.report())
+    """
+    def __init__(self, on_node: Optional[Callable[[NodeStats], None]] = None):
+        """
+        :param on_node: optional - called with each NodeStats as it is recorded (e.g., print, to watch the build).
+        """
+        self.on_node = on_node
+        self.nodes: List[NodeStats] = []
+        self.num_training_items = 0
+        self.total_seconds = 0.0
+
+    def record(self, node_stats: NodeStats):
+        self.nodes.append(node_stats)
+        if self.on_node is not None:
+            self.on_node(node_stats)
+
+    def merge(self, other: "BuildStats"):
+        """
+        adds the nodes recorded by another BuildStats (e.g., one filled in by a worker process building a subtree).
+        """
+        for node_stats in other.nodes:
+            self.record(node_stats)
+
+    def for_worker(self) -> "BuildStats":
+        """
+        :return: an empty BuildStats to send to a worker process. (on_node stays here - it's called when we merge.)
+        """
+        return BuildStats()
+
+    def summary_by_depth(self) -> List[DepthSummary]:
+        """
+        :return: one DepthSummary per depth of the tree, from the root down.
+        """
+        summaries: Dict[int, DepthSummary] = {}
+        for node_stats in self.nodes:
+            if node_stats.depth not in summaries:
+                summaries[node_stats.depth] = DepthSummary(node_stats.depth)
+            summaries[node_stats.depth].add(node_stats)
+        return [summaries[depth] for depth in sorted(summaries)]
+
+    @property
+    def scoring_seconds(self) -> float:
+        return sum(node_stats.scoring_seconds for node_stats in self.nodes)
+
+    @property
+    def partition_seconds(self) -> float:
+        return sum(node_stats.partition_seconds for node_stats in self.nodes)
+
+    def report(self) -> str:
+        """
+        :return: a table of the per-depth summaries, with the overall totals, ready to print.
+        """
+        lines = [f"Built a tree of {len(self.nodes)} nodes from {self.num_training_items} data points in "
+                 f"{self.total_seconds:0.6f} seconds ({self.scoring_seconds:0.6f} scoring, "
+                 f"{self.partition_seconds:0.6f} partitioning).",
+                 f"{'depth':>5} {'branches':>8} {'leaves':>6} {'N':>9} {'scoring s':>10} {'partition s':>11} "
+                 f"{'mean gini':>9}"]
+        for summary in self.summary_by_depth():
+            mean_gini = "" if summary.mean_gini_index is None else f"{summary.mean_gini_index:0.3f}"
+            lines.append(f"{summary.depth:>5} {summary.num_branches:>8} {summary.num_leaves:>6} {summary.num_items:>9} "
+                         f"{summary.scoring_seconds:>10.6f} {summary.partition_seconds:>11.6f} {mean_gini:>9}")
+        return "\n".join(lines)
@@ -0,0 +1,444 @@
+import json
+import struct
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from AnswerGroupFile import AnswerGroup, AnswerGroupTable
+
+from ConditionFile import NumericCondition, CategoryCondition
+from NodeFile import GenericNode, BranchNode, LeafNode
+
+NO_FEATURE = -1  # the "feature" stored for a leaf, which asks no question.
+NO_CHILD = -1  # the "child" stored for a leaf, which has no children.
+
+FILE_MAGIC = b"DTREE01\n"  # the first bytes of every saved tree file, so we can tell it's one of ours.
+FILE_ALIGNMENT = 64  # each array in a saved file starts at a multiple of this many bytes.
+NODE_ARRAY_NAMES = ["feature", "threshold", "yes_child", "no_child", "leaf_label", "asks_equal"]
+
+
+class CompiledTree:
+    """
+    A "CompiledTree" is a trained tree flattened into parallel NumPy arrays, one entry per node:
+        feature[i]    - which column of the input node i asks about (NO_FEATURE for a leaf)
+        threshold[i]  - node i asks "is feature > threshold?"
+        yes_child[i]  - the node to go to if the answer is yes (NO_CHILD for a leaf)
+        no_child[i]   - the node to go to if the answer is no (NO_CHILD for a leaf)
+        leaf_label[i] - for a leaf, the position of its label in label_names (-1 for a branch)
+        asks_equal[i] - True if node i asks "is feature == threshold?" instead - i.e., it came from a CategoryCondition,
+                        and threshold is the position of the category in categories[feature name].
+    Categorical features are given to the tree as those category positions (see as_array). Node 0 is the root.
+
+    Because every node lives in the same few arrays, we can move a whole batch of points down the tree together, one
+    level at a time, rather than walking BranchNode objects one point at a time.
+    """
+    def __init__(self,
+                 feature: np.ndarray,
+                 threshold: np.ndarray,
+                 yes_child: np.ndarray,
+                 no_child: np.ndarray,
+                 leaf_label: np.ndarray,
+                 feature_names: Sequence[str],
+                 label_names: Sequence[str],
+                 asks_equal: Optional[np.ndarray] = None,
+                 categories: Optional[Dict[str, List[str]]] = None):
+        self.feature = feature
+        self.threshold = threshold
+        self.yes_child = yes_child
+        self.no_child = no_child
+        self.leaf_label = leaf_label
+        self.asks_equal = asks_equal if asks_equal is not None else np.zeros(len(feature), dtype=bool)
+        self.has_category_questions = bool(np.any(self.asks_equal))  # (if not, we can skip checking asks_equal.)
+        self.feature_names = list(feature_names)
+        self.label_names = list(label_names)
+        self.categories: Dict[str, List[str]] = categories if categories is not None else {}
+
+    @classmethod
+    def from_node(cls,
+                  root: GenericNode,
+                  feature_names: Sequence[str],
+                  label_names: Sequence[str],
+                  categories: Optional[Dict[str, List[str]]] = None) -> "CompiledTree":
+        """
+        flattens the tree that starts at root.
+        :param root: the root node of a trained tree, made of BranchNodes (with NumericConditions or
+        CategoryConditions) and LeafNodes
+        :param feature_names: the attribute names, in the order their columns will appear in the input to predict_batch
+        :param label_names: the labels we expect the leaves to hold. (Any others we find are added to the end.)
+        :param categories: for each categorical feature, its categories in order - their positions are what the tree
+        will be given. (Any others we find are added to the end.)
+        :return: the compiled version of the tree.
+        """
+        feature_names = list(feature_names)
+        label_names = list(label_names)
+        categories = {name: list(values) for name, values in (categories or {}).items()}
+        feature: List[int] = []
+        threshold: List[float] = []
+        yes_child: List[int] = []
+        no_child: List[int] = []
+        leaf_label: List[int] = []
+        asks_equal: List[bool] = []
+
+        # number the nodes in the order we reach them; each entry on the stack is a node, plus where to record its id.
+        to_visit = [(root, None, None)]
+        while len(to_visit) > 0:
+            node, parent_id, parent_list = to_visit.pop()
+            node_id = len(feature)
+            if parent_id is not None:
+                parent_list[parent_id] = node_id
+            if isinstance(node, BranchNode):
+                condition = node.my_condition
+                feature.append(feature_names.index(condition.attribute_name))
+                if isinstance(condition, NumericCondition):
+                    threshold.append(condition.threshold_value)
+                    asks_equal.append(False)
+                elif isinstance(condition, CategoryCondition):
+                    values = categories.setdefault(condition.attribute_name, [])
+                    if condition.value not in values:
+                        values.append(condition.value)
+                    threshold.append(values.index(condition.value))
+                    asks_equal.append(True)
+                else:
+                    raise TypeError(f"Can't compile the condition {condition}.")
+                yes_child.append(NO_CHILD)
+                no_child.append(NO_CHILD)
+                leaf_label.append(-1)
+                to_visit.append((node.__no_node__, node_id, no_child))
+                to_visit.append((node.__yes_node__, node_id, yes_child))
+            elif isinstance(node, LeafNode):
+                if node.my_label not in label_names:
+                    label_names.append(node.my_label)
+                feature.append(NO_FEATURE)
+                threshold.append(0.0)
+                yes_child.append(NO_CHILD)
+                no_child.append(NO_CHILD)
+                leaf_label.append(label_names.index(node.my_label))
+                asks_equal.append(False)
+            else:
+                raise TypeError(f"Can't compile a node of type {type(node).__name__}.")
+
+        return cls(feature=np.array(feature, dtype=np.int32),
+                   threshold=np.array(threshold, dtype=np.float64),
+                   yes_child=np.array(yes_child, dtype=np.int32),
+                   no_child=np.array(no_child, dtype=np.int32),
+                   leaf_label=np.array(leaf_label, dtype=np.int32),
+                   feature_names=feature_names,
+                   label_names=label_names,
+                   asks_equal=np.array(asks_equal, dtype=bool),
+                   categories=categories)
+
+    def __len__(self):
+        return len(self.feature)
+
+    @classmethod
+    def stack(cls, trees: Sequence["CompiledTree"]) -> Tuple["CompiledTree", np.ndarray]:
+        """
+        joins several compiled trees into one set of arrays, so that a whole forest can be walked together.
+        :param trees: CompiledTrees that all use the same feature_names (and categories)
+        :return: the joined CompiledTree, and the id of each original tree's root within it.
+        """
+        feature_names = trees[0].feature_names
+        label_names: List[str] = []
+        for tree in trees:
+            if tree.feature_names != feature_names or tree.categories != trees[0].categories:
+                raise ValueError("All the trees in a stack must use the same features.")
+            label_names += [name for name in tree.label_names if name not in label_names]
+
+        roots = np.zeros(len(trees), dtype=np.int32)
+        offset = 0
+        yes_children, no_children, leaf_labels = [], [], []
+        for i, tree in enumerate(trees):
+            roots[i] = offset
+            is_branch = tree.feature != NO_FEATURE
+            yes_children.append(np.where(is_branch, tree.yes_child + offset, NO_CHILD))
+            no_children.append(np.where(is_branch, tree.no_child + offset, NO_CHILD))
+            new_code = np.array([label_names.index(name) for name in tree.label_names] + [-1], dtype=np.int32)
+            leaf_labels.append(new_code[tree.leaf_label])  # (a branch's -1 picks out the -1 we added at the end.)
+            offset += len(tree)
+
+        stacked = cls(feature=np.concatenate([tree.feature for tree in trees]),
+                      threshold=np.concatenate([tree.threshold for tree in trees]),
+                      yes_child=np.concatenate(yes_children).astype(np.int32),
+                      no_child=np.concatenate(no_children).astype(np.int32),
+                      leaf_label=np.concatenate(leaf_labels).astype(np.int32),
+                      feature_names=feature_names,
+                      label_names=label_names,
+                      asks_equal=np.concatenate([tree.asks_equal for tree in trees]),
+                      categories=trees[0].categories)
+        return stacked, roots
+
+    def leaf_for_points(self, X: np.ndarray, roots: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        moves every point down the tree together. On each pass, every point that hasn't reached a leaf yet asks the
+        question at its current node and steps to the yes or no child, so the number of passes is the depth of the
+        deepest leaf reached, not the number of points.
+        :param X: an (N, number of features) array - one row per point, columns in feature_names order
+        :param roots: for a stacked forest, the ids of the roots to start from. If given, every point goes down every
+        one of these trees, all at the same time.
+        :return: the id of the leaf each point ends up in - an array of N ids, or a (number of roots, N) array if roots
+        were given.
+        """
+        X = np.asarray(X)
+        if roots is None:
+            node = np.zeros(len(X), dtype=np.int32)
+            row = np.arange(len(X))
+        else:
+            node = np.repeat(np.asarray(roots, dtype=np.int32), len(X))
+            row = np.tile(np.arange(len(X)), len(roots))
+        still_moving = np.arange(len(node))
+        while len(still_moving) > 0:
+            current = node[still_moving]
+            feature = self.feature[current]
+            at_branch = feature != NO_FEATURE
+            still_moving = still_moving[at_branch]
+            current = current[at_branch]
+            feature = feature[at_branch]
+            values = X[row[still_moving], feature]
+            if self.has_category_questions:
+                answer_is_yes = np.where(self.asks_equal[current],
+                                         values == self.threshold[current],
+                                         values > self.threshold[current])
+            else:
+                answer_is_yes = values > self.threshold[current]
+            node[still_moving] = np.where(answer_is_yes, self.yes_child[current], self.no_child[current])
+        if roots is None:
+            return node
+        return node.reshape(len(roots), len(X))
+
+    def predict_one(self, answer_group: AnswerGroup) -> str:
+        """
+        walks a single AnswerGroup down the tree, for when we don't have a batch.
+        :param answer_group: the instance of AnswerGroup for which we wish to predict
+        :return: the predicted label.
+        """
+        node = 0
+        while self.feature[node] != NO_FEATURE:
+            name = self.feature_names[self.feature[node]]
+            value = answer_group.get_attribute_for_name(name)
+            if self.asks_equal[node]:
+                answer_is_yes = value == self.categories[name][int(self.threshold[node])]
+            else:
+                answer_is_yes = value > self.threshold[node]
+            node = self.yes_child[node] if answer_is_yes else self.no_child[node]
+        return self.label_names[self.leaf_label[node]]
+
+    def as_array(self, table: AnswerGroupTable) -> np.ndarray:
+        """
+        gets the features from an AnswerGroupTable in the form the tree expects: one column per feature, in
+        feature_names order, with each categorical value replaced by its position in categories (or -1 for a value the
+        tree has never seen, which is never equal to anything).
+        :param table: the table of points
+        :return: an (N, number of features) array
+        """
+        columns = []
+        for name in self.feature_names:
+            column = table.columns[name]
+            if name in self.categories:
+                distinct_values, inverse = np.unique(column, return_inverse=True)
+                code_for_value = np.array([self.categories[name].index(value) if value in self.categories[name] else -1
+                                           for value in distinct_values.tolist()], dtype=np.float64)
+                column = code_for_value[inverse.reshape(-1)]
+            columns.append(column)
+        return np.column_stack(columns)
+
+    def to_node(self, node_id: int = 0, depth: int = 0) -> GenericNode:
+        """
+        rebuilds the BranchNode/LeafNode objects for the tree that starts at the given node.
+        :param node_id: the node to start from (0 for the root)
+        :param depth: the depth to give that node
+        :return: the rebuilt (sub)tree.
+        """
+        made: Dict[int, GenericNode] = {}
+        to_visit = [(node_id, depth)]
+        while len(to_visit) > 0:
+            current, current_depth = to_visit.pop()
+            if self.feature[current] == NO_FEATURE:
+                made[current] = LeafNode(self.label_names[self.leaf_label[current]], depth=current_depth)
+            elif self.asks_equal[current]:
+                name = self.feature_names[self.feature[current]]
+                made[current] = BranchNode(CategoryCondition(name, self.categories[name][int(self.threshold[current])]),
+                                           depth=current_depth)
+                to_visit.append((int(self.yes_child[current]), current_depth + 1))
+                to_visit.append((int(self.no_child[current]), current_depth + 1))
+            else:
+                threshold = self.threshold[current].item()
+                if threshold.is_integer():  # (the grid splitter's thresholds were whole numbers to begin with.)
+                    threshold = int(threshold)
+                made[current] = BranchNode(NumericCondition(self.feature_names[self.feature[current]], threshold),
+                                           depth=current_depth)
+                to_visit.append((int(self.yes_child[current]), current_depth + 1))
+                to_visit.append((int(self.no_child[current]), current_depth + 1))
+        for current, node in made.items():
+            if isinstance(node, BranchNode):
+                node.set_yes_node(made[int(self.yes_child[current])])
+                node.set_no_node(made[int(self.no_child[current])])
+        return made[node_id]
+
+    def paint_raster(self, width: int, height: int, root: int = 0) -> np.ndarray:
+        """
+        makes an image of the tree's predictions for every pixel of a width x height map, with (x, y) = (column, row).
+        Every question in the tree cuts along x or y, so each leaf covers a rectangle of the map (these are the
+        rectangles drawn on the debug canvas while building); we work out each leaf's rectangle and fill it in one go,
+        rather than predicting every pixel separately.
+        :param width: the width of the map, in pixels
+        :param height: the height of the map, in pixels
+        :param root: the node to start from (0, unless this is a stack of trees)
+        :return: a (height, width) array holding the label code (position in label_names) predicted for each pixel.
+        """
+        if set(self.feature_names) != {"x", "y"}:
+            raise ValueError(f"Can only paint trees that ask about x and y, not {self.feature_names}.")
+        x_feature = self.feature_names.index("x")
+        raster = np.zeros((height, width), dtype=np.min_scalar_type(max(len(self.label_names) - 1, 0)))
+
+        # each entry is a node, and the rectangle of pixels it covers: [x_start, x_end) by [y_start, y_end).
+        to_visit = [(root, 0, 0, width, height)]
+        while len(to_visit) > 0:
+            node, x_start, y_start, x_end, y_end = to_visit.pop()
+            if x_start >= x_end or y_start >= y_end:
+                continue  # none of this node's points are on the map.
+            if self.feature[node] == NO_FEATURE:
+                raster[y_start:y_end, x_start:x_end] = self.leaf_label[node]
+                continue
+            # for whole-numbered pixels, "value > threshold" is the same as "value >= floor(threshold) + 1".
+            first_yes = int(np.floor(self.threshold[node])) + 1
+            if self.feature[node] == x_feature:
+                split = min(max(first_yes, x_start), x_end)
+                to_visit.append((self.no_child[node], x_start, y_start, split, y_end))
+                to_visit.append((self.yes_child[node], split, y_start, x_end, y_end))
+            else:
+                split = min(max(first_yes, y_start), y_end)
+                to_visit.append((self.no_child[node], x_start, y_start, x_end, split))
+                to_visit.append((self.yes_child[node], x_start, split, x_end, y_end))
+        return raster
+
+    def predict_codes(self, X: np.ndarray) -> np.ndarray:
+        """
+        :param X: an (N, number of features) array - one row per point, columns in feature_names order
+        :return: the predicted label code (position in label_names) for each point.
+        """
+        return self.leaf_label[self.leaf_for_points(X)]
+
+    def predict_batch(self, X: np.ndarray) -> np.ndarray:
+        """
+        :param X: an (N, number of features) array - one row per point, columns in feature_names order
+        :return: an array with the predicted label (e.g., "land" or "water") for each point.
+        """
+        return np.array(self.label_names)[self.predict_codes(X)]
+
+
+def save_compiled_tree(path: str,
+                       tree: CompiledTree,
+                       roots: Optional[np.ndarray] = None,
+                       extra: Optional[Dict[str, Any]] = None):
+    """
+    writes a compiled tree (or a stack of them) to a compact binary file:
+        FILE_MAGIC, then the length of the header (8 bytes, little-endian), then the header - JSON with the feature
+        names, label names, categories, anything in extra, and where each array is - and then each node array's raw
+        bytes, each starting on a FILE_ALIGNMENT boundary so that it can be memory-mapped straight from the file.
+    :param path: where to write the file
+    :param tree: the tree to save
+    :param roots: for a stack of trees, the id of each tree's root.
+    :param extra: any other (JSON-friendly) information to keep with the tree
+    """
+    arrays = {name: np.ascontiguousarray(getattr(tree, name)) for name in NODE_ARRAY_NAMES}
+    arrays["roots"] = np.ascontiguousarray(roots if roots is not None else np.zeros(1), dtype=np.int32)
+
+    # work out where everything goes. The header's length depends on the offsets, which depend on the header's
+    # length, so we leave room for the header and then fill in the offsets.
+    header = {"feature_names": tree.feature_names, "label_names": tree.label_names, "categories": tree.categories,
+              "extra": extra or {}, "arrays": {}}
+    for name, array in arrays.items():
+        header["arrays"][name] = {"dtype": array.dtype.str, "length": len(array), "offset": 0}
+    header_room = len(json.dumps(header).encode()) + 32 * len(arrays)
+    offset = aligned(len(FILE_MAGIC) + 8 + header_room)
+    for name, array in arrays.items():
+        header["arrays"][name]["offset"] = offset
+        offset = aligned(offset + array.nbytes)
+    header_bytes = json.dumps(header).encode().ljust(header_room)
+
+    with open(path, "wb") as file:
+        file.write(FILE_MAGIC)
+        file.write(struct.pack("<Q", len(header_bytes)))
+        file.write(header_bytes)
+        for name, array in arrays.items():
+            file.seek(header["arrays"][name]["offset"])
+            file.write(array.tobytes())
+
+
+def load_compiled_tree(path: str, mmap: bool = True) -> Tuple[CompiledTree, np.ndarray, Dict[str, Any]]:
+    """
+    reads a file written by save_compiled_tree.
+    :param path: the file to read
+    :param mmap: if True, the node arrays are read-only views of the file (np.memmap) rather than copies, so they
+    take milliseconds to open, and every process that loads the same file shares one copy in memory.
+    :return: the tree, the id of each tree's root, and the extra information that was saved with it.
+    """
+    with open(path, "rb") as file:
+        if file.read(len(FILE_MAGIC)) != FILE_MAGIC:
+            raise ValueError(f"{path} is not a saved tree file.")
+        header_length = struct.unpack("<Q", file.read(8))[0]
+        header = json.loads(file.read(header_length).decode())
+
+    arrays: Dict[str, np.ndarray] = {}
+    for name, where in header["arrays"].items():
+        dtype = np.dtype(where["dtype"])
+        if mmap:
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=where["offset"], shape=(where["length"],))
+        else:
+            arrays[name] = np.fromfile(path, dtype=dtype, count=where["length"], offset=where["offset"])
+    roots = arrays.pop("roots")
+    tree = CompiledTree(feature_names=header["feature_names"], label_names=header["label_names"],
+                        categories=header.get("categories"), **arrays)
+    return tree, roots, header["extra"]
+
+
+def aligned(offset: int) -> int:
+    """
+    :return: the first multiple of FILE_ALIGNMENT at or after offset.
+    """
+    return -(-offset // FILE_ALIGNMENT) * FILE_ALIGNMENT
+
+
+class RasterLookup:
+    """
+    answers predictions by looking them up in a pre-painted raster of the whole map (see CompiledTree.paint_raster),
+    so each prediction is one array lookup, however deep the tree. Points that aren't whole-numbered pixels on the map
+    are handed to the compiled tree instead.
+    """
+    def __init__(self, tree: CompiledTree, width: int, height: int):
+        self.tree = tree
+        self.raster = tree.paint_raster(width, height)
+        self.x_feature = tree.feature_names.index("x")
+        self.y_feature = tree.feature_names.index("y")
+
+    def on_raster(self, x, y) -> np.ndarray|bool:
+        """
+        :return: whether the point(s) (x, y) are whole-numbered pixels within the raster.
+        """
+        return ((x == np.floor(x)) & (y == np.floor(y)) &
+                (x >= 0) & (y >= 0) & (x < self.raster.shape[1]) & (y < self.raster.shape[0]))
+
+    def predict(self, answer_group: AnswerGroup) -> str:
+        x = answer_group.get_attribute_for_name("x")
+        y = answer_group.get_attribute_for_name("y")
+        if not self.on_raster(x, y):
+            return self.tree.predict_one(answer_group)
+        return self.tree.label_names[self.raster[int(y), int(x)]]
+
+    def predict_codes(self, X: np.ndarray) -> np.ndarray:
+        """
+        :param X: an (N, number of features) array - one row per point, columns in the tree's feature_names order
+        :return: the predicted label code (position in label_names) for each point.
+        """
+        X = np.asarray(X)
+        x = X[:, self.x_feature]
+        y = X[:, self.y_feature]
+        inside = self.on_raster(x, y)
+        codes = np.empty(len(X), dtype=np.int32)
+        codes[inside] = self.raster[y[inside].astype(np.intp), x[inside].astype(np.intp)]
+        if not inside.all():
+            codes[~inside] = self.tree.predict_codes(X[~inside])
+        return codes
+
+    def predict_batch(self, X: np.ndarray) -> np.ndarray:
+        return np.array(self.tree.label_names)[self.predict_codes(X)]
@@ -1,40 +1,200 @@
+import copy
+import heapq
+import itertools
+import math
 import time
-from typing import Optional, List, Tuple, Dict
+import types
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Optional, List, Tuple, Dict, Callable, Iterator
 
 import cv2
 import numpy as np
 
-from AnswerGroupFile import AnswerGroup
-from ConditionFile import NumericCondition
+from AnswerGroupFile import AnswerGroup, AnswerGroupTable
+from BuildStatsFile import BuildStats, NodeStats
+from CompiledTreeFile import CompiledTree, RasterLookup, save_compiled_tree, load_compiled_tree
+from ConditionFile import GenericCondition, NumericCondition
+from EvaluationFile import EvaluationReport, evaluate, EVALUATION_CHUNK_SIZE
+from GeneratedCodeFile import generate_source, load_generated_module
 from NodeFile import GenericNode, BranchNode, LeafNode
+from PredictionCacheFile import PredictionCache, CacheStats
+from PruningFile import compute_pruning_sequence, prune_tree, best_alpha_for_validation
+from SplitEngineFile import ColumnarData, GenericSplitter, GridSplitter, SplitChoice, SPLITTERS, \
+    gini_coefficient_for_counts, gini_indices_for_splits, score_numeric_conditions, best_split_index, \
+    DEFAULT_ATTRIBUTE_NAMES, DEFAULT_LABEL_NAMES, MAP_ATTRIBUTE_NAMES
 
 MAX_DIVISIONS_PER_RANGE = 9
 MAX_DEPTH = 25
 MIN_ITEMS_PER_BRANCH_NODE = 3
 VERBOSE = True
+PARALLEL_MIN_ITEMS_PER_JOB = 5000  # subtrees with fewer AnswerGroups than this are built in the main process.
+GROWTH_ORDERS = ("depth_first", "best_first")
 
 class DecisionTree:
 
 
 
     def __init__(self):
-        self.decision_tree_root: Optional[GenericNode] = None
+        self.__root__: Optional[GenericNode] = None
+        self.compiled_tree: Optional[CompiledTree] = None
+        self.raster_lookup: Optional[RasterLookup] = None
+        self.prediction_cache: Optional[PredictionCache] = None  # see enable_prediction_cache.
         self.max_depth_used = 0
         self.debug_canvas: Optional[np.ndarray] = None
+        self.feature_names: List[str] = list(DEFAULT_ATTRIBUTE_NAMES)
+        self.label_names: List[str] = list(DEFAULT_LABEL_NAMES)
+        self.categories: Dict[str, List[str]] = {}  # the values of each categorical feature, in code order.
+        self.splitter_kind = "grid"
+        self.growth = "depth_first"
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.parallel_depth = 0
+        self.pending_subtrees: List[Tuple[Future, Callable[[GenericNode], None], np.ndarray]] = []
+        self.updatable = False  # whether build_tree keeps what update needs (see build_tree).
+        self.training_data: Optional[ColumnarData] = None  # kept so that update can rebuild parts of the tree.
+        self.bounds: Optional[Tuple[int, int, int, int]] = None
+        self.build_stats: Optional[BuildStats] = None  # only set while building, and only if we were given one.
+
+    @property
+    def decision_tree_root(self) -> Optional[GenericNode]:
+        return self.__root__
+
+    @decision_tree_root.setter
+    def decision_tree_root(self, root: Optional[GenericNode]):
+        """
+        replaces the tree. Anything we worked out from the old tree (like its compiled form, or cached predictions) is
+        thrown away.
+        """
+        self.__root__ = root
+        self.compiled_tree = None
+        self.raster_lookup = None
+        if self.prediction_cache is not None:
+            self.prediction_cache.clear()
 
     def build_tree(self,
-                   training_data: List[AnswerGroup],
+                   training_data: List[AnswerGroup]|AnswerGroupTable,
                    bounds: List[int]|Tuple[int, int, int, int],
-                   debug_canvas: np.ndarray = None):
+                   debug_canvas: np.ndarray = None,
+                   n_jobs: int = 1,
+                   splitter: str = "grid",
+                   stats: Optional[BuildStats] = None,
+                   growth: str = "depth_first",
+                   max_leaves: Optional[int] = None,
+                   max_nodes: Optional[int] = None,
+                   time_budget: Optional[float] = None,
+                   feature_names: Optional[List[str]] = None,
+                   updatable: bool = False):
+        """
+        builds the tree for the given training data.
+        :param training_data: a list (or AnswerGroupTable) of labeled AnswerGroups. There can be any number of labels;
+        the first ones are given codes in the order of self.label_names, and any others in the order we find them.
+        :param bounds: (x_min, y_min, x_max, y_max) - the part of the map the data comes from.
+        :param debug_canvas: an optional image to draw the leaves' rectangles on. (Drawing forces a serial build.)
+        :param n_jobs: how many processes to build subtrees in. With more than one, the top few levels are built here,
+        and then each subtree with at least PARALLEL_MIN_ITEMS_PER_JOB AnswerGroups is handed to a worker process. The
+        resulting tree is identical to the one built with n_jobs = 1.
+        :param splitter: how to find the conditions: "grid" tries up to MAX_DIVISIONS_PER_RANGE evenly spaced cuts
+        across each node's range in x and y; "exact" tries a cut between every pair of neighboring values in the data;
+        "histogram" sorts the values into at most MAX_HISTOGRAM_BINS bins once, and tries a cut between each pair of
+        neighboring bins. (Use "histogram" for very large datasets.) "summed_area" makes the same tree as "grid", for
+        data with just x and y, but scores each cut from a table of running label counts over the map, rather than from
+        the points (use it for dense data on a large map). Its nodes never look at their rows, so its leaves have no
+        sample_ids, and it always builds in this process.
+        :param stats: optional - a BuildStats to fill in with the depth, N, timings and Gini index of every node, and
+        the total build time.
+        :param growth: "depth_first" builds each node's whole "yes" subtree before its "no" subtree; "best_first" keeps
+        all the unfinished leaves in a priority queue and always splits the one whose split reduces the (weighted) Gini
+        impurity the most, so that the budgets below stop it with the most useful tree of that size. (With no budget,
+        both make the same tree. Best-first growth is always done in this process.)
+        :param max_leaves: best_first only - stop splitting once the tree has this many leaves.
+        :param max_nodes: best_first only - stop splitting once the tree has this many nodes (leaves and branches).
+        :param time_budget: best_first only - stop splitting after about this many seconds; the unfinished leaves just
+        become LeafNodes.
+        :param feature_names: the attributes to ask about (default: the tree's feature_names, i.e., ["x", "y"]). "x"
+        and "y" are map coordinates, and their conditions come from build_conditions_for_range; other numeric
+        attributes (e.g., "elevation") get conditions from build_conditions_for_values, and attributes whose values are
+        strings (e.g., "terrain") get a CategoryCondition for each of their values.
+        :param updatable: whether to keep what update needs - the training data, each leaf's sample_ids and each
+        BranchNode's candidate counts. (That is about as much memory again as the training data, so it is off unless
+        asked for.) Only trees built with the grid splitter, grown depth first, on just x and y can be updatable.
+        """
+        if splitter not in SPLITTERS:
+            raise ValueError(f"Unknown splitter \"{splitter}\" - expected one of {list(SPLITTERS.keys())}.")
+        if growth not in GROWTH_ORDERS:
+            raise ValueError(f"Unknown growth \"{growth}\" - expected one of {list(GROWTH_ORDERS)}.")
+        if growth == "depth_first" and (max_leaves is not None or max_nodes is not None or time_budget is not None):
+            raise ValueError("max_leaves, max_nodes and time_budget only work with growth=\"best_first\".")
+        if max_nodes is not None:
+            # every split adds one BranchNode and one LeafNode, so a tree with L leaves has 2L - 1 nodes.
+            max_leaves = max(1, (max_nodes + 1) // 2) if max_leaves is None else min(max_leaves, (max_nodes + 1) // 2)
+        self.splitter_kind = splitter
+        self.growth = growth
         self.debug_canvas = debug_canvas
-        print(f"I am about to build a tree with {len(training_data)} data points.")
         start_time = time.perf_counter()
-        self.decision_tree_root = self.make_node_for_instances_at_depth(answergroup_list=training_data,
-                                                                        depth = 0,
-                                                                        range=bounds,
-                                                                        verbose = VERBOSE)
-        end_time = time.perf_counter()
-        print(f"Tree built in {(end_time-start_time):0.6f} seconds.")
+        self.build_stats = stats
+        if feature_names is not None:
+            self.feature_names = list(feature_names)
+        if updatable and (splitter != "grid" or growth != "depth_first" or
+                          any(name not in MAP_ATTRIBUTE_NAMES for name in self.feature_names)):
+            raise ValueError("Only trees built with the grid splitter (grown depth first, on just x and y) can be "
+                             "updatable.")
+        self.updatable = updatable
+        data = ColumnarData.from_answer_groups(training_data, attribute_names=self.feature_names)
+        self.label_names = data.label_names
+        self.categories = data.categories
+        # (a worker needs to know which rows its subtree has, so a splitter that doesn't keep track of them builds
+        # everything here.)
+        if n_jobs > 1 and debug_canvas is None and growth == "depth_first" and SPLITTERS[splitter].keeps_rows:
+            # split at a depth that gives us about two subtrees per process, so that the work evens out.
+            self.parallel_depth = int(math.ceil(math.log2(n_jobs))) + 1
+            self.executor = ProcessPoolExecutor(max_workers=n_jobs)
+        try:
+            if growth == "best_first":
+                root = self.make_tree_best_first(splitter=self.make_splitter(data),
+                                                 range=bounds,
+                                                 max_leaves=max_leaves,
+                                                 deadline=None if time_budget is None else start_time + time_budget,
+                                                 verbose=VERBOSE)
+            else:
+                root = self.make_node_for_columns_at_depth(data=data,
+                                                           depth = 0,
+                                                           range=bounds,
+                                                           verbose = VERBOSE)
+            self.collect_pending_subtrees()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(cancel_futures=True)
+                self.executor = None
+            self.pending_subtrees = []
+            self.build_stats = None
+        self.training_data = data if updatable else None
+        self.bounds = tuple(bounds)
+        self.decision_tree_root = root
+        if stats is not None:
+            stats.num_training_items = len(data)
+            stats.total_seconds = time.perf_counter() - start_time
+
+    def make_splitter(self, data: ColumnarData, settings: Optional[Dict[str, Any]] = None) -> GenericSplitter:
+        """
+        :param data: the training data
+        :param settings: optional - extra keyword arguments for the splitter (see GenericSplitter.settings_for_worker)
+        :return: a splitter of the kind this tree was asked to use, for the given data.
+        """
+        return SPLITTERS[self.splitter_kind](data, self.build_conditions_for_range, self.build_conditions_for_values,
+                                             **(settings or {}))
+
+    def build_conditions_for_values(self, attribute_name: str, low: float, high: float) -> List[NumericCondition]:
+        """
+        like build_conditions_for_range, but for an attribute that isn't a map coordinate (e.g., "elevation"): splits
+        the values from low to high into MAX_DIVISIONS_PER_RANGE evenly sized slices.
+        :param attribute_name: the attribute the conditions should ask about
+        :param low: the lowest value of the attribute among the node's AnswerGroups
+        :param high: the highest value
+        :return: a list of conditions for this attribute (empty if low == high - there's nothing to split).
+        """
+        if high <= low:
+            return []
+        division_size = (high - low) / MAX_DIVISIONS_PER_RANGE
+        return [NumericCondition(attribute_name, low + i * division_size) for i in range(1, MAX_DIVISIONS_PER_RANGE)]
 
     def build_conditions_for_range(self, range: List[int]|Tuple[int, int, int, int]) -> List[NumericCondition]:
         """
@@ -82,19 +242,21 @@ class DecisionTree:
 
     def counts_per_label(self, groups: List[AnswerGroup]) -> Dict[str,int]:
         """
-        counts up the number of "land" and "water" labels in the training groups given
-        :param groups: AnswerGroups, each with a label of "land" or "water"
-        :return: a dictionary with the number of land labels and the number of water labels.
+        counts up the number of each label in the training groups given
+        :param groups: labeled AnswerGroups
+        :return: a dictionary with the number of each label - every one of self.label_names (e.g., "land" and
+        "water"), even if there are none of it, and then any other labels we found.
         """
-        counts = {"land":0, "water":0}
+        counts = {name: 0 for name in self.label_names}
 
         for ag in groups:
-            counts[ag.get_label()] += 1
+            label = ag.get_label()
+            counts[label] = counts.get(label, 0) + 1
         return counts
 
     def all_labels_in_group_match(self, groups: List[AnswerGroup]) -> bool:
         """
-        determines whether these groups are all "land" or all "water"
+        determines whether these groups all have the same label (e.g., all "land" or all "water")
         :param groups: a list of labeled answer groups
         :return: whether they all have the same label.
         """
@@ -109,14 +271,16 @@ class DecisionTree:
     def get_most_frequent_label_in_list(self, groups: List[AnswerGroup]) -> str:
         """
         returns the label that appears most often in this collection of labeled AnswerGroups. If it is a tie, selects
-        "land."
-        :param groups: a list of AnswerGroups, each labeled "land" or "water".
-        :return: either "land" or "water".
+        the one that comes first in self.label_names (e.g., "land").
+        :param groups: a list of labeled AnswerGroups
+        :return: the most frequent label.
         """
         counts = self.counts_per_label(groups)
-        if counts["water"] > counts["land"]:
-            return "water"
-        return "land"
+        most_frequent_label = None
+        for label, count in counts.items():
+            if most_frequent_label is None or count > counts[most_frequent_label]:
+                most_frequent_label = label
+        return most_frequent_label
 
     def gini_coefficient_for_list(self, answergroup_list: List[AnswerGroup]) -> float:
         """
@@ -158,95 +322,649 @@ class DecisionTree:
 
         If this is going to be a LeafNode, then it will base it on the majority of labels in the answergroup_list.
         If this is going to be a BranchNode, then it will be one that generates its own "children" (yes/no) Nodes.
+        (The AnswerGroups are copied into columns once, here, and the rest of the work is done by
+        make_node_for_columns_at_depth.)
         :param answergroup_list: a list of answergroups to consider when making this Node.
         :param depth: the depth in the tree where this node will go. Used to keep track of when to stop!
         :return: The Node we are creating!
         """
-        N = len(answergroup_list)
-        if verbose:
-            print(f"I've been asked to make a node at depth {depth}, using {N} AnswerGroups.")
+        data = ColumnarData.from_answer_groups(answergroup_list, self.feature_names, self.label_names, self.categories)
+        return self.make_node_for_columns_at_depth(data=data,
+                                                   depth=depth,
+                                                   range=range,
+                                                   verbose=verbose)
+
+    def make_node_for_columns_at_depth(self,
+                                       data: ColumnarData,
+                                       depth: int,
+                                       range: List[int]|Tuple[int, int, int, int],
+                                       verbose=False,
+                                       splitter_settings: Optional[Dict[str, Any]] = None) -> GenericNode:
+        """
+        does the work of make_node_for_instances_at_depth, but for a group held as columns.
+        :param data: the labeled rows to consider when making this Node.
+        :param depth: the depth in the tree where this node will go. Used to keep track of when to stop!
+        :param range: (x_min, y_min, x_max, y_max) - the part of the map this node covers.
+        :param splitter_settings: optional - passed on to make_splitter
+        :return: The Node we are creating!
+        """
+        splitter = self.make_splitter(data, splitter_settings)
+        return self.make_node_for_rows_at_depth(splitter=splitter,
+                                                rows=splitter.root(),
+                                                depth=depth,
+                                                range=range,
+                                                verbose=verbose)
+
+    def make_node_for_rows_at_depth(self,
+                                    splitter: GenericSplitter,
+                                    rows: Tuple[int, int],
+                                    depth: int,
+                                    range: List[int]|Tuple[int, int, int, int],
+                                    verbose=False,
+                                    label_counts: Optional[np.ndarray] = None) -> GenericNode:
+        """
+        creates a Node for the rows in one (start, end) slice of the splitter's shared index array, along with all the
+        nodes below it. Rather than splitting the group by every candidate condition in turn, the splitter scores all
+        the candidate conditions in one batched pass over the columns, and then partitions the slice in place for the
+        winner; the children each get one half of this node's slice.
+        Instead of calling itself for each child, this keeps a stack of the nodes still to be built, so that however
+        deep the tree gets, we never run into Python's recursion limit. (The nodes are built in the same order as the
+        recursive version would: each "yes" subtree before its "no" subtree.)
+        Only this first node's labels are counted from its rows. Every node below gets its label counts from its
+        parent's split - the winning condition's "no" counts, and the parent's counts minus those for "yes" - so the
+        purity check, the majority label and the Gini coefficient of every node come from a few numbers, not its rows.
+        :param splitter: the splitter holding the training data and the shared index array
+        :param rows: the (start, end) slice of rows this node should consider
+        :param depth: the depth in the tree where this node will go. Used to keep track of when to stop!
+        :param range: (x_min, y_min, x_max, y_max) - the part of the map this node covers.
+        :param label_counts: how many of the rows have each label, if we know already (otherwise, we count them).
+        :return: The Node we are creating!
+        """
+        if label_counts is None:
+            label_counts = splitter.label_counts(rows)
+        root: List[Optional[GenericNode]] = [None]
+        # each entry is a node still to be built: its rows, depth, range and label counts, and how to connect it to its
+        # parent.
+        to_build = [(rows, depth, range, label_counts, lambda node: root.__setitem__(0, node))]
+        stats = self.build_stats  # (when this is None, we skip all the timing.)
+        while len(to_build) > 0:
+            rows, depth, range, label_counts, attach = to_build.pop()
+            N = int(label_counts.sum())  # (rows may not be a slice - see SummedAreaSplitter.)
+            if verbose:
+                print(f"I've been asked to make a node at depth {depth}, using {N} AnswerGroups.")
 
-        condition_list = self.build_conditions_for_range(range)
+            if stats is not None:
+                start_time = time.perf_counter()
 
-        # checks whether this is one of the three conditions to make a leaf node.
-        if (depth == MAX_DEPTH or
-                N < MIN_ITEMS_PER_BRANCH_NODE or
-                len(condition_list)==0 or
-                self.all_labels_in_group_match(answergroup_list)):
-            most_frequent_label = self.get_most_frequent_label_in_list(answergroup_list)
-            if verbose:
-                print(f"I'll make a LeafNode: [[{most_frequent_label}]]")
-            if self.debug_canvas is not None:
-                cv2.rectangle(img=self.debug_canvas, pt1=(range[0], range[1]), pt2=(range[2], range[3]), color=(0,196,196),
-                              thickness =5)
-            if depth > self.max_depth_used:
-                self.max_depth_used = depth
-            return LeafNode(most_frequent_label, depth=depth)
-
-        min_gini_index = 1000  # a ridiculously high number to start; we're likely to find values less than one.
-        best_condition = None
-        best_yes_group = None
-        best_no_group = None
-
-
-
-        # loop through all the conditions in our list of possible conditions.
-        for condition in condition_list:
-            # use this condition to split our list of AnswerGroups in two
-            (no_choices, yes_choices) = self.split_answer_groups_by_condition(answergroup_list, condition)
-
-            # get some statistics about the two sublists we just made:
-            yes_count = len(yes_choices)
-            no_count = len(no_choices)
-            p_yes = yes_count / N
-            p_no = no_count / N
-            gini_yes: float = self.gini_coefficient_for_list(yes_choices)
-            gini_no: float = self.gini_coefficient_for_list(no_choices)
-
-            # TODO #5: based on "p_yes," "p_no," "gini_yes," and "gini_no," calculate the gini index for this choice.
-            #   if this gini_index is better than the others we've seen so far, update "best_condition," "best_yes_group,"
-            #   "best_no_group" and "min_gini_index"
-            Gini_index = p_yes * gini_yes + p_no * gini_no
-            if min_gini_index > Gini_index:
-                min_gini_index = Gini_index
-                best_condition = condition
-                best_no_group = no_choices
-                best_yes_group = yes_choices
+            # checks whether this is one of the conditions to make a leaf node.
+            if (depth == MAX_DEPTH or
+                    N < MIN_ITEMS_PER_BRANCH_NODE or
+                    np.count_nonzero(label_counts) <= 1):
+                best_split = None
+            else:
+                # (None if there are no conditions to choose from.)
+                best_split = splitter.find_best_split(rows, range, label_counts=label_counts)
+            if best_split is None:
+                if stats is not None:
+                    stats.record(NodeStats(depth, N, is_leaf=True, scoring_seconds=time.perf_counter() - start_time))
+                attach(self.make_leaf_node(splitter, rows, label_counts, depth, range, verbose))
+                continue
+            best_condition = best_split.condition
+            if stats is not None:
+                scored_time = time.perf_counter()
 
+            if verbose:
+                print(f"\tThe best condition was: {best_condition}, which had a low gini Index of {best_split.gini_index:3.3f}.")
+                print(f"\tThis split the dataset into {best_split.yes_counts.sum()} 'yes' values with a gini coefficient of ",
+                      end="")
+                print(
+                    f"{gini_coefficient_for_counts(best_split.yes_counts):3.3f} and {best_split.no_counts.sum()} 'no' values with a gini ",
+                    end="")
+                print(f"coefficient of {gini_coefficient_for_counts(best_split.no_counts):3.3f}.")
+
+            # make the node, based on the favorite condition we just found, and connect it to its parent.
+            result = self.make_branch_node(best_split, label_counts, depth)
+            attach(result)
+
+            no_range, yes_range = self.split_range(range, best_condition)
+            no_rows, yes_rows = splitter.partition(rows, best_condition)
+            if stats is not None:
+                partitioned_time = time.perf_counter()
+                stats.record(NodeStats(depth, N, is_leaf=False,
+                                       scoring_seconds=scored_time - start_time,
+                                       partition_seconds=partitioned_time - scored_time,
+                                       gini_index=float(best_split.gini_index)))
+
+            # now its sub nodes for yes and no need building - here, unless the subtree is big enough to be worth
+            # handing off to another process. ("no" goes on the stack first, so that "yes" comes off first.)
+            for child_rows, child_range, child_counts, child_attach in (
+                    (no_rows, no_range, best_split.no_counts, result.set_no_node),
+                    (yes_rows, yes_range, best_split.yes_counts, result.set_yes_node)):
+                if self.should_build_in_worker(child_rows, depth + 1):
+                    self.build_subtree_in_worker(splitter, child_rows, depth + 1, child_range, verbose, child_attach)
+                else:
+                    to_build.append((child_rows, depth + 1, child_range, child_counts, child_attach))
+
+        return root[0]
+
+    def make_branch_node(self, best_split: SplitChoice, label_counts: np.ndarray, depth: int) -> BranchNode:
+        """
+        makes a BranchNode (without its children, yet) for the given split, keeping the counts that update needs if
+        the tree is updatable.
+        """
+        result = BranchNode(best_split.condition, depth=depth)
+        result.label_counts = label_counts
+        if self.updatable:
+            result.candidate_conditions = best_split.candidate_conditions
+            result.candidate_no_counts = best_split.candidate_no_counts
+        return result
 
+    def make_tree_best_first(self,
+                             splitter: GenericSplitter,
+                             range: List[int]|Tuple[int, int, int, int],
+                             max_leaves: Optional[int] = None,
+                             deadline: Optional[float] = None,
+                             verbose=False) -> GenericNode:
+        """
+        grows the tree one split at a time, always splitting the unfinished leaf whose best split gives the biggest drop
+        in Gini impurity (weighted by how many rows it holds, so that a big improvement for a few rows doesn't beat a
+        moderate one for many). Leaves that can't be split (see make_node_for_rows_at_depth) are finished straight away.
+        :param splitter: the splitter holding the training data
+        :param range: (x_min, y_min, x_max, y_max) - the part of the map the tree covers.
+        :param max_leaves: once the tree has this many leaves, the rest of the unfinished leaves become LeafNodes.
+        :param deadline: the same, once time.perf_counter() passes this.
+        :return: the root of the tree
+        """
+        root: List[Optional[GenericNode]] = [None]
+        # (-drop in impurity, order added, rows, depth, range, label counts, best split, attach, scoring time) for each
+        # unfinished leaf. The "order added" breaks ties, so that equal drops are split in the order they were found.
+        unfinished: List[tuple] = []
+        order = itertools.count()
+        self.add_unfinished_leaf(unfinished, order, splitter, splitter.root(), 0, range,
+                                 splitter.label_counts(splitter.root()), lambda node: root.__setitem__(0, node), verbose)
+        num_leaves = 1
+        while len(unfinished) > 0:
+            _, _, rows, depth, range, label_counts, best_split, attach, scoring_seconds = heapq.heappop(unfinished)
+            stats = self.build_stats
+            if ((max_leaves is not None and num_leaves >= max_leaves) or
+                    (deadline is not None and time.perf_counter() >= deadline)):
+                if stats is not None:
+                    stats.record(NodeStats(depth, int(label_counts.sum()), is_leaf=True,
+                                           scoring_seconds=scoring_seconds))
+                attach(self.make_leaf_node(splitter, rows, label_counts, depth, range, verbose))
+                continue
+
+            if stats is not None:
+                start_time = time.perf_counter()
+            result = self.make_branch_node(best_split, label_counts, depth)
+            attach(result)
+            no_range, yes_range = self.split_range(range, best_split.condition)
+            no_rows, yes_rows = splitter.partition(rows, best_split.condition)
+            if stats is not None:
+                stats.record(NodeStats(depth, int(label_counts.sum()), is_leaf=False, scoring_seconds=scoring_seconds,
+                                       partition_seconds=time.perf_counter() - start_time,
+                                       gini_index=float(best_split.gini_index)))
+            num_leaves += 1  # (one leaf became two.)
+            for child_rows, child_range, child_counts, child_attach in (
+                    (yes_rows, yes_range, best_split.yes_counts, result.set_yes_node),
+                    (no_rows, no_range, best_split.no_counts, result.set_no_node)):
+                self.add_unfinished_leaf(unfinished, order, splitter, child_rows, depth + 1, child_range, child_counts,
+                                         child_attach, verbose)
+        return root[0]
+
+    def add_unfinished_leaf(self,
+                            unfinished: List[tuple],
+                            order: Iterator[int],
+                            splitter: GenericSplitter,
+                            rows: Tuple[int, int],
+                            depth: int,
+                            range: List[int]|Tuple[int, int, int, int],
+                            label_counts: np.ndarray,
+                            attach: Callable[[GenericNode], None],
+                            verbose=False):
+        """
+        for make_tree_best_first: finds the best split for a new leaf and adds it to the queue of unfinished leaves -
+        or, if it can't be split, makes it a LeafNode now. (label_counts come from the parent's split, as in
+        make_node_for_rows_at_depth.)
+        """
+        stats = self.build_stats
+        if stats is not None:
+            start_time = time.perf_counter()
+        N = int(label_counts.sum())
+        best_split = None
+        if depth < MAX_DEPTH and N >= MIN_ITEMS_PER_BRANCH_NODE and np.count_nonzero(label_counts) > 1:
+            best_split = splitter.find_best_split(rows, range, label_counts=label_counts)
+        scoring_seconds = 0.0 if stats is None else time.perf_counter() - start_time
+        if best_split is None:
+            if stats is not None:
+                stats.record(NodeStats(depth, N, is_leaf=True, scoring_seconds=scoring_seconds))
+            attach(self.make_leaf_node(splitter, rows, label_counts, depth, range, verbose))
+            return
+        impurity_drop = N * (gini_coefficient_for_counts(label_counts) - best_split.gini_index)
+        heapq.heappush(unfinished, (-impurity_drop, next(order), rows, depth, range, label_counts, best_split, attach,
+                                    scoring_seconds))
+
+    def make_leaf_node(self,
+                       splitter: GenericSplitter,
+                       rows: Tuple[int, int],
+                       label_counts: np.ndarray,
+                       depth: int,
+                       range: List[int]|Tuple[int, int, int, int],
+                       verbose=False) -> LeafNode:
+        """
+        makes a LeafNode holding the most frequent label among this node's rows.
+        :param splitter: the splitter holding the training data
+        :param rows: the (start, end) slice of rows this node holds
+        :param label_counts: how many of this node's rows have each label
+        :param depth: the depth in the tree where this node will go
+        :param range: (x_min, y_min, x_max, y_max) - the part of the map this node covers.
+        :return: the new LeafNode
+        """
+        splitter.forget(rows)
+        # ties go to the first label (i.e., "land").
+        most_frequent_label = splitter.data.label_names[int(np.argmax(label_counts))]
         if verbose:
-            print(f"\tThe best condition was: {best_condition}, which had a low gini Index of {min_gini_index:3.3f}.")
-            print(f"\tThis split the dataset into {len(best_yes_group)} 'yes' values with a gini coefficient of ",
-                  end="")
-            print(
-                f"{self.gini_coefficient_for_list(best_yes_group):3.3f} and {len(best_no_group)} 'no' values with a gini ",
-                end="")
-            print(f"coefficient of {self.gini_coefficient_for_list(best_no_group):3.3f}.")
-
-        # make the node we're about to return, based on the favorite condition we just found.
-        result = BranchNode(best_condition, depth=depth)
-
-        # build subranges - how have we just split the rectangle on the map into two?
-        # reminder: we have been asking whether points are greater than the threshold_value.
-        if best_condition.attribute_name == "x":
-            no_range = (range[0],range[1],best_condition.threshold_value, range[3])  # left
-            yes_range = (best_condition.threshold_value, range[1], range[2], range[3]) # right
+            print(f"I'll make a LeafNode: [[{most_frequent_label}]]")
+        if self.debug_canvas is not None:
+            cv2.rectangle(img=self.debug_canvas, pt1=(int(range[0]), int(range[1])), pt2=(int(range[2]), int(range[3])),
+                          color=(0,196,196), thickness =5)
+        if depth > self.max_depth_used:
+            self.max_depth_used = depth
+        leaf = LeafNode(most_frequent_label, depth=depth)
+        leaf.label_counts = label_counts
+        if self.updatable:
+            leaf.sample_ids = splitter.row_numbers(rows)
+        return leaf
+
+    def split_range(self, range: List[int]|Tuple[int, int, int, int], condition: GenericCondition) \
+            -> Tuple[Tuple[int, int, int, int], Tuple[int, int, int, int]]:
+        """
+        build subranges - how does this condition split the rectangle on the map into two?
+        reminder: we have been asking whether points are greater than the threshold_value.
+        :param range: (x_min, y_min, x_max, y_max) - the part of the map a node covers
+        :param condition: the condition that node asks
+        :return: the ranges for the "no" and "yes" children. (A condition that isn't about x or y doesn't divide the
+        map, so both children get the whole range.)
+        """
+        if condition.attribute_name not in MAP_ATTRIBUTE_NAMES or not isinstance(condition, NumericCondition):
+            return tuple(range), tuple(range)
+        if condition.attribute_name == "x":
+            no_range = (range[0],range[1],condition.threshold_value, range[3])  # left
+            yes_range = (condition.threshold_value, range[1], range[2], range[3]) # right
         else:
-            no_range = (range[0],range[1], range[2], best_condition.threshold_value) # top
-            yes_range = (range[0], best_condition.threshold_value, range[2], range[3]) # bottom
-
-        # but before we return it, have it create and connect the sub nodes for yes and no. (recursive)
-        result.set_yes_node(self.make_node_for_instances_at_depth(answergroup_list=best_yes_group,
-                                                                  depth=depth + 1,
-                                                                  range=yes_range,
-                                                                  verbose=verbose))
-        result.set_no_node(self.make_node_for_instances_at_depth(answergroup_list=best_no_group,
-                                                                 depth=depth + 1,
-                                                                 range=no_range,
-                                                                 verbose=verbose))
-
-        # now that we have a fully-formed node and its children, give it back to the method that called this one.
-        return result
+            no_range = (range[0],range[1], range[2], condition.threshold_value) # top
+            yes_range = (range[0], condition.threshold_value, range[2], range[3]) # bottom
+        return no_range, yes_range
+
+    def should_build_in_worker(self, rows: Tuple[int, int], depth: int) -> bool:
+        """
+        :return: whether the subtree for these rows, at this depth, should be built by a worker process.
+        """
+        return (self.executor is not None and
+                depth == self.parallel_depth and
+                rows[1] - rows[0] >= PARALLEL_MIN_ITEMS_PER_JOB)
+
+    def build_subtree_in_worker(self,
+                                splitter: GenericSplitter,
+                                rows: Tuple[int, int],
+                                depth: int,
+                                range: List[int]|Tuple[int, int, int, int],
+                                verbose: bool,
+                                attach: Callable[[GenericNode], None]):
+        """
+        sends a copy of the rows in this slice to a worker process, which builds their subtree. The subtree is attached
+        (by calling attach) in collect_pending_subtrees.
+        """
+        splitter.forget(rows)
+        row_numbers = splitter.row_numbers(rows).copy()
+        worker_stats = None if self.build_stats is None else self.build_stats.for_worker()
+        future = self.executor.submit(build_subtree_for_worker, self.copy_for_worker(), splitter.data.take(row_numbers),
+                                      depth, range, verbose, worker_stats, splitter.settings_for_worker())
+        self.pending_subtrees.append((future, attach, row_numbers))
+
+    def copy_for_worker(self) -> "DecisionTree":
+        """
+        :return: a copy of this (untrained) DecisionTree's settings, small enough to send to a worker process.
+        """
+        worker_tree = copy.copy(self)
+        worker_tree.__root__ = None
+        worker_tree.compiled_tree = None
+        worker_tree.prediction_cache = None
+        worker_tree.raster_lookup = None
+        worker_tree.debug_canvas = None
+        worker_tree.executor = None
+        worker_tree.pending_subtrees = []
+        worker_tree.training_data = None
+        worker_tree.build_stats = None
+        worker_tree.max_depth_used = 0
+        return worker_tree
+
+    def collect_pending_subtrees(self):
+        """
+        waits for the worker processes to finish and attaches each subtree to its parent BranchNode.
+        """
+        for future, attach, row_numbers in self.pending_subtrees:
+            subtree, max_depth_used, worker_stats = future.result()
+            if self.updatable:
+                # the worker only had this subtree's rows, so its leaves' sample_ids count from the start of those.
+                self.remap_sample_ids(subtree, row_numbers)
+            attach(subtree)
+            self.max_depth_used = max(self.max_depth_used, max_depth_used)
+            if worker_stats is not None:
+                self.build_stats.merge(worker_stats)
+        self.pending_subtrees = []
+
+    def remap_sample_ids(self, node: GenericNode, row_numbers: np.ndarray):
+        """
+        for a subtree that was built from a subset of the training data: changes its leaves' sample_ids from positions
+        in the subset into row numbers in the whole training data.
+        :param node: the root of the subtree
+        :param row_numbers: the row number of each row of the subset
+        """
+        for leaf in self.leaves_under(node):
+            leaf.sample_ids = row_numbers[leaf.sample_ids]
+
+    def leaves_under(self, node: GenericNode) -> List[LeafNode]:
+        """
+        :return: all the LeafNodes in the subtree that starts at node.
+        """
+        leaves: List[LeafNode] = []
+        to_visit = [node]
+        while len(to_visit) > 0:
+            node = to_visit.pop()
+            if isinstance(node, BranchNode):
+                to_visit.append(node.__no_node__)
+                to_visit.append(node.__yes_node__)
+            else:
+                leaves.append(node)
+        return leaves
+
+    def update(self, new_answer_groups: List[AnswerGroup]|AnswerGroupTable):
+        """
+        adds newly labeled AnswerGroups to a tree built with build_tree(..., updatable=True), without rebuilding the
+        whole thing. Each node keeps the label counts of the data that reached it, and each BranchNode keeps the
+        counts for every condition it chose between, so we send the new points down the tree, adding them to those
+        counts as we go:
+            - if a BranchNode's best condition is still the same, we just carry on down into its children;
+            - if its best condition has changed, we rebuild the subtree from that node, from all the data under it;
+            - if a LeafNode should now be split (it has enough points and they no longer all match), we build a subtree
+              in its place; otherwise we just update its label.
+        Since the untouched parts of the tree see exactly the data they saw before, the result is the same tree that
+        build_tree would make from the old and new data together.
+        :param new_answer_groups: the new labeled AnswerGroups
+        """
+        if not self.updatable or self.training_data is None:
+            raise ValueError("Only trees made by build_tree with updatable=True can be updated.")
+        num_labels = len(self.label_names)
+        new_data = ColumnarData.from_answer_groups(new_answer_groups, self.feature_names, self.label_names,
+                                                   self.categories)
+        if len(new_data.label_names) != num_labels:
+            raise ValueError(f"Found labels other than {self.label_names} in the new data.")
+        first_new_row = len(self.training_data)
+        self.training_data = self.training_data.append(new_data)
+        data = self.training_data
+
+        new_root = [self.decision_tree_root]
+        to_visit = [(self.decision_tree_root, np.arange(first_new_row, len(data)),
+                     lambda node: new_root.__setitem__(0, node), self.bounds, 0)]
+        while len(to_visit) > 0:
+            node, new_rows, attach, range, depth = to_visit.pop()
+            if len(new_rows) == 0:
+                continue  # nothing new reached this node, so nothing here changes.
+            node.label_counts = node.label_counts + np.bincount(data.label_codes[new_rows], minlength=num_labels)
+
+            if isinstance(node, BranchNode):
+                conditions = node.candidate_conditions
+                attribute_names = [condition.attribute_name for condition in conditions]
+                _, new_no_counts, _ = score_numeric_conditions(
+                    {name: data.columns[name][new_rows] for name in set(attribute_names)},
+                    data.label_codes[new_rows],
+                    num_labels,
+                    attribute_names,
+                    [condition.threshold_value for condition in conditions])
+                node.candidate_no_counts = node.candidate_no_counts + new_no_counts
+                gini_indices = gini_indices_for_splits(node.candidate_no_counts,
+                                                       node.label_counts - node.candidate_no_counts)
+                if conditions[best_split_index(gini_indices)] is not node.my_condition:
+                    old_rows = [leaf.sample_ids for leaf in self.leaves_under(node)]
+                    attach(self.rebuild_subtree(np.concatenate(old_rows + [new_rows]), depth, range))
+                    continue
+                condition = node.my_condition
+                goes_yes = data.answers(condition, new_rows)
+                no_range, yes_range = self.split_range(range, condition)
+                to_visit.append((node.__no_node__, new_rows[~goes_yes], node.set_no_node, no_range, depth + 1))
+                to_visit.append((node.__yes_node__, new_rows[goes_yes], node.set_yes_node, yes_range, depth + 1))
+            else:
+                node.sample_ids = np.concatenate((node.sample_ids, new_rows))
+                if (depth < MAX_DEPTH and
+                        len(node.sample_ids) >= MIN_ITEMS_PER_BRANCH_NODE and
+                        np.count_nonzero(node.label_counts) > 1 and
+                        len(self.build_conditions_for_range(range)) > 0):
+                    attach(self.rebuild_subtree(node.sample_ids, depth, range))
+                else:
+                    node.my_label = self.label_names[int(np.argmax(node.label_counts))]
+
+        # setting the root (even to the same node) throws away anything worked out from the old tree.
+        self.decision_tree_root = new_root[0]
+        # (a rebuilt subtree may be shallower than the one it replaced, so this can go down as well as up.)
+        self.max_depth_used = max(leaf.my_depth for leaf in self.leaves_under(new_root[0]))
+
+    def rebuild_subtree(self, row_numbers: np.ndarray, depth: int, range: List[int]|Tuple[int, int, int, int]) \
+            -> GenericNode:
+        """
+        builds a new subtree from the given rows of the training data.
+        :param row_numbers: the rows (of self.training_data) to build from
+        :param depth: the depth in the tree where the subtree's root will go
+        :param range: (x_min, y_min, x_max, y_max) - the part of the map the subtree covers.
+        :return: the root of the new subtree
+        """
+        splitter = GridSplitter(self.training_data.take(row_numbers), self.build_conditions_for_range,
+                                self.build_conditions_for_values)
+        node = self.make_node_for_rows_at_depth(splitter=splitter, rows=splitter.root(), depth=depth, range=range)
+        self.remap_sample_ids(node, row_numbers)
+        return node
+
+    def pruning_alphas(self) -> List[float]:
+        """
+        works out the cost-complexity pruning sequence for this tree (see PruningFile).
+        :return: the alphas at which pruning would change the tree, smallest first. prune(alpha) with each of these in
+        turn gives smaller and smaller trees, down to a single leaf.
+        """
+        if self.decision_tree_root is None:
+            raise ValueError("There is no tree to prune - build it first.")
+        return compute_pruning_sequence(self.decision_tree_root)
+
+    def prune(self,
+              alpha: Optional[float] = None,
+              validation_data: Optional[List[AnswerGroup]|AnswerGroupTable] = None) -> float:
+        """
+        cuts the tree back, turning BranchNodes that don't earn their keep into LeafNodes - a tree grown to MAX_DEPTH
+        fits the noise in its training data, and a pruned tree is smaller, shallower and quicker, and usually at least
+        as accurate on new data. A BranchNode is cut if it saves fewer than alpha training mistakes per extra leaf.
+        :param alpha: how many training points a leaf has to label correctly to be worth keeping. Give this or
+        validation_data.
+        :param validation_data: labeled AnswerGroups that the tree was not trained on; we use the alpha whose pruned
+        tree gets the most of them right (or the smaller tree, if there's a tie).
+        :return: the alpha that was used.
+        """
+        if (alpha is None) == (validation_data is None):
+            raise ValueError("Give either alpha or validation_data.")
+        alphas = self.pruning_alphas()
+        if validation_data is not None:
+            data = ColumnarData.from_answer_groups(validation_data, self.feature_names, self.label_names,
+                                                   self.categories)
+            if len(data.label_names) != len(self.label_names):
+                raise ValueError(f"Found labels other than {self.label_names} in the validation data.")
+            alpha = best_alpha_for_validation(self.decision_tree_root, alphas, data)
+        root = prune_tree(self.decision_tree_root, alpha, self.label_names)
+        self.max_depth_used = max(leaf.my_depth for leaf in self.leaves_under(root))
+        self.decision_tree_root = root
+        return alpha
 
     def predict(self, answer_group: AnswerGroup) -> str:
-        return self.decision_tree_root.predict(answer_group)
\ No newline at end of file
+        if self.prediction_cache is not None:
+            key = tuple(answer_group.get_attribute_for_name(name) for name in self.feature_names)
+            found, label = self.prediction_cache.get(key)
+            if not found:
+                label = self.predict_uncached(answer_group)
+                self.prediction_cache.put(key, label)
+            return label
+        return self.predict_uncached(answer_group)
+
+    def predict_uncached(self, answer_group: AnswerGroup) -> str:
+        if self.raster_lookup is not None:
+            return self.raster_lookup.predict(answer_group)
+        if self.decision_tree_root is None and self.compiled_tree is not None:  # (a tree we loaded from a file)
+            return self.compiled_tree.predict_one(answer_group)
+        return self.decision_tree_root.predict(answer_group)
+
+    def save(self, path: str):
+        """
+        saves the trained tree to a compact binary file (see CompiledTreeFile.save_compiled_tree).
+        :param path: where to write the file
+        """
+        save_compiled_tree(path, self.compile(), extra={"max_depth_used": self.max_depth_used})
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "DecisionTree":
+        """
+        loads a tree saved by save. The tree is only loaded in its compiled form - there are no BranchNode/LeafNode
+        objects unless you ask for them with compiled_tree.to_node() - so with mmap, loading takes milliseconds and
+        processes that load the same file share its memory.
+        :param path: the file to read
+        :param mmap: whether to memory-map the file rather than reading it into memory
+        :return: a DecisionTree, ready to predict.
+        """
+        tree = cls()
+        compiled_tree, roots, extra = load_compiled_tree(path, mmap=mmap)
+        tree.compiled_tree = compiled_tree
+        tree.feature_names = compiled_tree.feature_names
+        tree.label_names = compiled_tree.label_names
+        tree.categories = compiled_tree.categories
+        tree.max_depth_used = extra.get("max_depth_used", 0)
+        return tree
+
+    def compile(self) -> CompiledTree:
+        """
+        flattens the trained tree into a CompiledTree (parallel NumPy arrays) for fast batch prediction. The result is
+        kept until the tree is replaced, so calling this again is cheap.
+        :return: the compiled version of this tree.
+        """
+        if self.compiled_tree is None:
+            if self.decision_tree_root is None:
+                raise ValueError("There is no tree to compile - call build_tree first.")
+            self.compiled_tree = CompiledTree.from_node(self.decision_tree_root,
+                                                        feature_names=self.feature_names,
+                                                        label_names=self.label_names,
+                                                        categories=self.categories)
+        return self.compiled_tree
+
+    def predict_batch(self, X: np.ndarray|AnswerGroupTable) -> np.ndarray:
+        """
+        predicts the labels for a whole batch of points at once.
+        :param X: an (N, 2) array of (x, y) coordinates (more generally, one column per name in self.feature_names,
+        with categorical features given as positions in self.categories), or an AnswerGroupTable
+        :return: an array with the predicted label for each point.
+        """
+        if isinstance(X, AnswerGroupTable):
+            X = self.compile().as_array(X)
+        if self.raster_lookup is not None:
+            return self.raster_lookup.predict_batch(X)
+        return self.compile().predict_batch(X)
+
+    def predict_raster(self, width: int, height: int) -> np.ndarray:
+        """
+        predicts every pixel of a width x height map at once, by filling in each leaf's rectangle.
+        :param width: the width of the map, in pixels
+        :param height: the height of the map, in pixels
+        :return: a (height, width) array of label codes - positions in self.compile().label_names.
+        """
+        return self.compile().paint_raster(width, height)
+
+    def enable_raster_lookup(self, width: int, height: int):
+        """
+        paints the whole map once, so that from now on predict and predict_batch just look up the answer for any pixel
+        on the map. (This lasts until the tree is replaced.)
+        :param width: the width of the map, in pixels
+        :param height: the height of the map, in pixels
+        """
+        self.raster_lookup = RasterLookup(self.compile(), width, height)
+
+    def evaluate(self,
+                 data: List[AnswerGroup]|AnswerGroupTable|np.ndarray,
+                 true_labels: Optional[List[str]|np.ndarray] = None,
+                 true_label_names: Optional[List[str]] = None,
+                 region_size: Optional[float] = None,
+                 n_jobs: int = 1,
+                 chunk_size: int = EVALUATION_CHUNK_SIZE) -> EvaluationReport:
+        """
+        checks the tree's predictions against the correct labels, with batch prediction, a chunk at a time (see
+        EvaluationFile.evaluate). Nothing in data is changed.
+        :param data: the points - a list of AnswerGroups, an AnswerGroupTable, or an array as for predict_batch
+        :param true_labels: the correct label for each point, as strings or label codes (if left out, the labels in
+        data are used)
+        :param true_label_names: the label each code in true_labels stands for (defaults to self.label_names)
+        :param region_size: if given, the report also has maps of the mistakes in each region_size square of the map
+        (the map being the bounds the tree was built with, if we know them)
+        :param n_jobs: how many processes to predict in
+        :param chunk_size: how many points to predict at a time
+        :return: the accuracy, confusion matrix and error maps.
+        """
+        return evaluate(self.compile(), data, true_labels, true_label_names=true_label_names, region_size=region_size,
+                        bounds=self.bounds, n_jobs=n_jobs, chunk_size=chunk_size)
+
+    def to_source(self) -> str:
+        """
+        :return: Python source code for a module that makes this tree's predictions with plain nested if/else (see
+        GeneratedCodeFile).
+        """
+        return generate_source(self.compile())
+
+    def to_module(self) -> types.ModuleType:
+        """
+        turns this tree into Python code and loads it as a module. module.predict_one(x, y) (one argument per feature,
+        in feature_names order) is the quickest way to predict a single point. The module is cached by the tree's
+        hash, so calling this again for the same tree is cheap.
+        :return: the generated module, with predict_one, predict and predict_batch.
+        """
+        return load_generated_module(self.compile())
+
+    def enable_prediction_cache(self, max_size: int = 65536) -> PredictionCache:
+        """
+        remembers the answers to the most recent max_size different points given to predict, so that asking about the
+        same point again (e.g., the same map tile) skips the walk down the tree. The cache is emptied whenever the tree
+        is replaced - by build_tree, update, prune, and so on.
+        :param max_size: the most answers to keep; when the cache is full, the least recently used one is dropped.
+        :return: the cache (see its stats() for how many lookups it has answered).
+        """
+        self.prediction_cache = PredictionCache(max_size)
+        return self.prediction_cache
+
+    def disable_prediction_cache(self):
+        self.prediction_cache = None
+
+    def prediction_cache_stats(self) -> Optional[CacheStats]:
+        """
+        :return: the hits, misses and evictions of the prediction cache so far, or None if it isn't enabled.
+        """
+        return None if self.prediction_cache is None else self.prediction_cache.stats()
+
+
+def build_subtree_for_worker(tree: DecisionTree,
+                             data: ColumnarData,
+                             depth: int,
+                             range: List[int]|Tuple[int, int, int, int],
+                             verbose: bool,
+                             stats: Optional[BuildStats],
+                             splitter_settings: Optional[Dict[str, Any]] = None) \
+        -> Tuple[GenericNode, int, Optional[BuildStats]]:
+    """
+    runs in a worker process: builds the subtree for the given rows, serially.
+    :param splitter_settings: from the main process's splitter (see GenericSplitter.settings_for_worker), so that the
+    worker chooses the same splits it would have
+    :return: the subtree, the deepest depth it reached, and the stats for its nodes (if we were given a BuildStats).
+    """
+    tree.build_stats = stats
+    node = tree.make_node_for_columns_at_depth(data=data, depth=depth, range=range, verbose=verbose,
+                                               splitter_settings=splitter_settings)
+    return node, tree.max_depth_used, stats
@@ -1,14 +1,17 @@
 import copy
 import random
-from typing import List, Tuple
+from typing import Iterator, List, Optional, Tuple
 
 import cv2
 import numpy as np
 
-from AnswerGroupFile import AnswerGroup
+from AnswerGroupFile import AnswerGroup, AnswerGroupTable
+from BuildStatsFile import BuildStats
 from DecisionTree import DecisionTree
 
 DOT_RADIUS = 10
+WATER_THRESHOLD = 128  # pixels with more blue than this are water.
+LABEL_NAMES = ["land", "water"]  # label code 0 is land, 1 is water.
 
 def load_map_image():
     global source_map
@@ -45,7 +48,68 @@ def generate_N_data(N:int, label_data:bool = True) -> Tuple[List[AnswerGroup], L
     return result, correct_answers
 
 
-def display_labeled_data(data: List[AnswerGroup]) -> np.ndarray:
+def generate_N_data_table(N: int,
+                          label_data: bool = True,
+                          rng: Optional[np.random.Generator|int] = None,
+                          land_fraction: Optional[float] = None,
+                          map_image: Optional[np.ndarray] = None) -> Tuple[AnswerGroupTable, np.ndarray]:
+    """
+    a faster version of generate_N_data: draws all N points at once and returns them as one AnswerGroupTable.
+    :param N: the number of points to generate
+    :param label_data: if True, the rows should be labeled with the correct classification. Otherwise, unlabeled.
+    :param rng: a numpy random Generator, or a seed for one (so the same seed gives the same points).
+    :param land_fraction: if given, the points are stratified - this fraction of them (rounded) are drawn from land
+    pixels and the rest from water pixels. Otherwise, points are drawn evenly from the whole map.
+    :param map_image: the map to sample (defaults to the one from load_map_image)
+    :return: the table of points (with "x" and "y" columns), and the correct label code for each point (0 for land,
+    1 for water - see LABEL_NAMES).
+    """
+    rng = np.random.default_rng(rng)
+    map_image = source_map if map_image is None else map_image
+    height, width = map_image.shape[0], map_image.shape[1]  # this looks backwards because openCV graphics are row,col
+    is_water = map_image[:, :, 0] > WATER_THRESHOLD
+
+    if land_fraction is None:
+        x = rng.integers(0, width, size=N, dtype=np.int32)
+        y = rng.integers(0, height, size=N, dtype=np.int32)
+    else:
+        num_land = int(round(N * land_fraction))
+        land_pixels = np.flatnonzero(~is_water)
+        water_pixels = np.flatnonzero(is_water)
+        pixels = np.concatenate((land_pixels[rng.integers(0, len(land_pixels), size=num_land)],
+                                 water_pixels[rng.integers(0, len(water_pixels), size=N - num_land)]))
+        rng.shuffle(pixels)
+        y, x = np.divmod(pixels, width)
+        x = x.astype(np.int32)
+        y = y.astype(np.int32)
+
+    correct_answers = is_water[y, x].astype(np.int8)
+    table = AnswerGroupTable({"x": x, "y": y},
+                             label_codes=correct_answers.copy() if label_data else None,
+                             label_names=LABEL_NAMES)
+    return table, correct_answers
+
+
+def generate_data_chunks(N: int,
+                         chunk_size: int,
+                         label_data: bool = True,
+                         rng: Optional[np.random.Generator|int] = None,
+                         land_fraction: Optional[float] = None,
+                         map_image: Optional[np.ndarray] = None) -> Iterator[Tuple[AnswerGroupTable, np.ndarray]]:
+    """
+    generates N points, chunk_size at a time, for datasets too big to hold in memory all at once. Each chunk is what
+    generate_N_data_table would return; with the same rng (or seed), the chunks are always the same.
+    """
+    rng = np.random.default_rng(rng)
+    for start in range(0, N, chunk_size):
+        yield generate_N_data_table(N=min(chunk_size, N - start),
+                                    label_data=label_data,
+                                    rng=rng,
+                                    land_fraction=land_fraction,
+                                    map_image=map_image)
+
+
+def display_labeled_data(data: List[AnswerGroup]|AnswerGroupTable) -> np.ndarray:
     """
     draws a copy of the map with the given data appearing as dots on the map.
     (Note: This graphic is HUGE, so it will appear shrunk on the screen, which is why we are using large radius dots.)
@@ -77,13 +141,20 @@ if __name__ == "__main__":
     SHOW_DEBUG_IMAGE = True
     N_TRAINING = 3000
     N_TESTING = 7500
+    N_JOBS = 1  # how many processes to evaluate in - worth raising for millions of testing points.
+    ERROR_MAP_REGION_SIZE = 100  # the size of the squares the testing mistakes are counted in, in pixels.
+    RANDOM_SEED = None  # set this to a number to get the same points every run.
     load_map_image()
-    training_data, training_answers = generate_N_data(N=N_TRAINING, label_data = True)
+    rng = np.random.default_rng(RANDOM_SEED)
+    training_data, training_answers = generate_N_data_table(N=N_TRAINING, label_data = True, rng=rng)
     training_map:np.ndarray = display_labeled_data(training_data)
 
     # build the tree.
     tree = DecisionTree()
-    tree.build_tree(training_data, [0,0,source_map.shape[1], source_map.shape[0]],debug_canvas=training_map)
+    build_stats = BuildStats()
+    tree.build_tree(training_data, [0,0,source_map.shape[1], source_map.shape[0]],debug_canvas=training_map,
+                    stats=build_stats)
+    print(build_stats.report())
     print(f"Tree generated with max depth of {tree.max_depth_used}.")
 
     if SHOW_DEBUG_IMAGE:
@@ -93,23 +164,17 @@ if __name__ == "__main__":
 
     # check how well the tree predicts the training data. We'd expect this to be very good!
     print("How does the tree predict the data it was trained on?")
-    num_correct = 0
-    for i in range(len(training_data)):
-        prediction_string = tree.predict(training_data[i])
-        if prediction_string == training_answers[i]:
-            num_correct += 1
-        training_data[i].set_label(prediction_string)
-    print(
-        f"\tTree predicted {num_correct} out of {len(training_data)} points, for {100 * num_correct / len(training_data):3.2f}%")
+    training_report = tree.evaluate(training_data, training_answers, true_label_names=LABEL_NAMES)
+    print(training_report.summary())
 
     # check how well the tree predicts the data.
     print("Now let's test how the tree does predicting on new data.")
-    testing_data, testing_correct_answers = generate_N_data(N=N_TESTING, label_data = False)
-    num_correct = 0
-    for i in range(len(testing_data)):
-        prediction_string = tree.predict(testing_data[i])
-        if prediction_string == testing_correct_answers[i]:
-            num_correct += 1
-        testing_data[i].set_label(prediction_string)
-    print(f"\tTree predicted {num_correct} out of {len(testing_data)} points, for {100*num_correct/len(testing_data):3.2f}%")
-    display_labeled_data(testing_data)
\ No newline at end of file
+    testing_data, testing_correct_answers = generate_N_data_table(N=N_TESTING, label_data = False, rng=rng)
+    testing_report = tree.evaluate(testing_data, testing_correct_answers, true_label_names=LABEL_NAMES,
+                                   region_size=ERROR_MAP_REGION_SIZE, n_jobs=N_JOBS)
+    print(testing_report.summary())
+
+    # show the predictions on the map - in a new table, so the testing data keeps its own (lack of) labels.
+    predicted_labels = tree.compile().predict_codes(tree.compile().as_array(testing_data))
+    display_labeled_data(AnswerGroupTable(testing_data.columns, label_codes=predicted_labels,
+                                          label_names=tree.label_names))
@@ -1,9 +1,83 @@
+import asyncio
+import copy
+import importlib.util
+import os
+import random
+import sys
+import tempfile
 import unittest
-from typing import List
+import unittest.mock
+from typing import Dict, List, Tuple
 
-from AnswerGroupFile import AnswerGroup
+import numpy as np
+
+import DecisionTree3Main
+from AnswerGroupFile import AnswerGroup, AnswerGroupTable
+from BuildStatsFile import BuildStats
 from ConditionFile import NumericCondition
-from DecisionTree import DecisionTree, MAX_DIVISIONS_PER_RANGE
+import GeneratedCodeFile
+from DecisionTree import DecisionTree, MAX_DIVISIONS_PER_RANGE, MAX_DEPTH, MIN_ITEMS_PER_BRANCH_NODE
+from NodeFile import GenericNode, BranchNode, LeafNode
+from PredictionServiceFile import PredictionService
+from StreamingBuildFile import StreamingTreeBuilder
+from SplitEngineFile import ColumnarData, GridSplitter, ExactSplitter, HistogramSplitter, SummedAreaSplitter, \
+    gini_coefficient_for_counts
+
+SYNTHETIC_BOUNDS = (0, 0, 800, 600)
+
+
+def make_synthetic_data(N: int, seed: int = 1) -> List[AnswerGroup]:
+    """
+    makes N labeled AnswerGroups scattered over a made-up "map" with a round lake and a wavy coastline, so that we can
+    build trees without needing the map image.
+    """
+    rng = random.Random(seed)
+    result: List[AnswerGroup] = []
+    for i in range(N):
+        x = rng.randint(0, SYNTHETIC_BOUNDS[2] - 1)
+        y = rng.randint(0, SYNTHETIC_BOUNDS[3] - 1)
+        in_lake = (x - 250) ** 2 + (y - 300) ** 2 < 120 ** 2
+        in_sea = y > 400 + 60 * ((x // 40) % 3)
+        result.append(AnswerGroup(question_name_list=["x", "y"],
+                                  answer_list=[x, y],
+                                  label="water" if (in_lake or in_sea) else "land"))
+    return result
+
+
+def make_reference_node(tree: DecisionTree,
+                        answergroup_list: List[AnswerGroup],
+                        depth: int,
+                        range: Tuple[int, int, int, int]) -> GenericNode:
+    """
+    the original, one-condition-at-a-time way of building a tree out of AnswerGroup lists, kept here so that we can
+    check that the faster builders make exactly the same tree.
+    """
+    condition_list = tree.build_conditions_for_range(range)
+    if (depth == MAX_DEPTH or
+            len(answergroup_list) < MIN_ITEMS_PER_BRANCH_NODE or
+            len(condition_list) == 0 or
+            tree.all_labels_in_group_match(answergroup_list)):
+        return LeafNode(tree.get_most_frequent_label_in_list(answergroup_list), depth=depth)
+    N = len(answergroup_list)
+    min_gini_index = 1000
+    best = None
+    for condition in condition_list:
+        no_choices, yes_choices = tree.split_answer_groups_by_condition(answergroup_list, condition)
+        gini_index = (len(yes_choices) / N * tree.gini_coefficient_for_list(yes_choices) +
+                      len(no_choices) / N * tree.gini_coefficient_for_list(no_choices))
+        if min_gini_index > gini_index:
+            min_gini_index = gini_index
+            best = (condition, no_choices, yes_choices)
+    condition, no_choices, yes_choices = best
+    t = condition.threshold_value
+    if condition.attribute_name == "x":
+        no_range, yes_range = (range[0], range[1], t, range[3]), (t, range[1], range[2], range[3])
+    else:
+        no_range, yes_range = (range[0], range[1], range[2], t), (range[0], t, range[2], range[3])
+    result = BranchNode(condition, depth=depth)
+    result.set_yes_node(make_reference_node(tree, yes_choices, depth + 1, yes_range))
+    result.set_no_node(make_reference_node(tree, no_choices, depth + 1, no_range))
+    return result
 
 
 class MyTestCase(unittest.TestCase):
@@ -297,5 +371,747 @@ class MyTestCase(unittest.TestCase):
         print("  assertion 3 passed.")
         print("Test_g completed.")
 
+    def test_h_columnar_build_matches_reference(self):
+        print("Starting test_h.")
+        data = make_synthetic_data(1500)
+        expected = make_reference_node(self.decision_tree, data, 0, SYNTHETIC_BOUNDS)
+        actual = self.decision_tree.make_node_for_instances_at_depth(answergroup_list=data,
+                                                                     depth=0,
+                                                                     range=SYNTHETIC_BOUNDS)
+        self.assertEqual(repr(actual), repr(expected), "The columnar builder should make the same tree.")
+        print("  tree matched.")
+        print("Test_h completed.")
+
+    def test_i_partition_in_place(self):
+        print("Starting test_i.")
+        data = ColumnarData.from_answer_groups(make_synthetic_data(200))
+        splitter = GridSplitter(data, self.decision_tree.build_conditions_for_range)
+        no_rows, yes_rows = splitter.partition(splitter.root(), NumericCondition("x", 400))
+        self.assertEqual(no_rows[1], yes_rows[0], "The two halves should share a boundary.")
+        self.assertTrue((data.columns["x"][splitter.row_numbers(no_rows)] <= 400).all())
+        self.assertTrue((data.columns["x"][splitter.row_numbers(yes_rows)] > 400).all())
+        print("  partition passed.")
+        self.decision_tree.make_node_for_rows_at_depth(splitter, splitter.root(), 0, SYNTHETIC_BOUNDS)
+        self.assertEqual(sorted(splitter.index.tolist()), list(range(200)),
+                         "The shared index array should still hold every row exactly once.")
+        print("  permutation passed.")
+        print("Test_i completed.")
+
+    def test_j_predict_batch_matches_predict(self):
+        print("Starting test_j.")
+        self.decision_tree.build_tree(make_synthetic_data(1000), SYNTHETIC_BOUNDS)
+        test_data = make_synthetic_data(500, seed=2)
+        points = np.array([[ag.get_attribute_for_name("x"), ag.get_attribute_for_name("y")] for ag in test_data])
+        batch_predictions = self.decision_tree.predict_batch(points)
+        for ag, batch_prediction in zip(test_data, batch_predictions):
+            self.assertEqual(batch_prediction, self.decision_tree.predict(ag))
+        print("  batch predictions matched.")
+        self.assertGreater(len(self.decision_tree.compile()), 1, "The compiled tree should have more than a root.")
+        self.decision_tree.decision_tree_root = LeafNode("water", depth=0)
+        self.assertEqual(list(self.decision_tree.predict_batch(points[:3])), ["water"] * 3,
+                         "Replacing the root should throw away the old compiled tree.")
+        print("  recompiled after replacing the root.")
+        print("Test_j completed.")
+
+    def test_k_parallel_build_matches_serial(self):
+        print("Starting test_k.")
+        data = make_synthetic_data(2000)
+        self.decision_tree.build_tree(data, SYNTHETIC_BOUNDS)
+        parallel_tree = DecisionTree()
+        with unittest.mock.patch("DecisionTree.PARALLEL_MIN_ITEMS_PER_JOB", 100):
+            parallel_tree.build_tree(data, SYNTHETIC_BOUNDS, n_jobs=2)
+        self.assertEqual(repr(parallel_tree.decision_tree_root), repr(self.decision_tree.decision_tree_root),
+                         "The parallel build should make the same tree as the serial build.")
+        self.assertEqual(parallel_tree.max_depth_used, self.decision_tree.max_depth_used)
+        print("  trees matched.")
+
+        # with more distinct values than bins, a worker must still use the bins worked out from all of the data.
+        rng = random.Random(2)
+        float_data = [AnswerGroup(["x", "y"], [ag.get_attribute_for_name("x") + rng.random(),
+                                               ag.get_attribute_for_name("y") + rng.random()], ag.get_label())
+                      for ag in data]
+        self.decision_tree.build_tree(float_data, SYNTHETIC_BOUNDS, splitter="histogram")
+        with unittest.mock.patch("DecisionTree.PARALLEL_MIN_ITEMS_PER_JOB", 100):
+            parallel_tree.build_tree(float_data, SYNTHETIC_BOUNDS, n_jobs=2, splitter="histogram")
+        self.assertEqual(repr(parallel_tree.decision_tree_root), repr(self.decision_tree.decision_tree_root),
+                         "The parallel histogram build should make the same tree as the serial build.")
+        print("  histogram trees matched.")
+        print("Test_k completed.")
+
+    def test_l_exact_splitter(self):
+        print("Starting test_l.")
+        answer_groups = make_synthetic_data(300)
+        splitter = ExactSplitter(ColumnarData.from_answer_groups(answer_groups),
+                                 self.decision_tree.build_conditions_for_range)
+        best_split = splitter.find_best_split(splitter.root(), SYNTHETIC_BOUNDS)
+
+        # try every midpoint the slow way.
+        N = len(answer_groups)
+        lowest_gini_index = 1000
+        for name in ["x", "y"]:
+            values = sorted({ag.get_attribute_for_name(name) for ag in answer_groups})
+            for i in range(len(values) - 1):
+                no_list, yes_list = self.decision_tree.split_answer_groups_by_condition(
+                    answer_groups, NumericCondition(name, (values[i] + values[i + 1]) / 2))
+                gini_index = (len(yes_list) / N * self.decision_tree.gini_coefficient_for_list(yes_list) +
+                              len(no_list) / N * self.decision_tree.gini_coefficient_for_list(no_list))
+                lowest_gini_index = min(lowest_gini_index, gini_index)
+        self.assertAlmostEqual(best_split.gini_index, lowest_gini_index, 12)
+        print("  best split passed.")
+
+        no_rows, yes_rows = splitter.partition(splitter.root(), best_split.condition)
+        for name, sorted_rows in splitter.sorted_index.items():
+            for rows in (no_rows, yes_rows):
+                values = splitter.data.columns[name][sorted_rows[rows[0]:rows[1]]]
+                self.assertTrue((values[:-1] <= values[1:]).all(), "Each child's rows should still be sorted.")
+        print("  sorted partition passed.")
+
+        self.decision_tree.build_tree(answer_groups, SYNTHETIC_BOUNDS, splitter="exact")
+        num_correct = sum(self.decision_tree.predict(ag) == ag.get_label() for ag in answer_groups)
+        self.assertGreater(num_correct, 0.97 * N, "The exact tree should fit its training data.")
+        print("  exact tree passed.")
+        print("Test_l completed.")
+
+    def test_m_histogram_splitter(self):
+        print("Starting test_m.")
+        answer_groups = make_synthetic_data(3000)
+        data = ColumnarData.from_answer_groups(answer_groups)
+        splitter = HistogramSplitter(data, self.decision_tree.build_conditions_for_range)
+        self.assertLessEqual(len(splitter.bin_edges["x"]), 255, "There should be at most 256 bins.")
+        best_split = splitter.find_best_split(splitter.root(), SYNTHETIC_BOUNDS)
+        no_rows, yes_rows = splitter.partition(splitter.root(), best_split.condition)
+        for rows in (no_rows, yes_rows):
+            self.assertTrue((splitter.histograms[rows] == splitter.histogram_for_rows(rows)).all(),
+                            "Both children's histograms should match a recount.")
+        print("  histograms passed.")
+
+        # with fewer than 256 different values, the histogram tree should divide up the data like the exact tree.
+        small_groups = [ag for ag in answer_groups if ag.get_attribute_for_name("x") < 200
+                        and ag.get_attribute_for_name("y") < 200 or ag.get_attribute_for_name("x") >= 700]
+        small_groups = [AnswerGroup(["x", "y"],
+                                    [ag.get_attribute_for_name("x") % 200, ag.get_attribute_for_name("y") % 200],
+                                    ag.get_label()) for ag in small_groups]
+        exact_tree = DecisionTree()
+        exact_tree.build_tree(small_groups, (0, 0, 200, 200), splitter="exact")
+        self.decision_tree.build_tree(small_groups, (0, 0, 200, 200), splitter="histogram")
+        for ag in small_groups:
+            self.assertEqual(self.decision_tree.predict(ag), exact_tree.predict(ag))
+        print("  matched the exact tree.")
+        print("Test_m completed.")
+
+    def test_n_answer_group_table(self):
+        print("Starting test_n.")
+        answer_groups = make_synthetic_data(1000)
+        table = AnswerGroupTable.from_answer_groups(answer_groups, ["x", "y"], label_names=["water"])
+        self.assertEqual(len(table), 1000)
+        self.assertEqual(table[3].get_attribute_for_name("y"), answer_groups[3].get_attribute_for_name("y"))
+        self.assertEqual(table.labels(), [ag.get_label() for ag in answer_groups])
+        self.assertTrue(NumericCondition("x", 300).ask(table[5]) == NumericCondition("x", 300).ask(answer_groups[5]))
+        print("  rows passed.")
+
+        self.decision_tree.build_tree(table, SYNTHETIC_BOUNDS)
+        list_tree = DecisionTree()
+        list_tree.build_tree(answer_groups, SYNTHETIC_BOUNDS)
+        self.assertEqual(repr(self.decision_tree.decision_tree_root), repr(list_tree.decision_tree_root),
+                         "Building from a table should make the same tree as building from a list.")
+        self.assertEqual(self.decision_tree.predict(table[7]), list_tree.predict(answer_groups[7]))
+        self.assertEqual(list(self.decision_tree.predict_batch(table)), list(list_tree.predict_batch(table)))
+        print("  tree passed.")
+
+        table[0].set_label(None)
+        self.assertIsNone(table[0].get_label())
+        table[0].set_label("swamp")
+        self.assertEqual(table.label_names, ["water", "land", "swamp"])
+        print("  labels passed.")
+        print("Test_n completed.")
+
+    def test_o_save_and_load(self):
+        print("Starting test_o.")
+        self.decision_tree.build_tree(make_synthetic_data(1000), SYNTHETIC_BOUNDS)
+        test_data = make_synthetic_data(300, seed=2)
+        points = np.array([[ag.get_attribute_for_name("x"), ag.get_attribute_for_name("y")] for ag in test_data])
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "tree.bin")
+            self.decision_tree.save(path)
+            loaded_tree = DecisionTree.load(path)
+            self.assertIsInstance(loaded_tree.compiled_tree.threshold, np.memmap, "Loading should memory-map the file.")
+            self.assertEqual(list(loaded_tree.predict_batch(points)), list(self.decision_tree.predict_batch(points)))
+            for ag in test_data[:50]:
+                self.assertEqual(loaded_tree.predict(ag), self.decision_tree.predict(ag))
+            self.assertEqual(loaded_tree.max_depth_used, self.decision_tree.max_depth_used)
+            self.assertEqual(repr(loaded_tree.compiled_tree.to_node()), repr(self.decision_tree.decision_tree_root))
+            del loaded_tree  # (let go of the memory map so the folder can be removed.)
+        print("  round trip passed.")
+        print("Test_o completed.")
+
+    def test_p_generate_data_table(self):
+        print("Starting test_p.")
+        map_image = np.zeros((300, 400, 3), dtype=np.uint8)
+        map_image[200:, :, 0] = 255  # the bottom third is water.
+        table, correct_answers = DecisionTree3Main.generate_N_data_table(5000, rng=7, map_image=map_image)
+        same_table, _ = DecisionTree3Main.generate_N_data_table(5000, rng=7, map_image=map_image)
+        self.assertTrue((table.columns["x"] == same_table.columns["x"]).all(), "The same seed should give the same data.")
+        self.assertTrue((correct_answers == (table.columns["y"] >= 200)).all(), "Labels should come from the map.")
+        self.assertEqual(table[0].get_label(), ["land", "water"][correct_answers[0]])
+        print("  sampling passed.")
+
+        _, stratified_answers = DecisionTree3Main.generate_N_data_table(1000, rng=7, land_fraction=0.25,
+                                                                        map_image=map_image)
+        self.assertEqual(int(np.count_nonzero(stratified_answers == 0)), 250, "A quarter of the points should be land.")
+        print("  stratified sampling passed.")
+
+        chunks = list(DecisionTree3Main.generate_data_chunks(2500, 1000, label_data=False, rng=7, map_image=map_image))
+        self.assertEqual([len(chunk) for chunk, _ in chunks], [1000, 1000, 500])
+        self.assertIsNone(chunks[0][0][0].get_label(), "Unlabeled chunks should have no labels.")
+        print("  chunks passed.")
+        print("Test_p completed.")
+
+    def test_q_predict_raster(self):
+        print("Starting test_q.")
+        width, height = SYNTHETIC_BOUNDS[2], SYNTHETIC_BOUNDS[3]
+        all_pixels = np.stack(np.meshgrid(np.arange(width), np.arange(height)), axis=-1).reshape(-1, 2)
+        for splitter in ["grid", "exact"]:
+            self.decision_tree.build_tree(make_synthetic_data(1000), SYNTHETIC_BOUNDS, splitter=splitter)
+            raster = self.decision_tree.predict_raster(width, height)
+            self.assertEqual(raster.shape, (height, width))
+            expected = self.decision_tree.compile().predict_codes(all_pixels).reshape(height, width)
+            self.assertTrue((raster == expected).all(), f"The {splitter} raster should match predicting every pixel.")
+        print("  raster passed.")
+
+        test_data = make_synthetic_data(200, seed=2)
+        expected = [self.decision_tree.predict(ag) for ag in test_data]
+        self.decision_tree.enable_raster_lookup(width, height)
+        self.assertEqual([self.decision_tree.predict(ag) for ag in test_data], expected)
+        off_the_map = np.array([[-5, 10], [width + 3, 2], [10.5, 20.25]])
+        self.assertEqual(list(self.decision_tree.predict_batch(off_the_map)),
+                         list(self.decision_tree.compile().predict_batch(off_the_map)))
+        print("  lookup passed.")
+        print("Test_q completed.")
+
+    def test_r_streaming_build(self):
+        print("Starting test_r.")
+        data = make_synthetic_data(3000)
+        chunks = [data[start:start + 700] for start in range(0, len(data), 700)]
+        num_passes = []
+
+        def chunk_source():
+            num_passes.append(1)
+            return iter(chunks)
+
+        streaming_tree = DecisionTree()
+        StreamingTreeBuilder(streaming_tree).build(chunk_source, SYNTHETIC_BOUNDS)
+        self.decision_tree.build_tree(data, SYNTHETIC_BOUNDS)
+        self.assertEqual(repr(streaming_tree.decision_tree_root), repr(self.decision_tree.decision_tree_root),
+                         "Streaming the data should make the same tree.")
+        self.assertEqual(streaming_tree.max_depth_used, self.decision_tree.max_depth_used)
+        self.assertEqual(streaming_tree.bounds, self.decision_tree.bounds)
+        self.assertEqual(len(num_passes), self.decision_tree.max_depth_used + 1, "There should be one pass per level.")
+        print("  streamed tree matched.")
+        print("Test_r completed.")
+
+    def test_s_update_matches_rebuild(self):
+        print("Starting test_s.")
+        data = make_synthetic_data(3000)
+        self.decision_tree.build_tree(data[:2000], SYNTHETIC_BOUNDS, updatable=True)
+        old_prediction = self.decision_tree.predict_batch(np.array([[400, 300]]))
+        self.decision_tree.update(data[2000:])
+        self.assertIsNone(self.decision_tree.compiled_tree, "Updating should throw away the old compiled tree.")
+        self.assertEqual(len(old_prediction), 1)
+
+        rebuilt_tree = DecisionTree()
+        rebuilt_tree.build_tree(data, SYNTHETIC_BOUNDS)
+        self.assertEqual(repr(self.decision_tree.decision_tree_root), repr(rebuilt_tree.decision_tree_root),
+                         "Updating should make the same tree as building from all the data.")
+        self.assertEqual(self.decision_tree.max_depth_used, rebuilt_tree.max_depth_used)
+        leaves = self.decision_tree.leaves_under(self.decision_tree.decision_tree_root)
+        self.assertEqual(sorted(np.concatenate([leaf.sample_ids for leaf in leaves])), list(range(len(data))),
+                         "Every point should be in exactly one leaf.")
+
+        # a series of small updates rebuilds subtrees many times over, and some of them come out shallower.
+        self.decision_tree.build_tree(data[:1000], SYNTHETIC_BOUNDS, updatable=True)
+        for start in range(1000, len(data), 100):
+            self.decision_tree.update(data[start:start + 100])
+        self.assertEqual(repr(self.decision_tree.decision_tree_root), repr(rebuilt_tree.decision_tree_root))
+        self.assertEqual(self.decision_tree.max_depth_used, rebuilt_tree.max_depth_used)
+        print("  updated tree matched.")
+
+        with self.assertRaises(ValueError):
+            self.decision_tree.build_tree(data[:2000], SYNTHETIC_BOUNDS, splitter="exact", updatable=True)
+        print("  non-grid tree refused.")
+        self.decision_tree.build_tree(data[:2000], SYNTHETIC_BOUNDS)
+        self.assertIsNone(self.decision_tree.training_data)
+        self.assertTrue(all(leaf.sample_ids is None for leaf in
+                            self.decision_tree.leaves_under(self.decision_tree.decision_tree_root)))
+        with self.assertRaises(ValueError):
+            self.decision_tree.update(data[2000:])
+        print("  tree built without updatable=True refused.")
+        print("Test_s completed.")
+
+    def test_t_build_stats(self):
+        print("Starting test_t.")
+        data = make_synthetic_data(3000)
+        seen = []
+        stats = BuildStats(on_node=seen.append)
+        self.decision_tree.build_tree(data, SYNTHETIC_BOUNDS, stats=stats)
+        leaves = self.decision_tree.leaves_under(self.decision_tree.decision_tree_root)
+        self.assertEqual(len(stats.nodes), 2 * len(leaves) - 1, "There should be stats for every node.")
+        self.assertEqual(len(seen), len(stats.nodes), "on_node should be called for every node.")
+        self.assertEqual(stats.num_training_items, len(data))
+        self.assertGreater(stats.total_seconds, 0)
+
+        summaries = stats.summary_by_depth()
+        self.assertEqual(summaries[0].num_items, len(data), "The root sees all the data.")
+        self.assertEqual(summaries[0].num_branches, 1)
+        self.assertEqual(summaries[-1].depth, self.decision_tree.max_depth_used)
+        self.assertEqual(sum(summary.num_leaves for summary in summaries), len(leaves))
+        self.assertTrue(all(node_stats.gini_index is None for node_stats in stats.nodes if node_stats.is_leaf))
+        self.assertIn("mean gini", stats.report())
+        print("  stats matched the tree.")
+
+        with unittest.mock.patch("DecisionTree.PARALLEL_MIN_ITEMS_PER_JOB", 200):
+            parallel_stats = BuildStats()
+            self.decision_tree.build_tree(data, SYNTHETIC_BOUNDS, n_jobs=2, stats=parallel_stats)
+        self.assertEqual([(s.depth, s.num_items) for s in sorted(parallel_stats.nodes, key=lambda s: (s.depth, s.num_items))],
+                         [(s.depth, s.num_items) for s in sorted(stats.nodes, key=lambda s: (s.depth, s.num_items))],
+                         "Workers' stats should be merged in.")
+        print("  parallel stats matched.")
+        print("Test_t completed.")
+
+    def test_u_cost_complexity_pruning(self):
+        print("Starting test_u.")
+        # flip some of the labels, so that the full tree has noise to overfit.
+        rng = random.Random(5)
+        data = make_synthetic_data(4000)
+        for answer_group in data:
+            if rng.random() < 0.1:
+                answer_group.set_label("water" if answer_group.get_label() == "land" else "land")
+        training_data, validation_data = data[:3000], data[3000:]
+        self.decision_tree.build_tree(training_data, SYNTHETIC_BOUNDS)
+        full_root = copy.deepcopy(self.decision_tree.decision_tree_root)
+        alphas = self.decision_tree.pruning_alphas()
+        self.assertEqual(alphas, sorted(alphas))
+
+        def min_cost(node: GenericNode, alpha: float) -> float:
+            # the cheapest pruned subtree, worked out directly from the definition.
+            as_leaf = node.num_misclassified + alpha
+            if isinstance(node, LeafNode):
+                return as_leaf
+            return min(as_leaf, min_cost(node.__yes_node__, alpha) + min_cost(node.__no_node__, alpha))
+
+        num_leaves_before = None
+        for alpha in [0.0] + alphas[::max(1, len(alphas) // 8)] + [alphas[-1]]:
+            self.decision_tree.decision_tree_root = copy.deepcopy(full_root)
+            self.decision_tree.prune(alpha=alpha)
+            leaves = self.decision_tree.leaves_under(self.decision_tree.decision_tree_root)
+            cost = sum(leaf.num_misclassified for leaf in leaves) + alpha * len(leaves)
+            self.assertAlmostEqual(cost, min_cost(full_root, alpha), msg=f"Pruned tree at alpha {alpha} isn't optimal.")
+            if num_leaves_before is not None:
+                self.assertLessEqual(len(leaves), num_leaves_before, "Larger alphas should give smaller trees.")
+            num_leaves_before = len(leaves)
+        self.assertIsInstance(self.decision_tree.decision_tree_root, LeafNode,
+                              "The largest alpha should prune all the way to the root.")
+        print("  pruning sequence was optimal.")
+
+        def num_correct(tree: DecisionTree) -> int:
+            return sum(tree.predict(answer_group) == answer_group.get_label() for answer_group in validation_data)
+
+        self.decision_tree.decision_tree_root = copy.deepcopy(full_root)
+        full_correct = num_correct(self.decision_tree)
+        full_num_leaves = len(self.decision_tree.leaves_under(full_root))
+        self.decision_tree.prune(validation_data=validation_data)
+        self.assertGreaterEqual(num_correct(self.decision_tree), full_correct)
+        self.assertLess(len(self.decision_tree.leaves_under(self.decision_tree.decision_tree_root)), full_num_leaves)
+        print("  validation pruning made a smaller tree that was at least as accurate.")
+        print("Test_u completed.")
+
+    def test_v_best_first_growth(self):
+        print("Starting test_v.")
+        data = make_synthetic_data(3000)
+        self.decision_tree.build_tree(data, SYNTHETIC_BOUNDS)
+        best_first_tree = DecisionTree()
+        for splitter in ("grid", "histogram"):
+            self.decision_tree.build_tree(data, SYNTHETIC_BOUNDS, splitter=splitter)
+            best_first_tree.build_tree(data, SYNTHETIC_BOUNDS, splitter=splitter, growth="best_first")
+            self.assertEqual(repr(best_first_tree.decision_tree_root), repr(self.decision_tree.decision_tree_root),
+                             f"With no budget, best-first growth ({splitter}) should make the same tree.")
+        full_num_leaves = len(self.decision_tree.leaves_under(self.decision_tree.decision_tree_root))
+        print("  unlimited best-first tree matched.")
+
+        def num_correct(tree: DecisionTree) -> int:
+            return sum(tree.predict(answer_group) == answer_group.get_label() for answer_group in data)
+
+        previous_correct = 0
+        for max_leaves in (1, 2, 8, 32):
+            stats = BuildStats()
+            best_first_tree.build_tree(data, SYNTHETIC_BOUNDS, growth="best_first", max_leaves=max_leaves, stats=stats)
+            leaves = best_first_tree.leaves_under(best_first_tree.decision_tree_root)
+            self.assertEqual(len(leaves), min(max_leaves, full_num_leaves))
+            self.assertEqual(len(stats.nodes), 2 * len(leaves) - 1)
+            self.assertGreaterEqual(num_correct(best_first_tree), previous_correct,
+                                    "More leaves should fit the training data at least as well.")
+            previous_correct = num_correct(best_first_tree)
+        best_first_tree.build_tree(data, SYNTHETIC_BOUNDS, growth="best_first", max_nodes=15)
+        self.assertEqual(len(best_first_tree.leaves_under(best_first_tree.decision_tree_root)), 8)
+        print("  leaf and node budgets were kept.")
+
+        best_first_tree.build_tree(data, SYNTHETIC_BOUNDS, growth="best_first", time_budget=0.0)
+        self.assertIsInstance(best_first_tree.decision_tree_root, LeafNode, "With no time, we should get one leaf.")
+        with self.assertRaises(ValueError):
+            best_first_tree.build_tree(data, SYNTHETIC_BOUNDS, max_leaves=8)
+        print("  time budget was kept.")
+        print("Test_v completed.")
+
+    def test_w_multi_class_and_categorical_features(self):
+        print("Starting test_w.")
+        rng = np.random.default_rng(3)
+        N = 3000
+        x = rng.integers(0, 800, size=N)
+        y = rng.integers(0, 600, size=N)
+        elevation = rng.random(N) * 100
+        terrain = rng.choice(["grass", "rock", "sand"], size=N)
+        labels = np.where(elevation > 70, "mountain",
+                          np.where(terrain == "sand", "beach", np.where(x > 400, "water", "land")))
+        names = ["x", "y", "elevation", "terrain"]
+        data = [AnswerGroup(question_name_list=names, answer_list=[int(a), int(b), float(c), str(d)], label=str(label))
+                for a, b, c, d, label in zip(x, y, elevation, terrain, labels)]
+        table = AnswerGroupTable({"x": x, "y": y, "elevation": elevation, "terrain": terrain})
+
+        self.assertEqual(self.decision_tree.counts_per_label(data[:20]),
+                         {label: int(np.count_nonzero(labels[:20] == label))
+                          for label in {"land", "water"} | set(labels[:20])})
+        self.assertEqual(self.decision_tree.get_most_frequent_label_in_list(
+            [AnswerGroup(names, [0, 0, 0.0, "rock"], label) for label in ["beach", "mountain", "mountain", "land"]]),
+            "mountain")
+        print("  list helpers handled more labels.")
+
+        for splitter in ("grid", "exact", "histogram"):
+            tree = DecisionTree()
+            tree.build_tree(data, SYNTHETIC_BOUNDS, splitter=splitter, feature_names=names)
+            self.assertEqual(tree.label_names[:2], ["land", "water"])
+            self.assertEqual(set(tree.label_names[2:]), {"beach", "mountain"}, "New labels go on the end.")
+            self.assertEqual(tree.categories, {"terrain": ["grass", "rock", "sand"]})
+            predictions = tree.predict_batch(table)
+            self.assertGreater(np.mean(predictions == labels), 0.99, f"The {splitter} tree should learn the classes.")
+            self.assertEqual(list(predictions), [tree.predict(answer_group) for answer_group in data],
+                             "Batch and one-at-a-time predictions should match.")
+            with tempfile.TemporaryDirectory() as directory:
+                tree.save(os.path.join(directory, "tree.bin"))
+                loaded_tree = DecisionTree.load(os.path.join(directory, "tree.bin"))
+                self.assertEqual(list(loaded_tree.predict_batch(table)), list(predictions))
+                self.assertEqual([loaded_tree.predict(answer_group) for answer_group in data[:100]],
+                                 list(predictions[:100]))
+                del loaded_tree
+            print(f"  {splitter} tree matched.")
+
+        # with only categorical attributes, every splitter has the same (few) conditions to choose from.
+        soil = rng.choice(["clay", "loam"], size=N)
+        soil_labels = np.where(terrain == "sand", "beach", np.where(soil == "clay", "water", "land"))
+        soil_data = [AnswerGroup(["terrain", "soil"], [str(a), str(b)], str(label))
+                     for a, b, label in zip(terrain, soil, soil_labels)]
+        soil_table = AnswerGroupTable({"terrain": terrain, "soil": soil})
+        grid_tree = DecisionTree()
+        grid_tree.build_tree(soil_data, SYNTHETIC_BOUNDS, feature_names=["terrain", "soil"])
+        for splitter in ("grid", "exact", "histogram"):
+            tree = DecisionTree()
+            tree.build_tree(soil_data, SYNTHETIC_BOUNDS, splitter=splitter, feature_names=["terrain", "soil"])
+            self.assertTrue(np.array_equal(tree.predict_batch(soil_table), soil_labels))
+            self.assertEqual(f"{tree.decision_tree_root}", f"{grid_tree.decision_tree_root}",
+                             f"The {splitter} tree should match the grid tree.")
+        print("  categorical-only trees matched.")
+        print("Test_w completed.")
+
+    def test_x_deeper_than_recursion_limit(self):
+        print("Starting test_x.")
+        # alternating labels along a line make the exact splitter peel off one or two points per level, so the tree is
+        # nearly as deep as the data is long.
+        N = sys.getrecursionlimit() + 500
+        data = [AnswerGroup(question_name_list=["x", "y"], answer_list=[i, 0], label="land" if i % 2 else "water")
+                for i in range(N)]
+        with unittest.mock.patch("DecisionTree.MAX_DEPTH", 2 * N):
+            self.decision_tree.build_tree(data, (0, 0, N, 1), splitter="exact")
+        self.assertGreater(self.decision_tree.max_depth_used, sys.getrecursionlimit())
+        print(f"  built a tree {self.decision_tree.max_depth_used} levels deep.")
+
+        predictions = [self.decision_tree.predict(answer_group) for answer_group in data]
+        labels = [answer_group.label for answer_group in data]
+        self.assertGreater(np.mean(np.array(predictions) == np.array(labels)), 0.95)
+        self.assertEqual(predictions, list(self.decision_tree.predict_batch(AnswerGroupTable.from_answer_groups(data, ["x", "y"]))))
+        print("  predictions matched.")
+
+        description = f"{self.decision_tree.decision_tree_root}"
+        num_leaves = len(self.decision_tree.leaves_under(self.decision_tree.decision_tree_root))
+        self.assertEqual(description.count("\n"), 2 * num_leaves - 1, "Each leaf and each condition should get a line.")
+        print("  the tree could be printed.")
+        print("Test_x completed.")
+
+    def test_y_prediction_cache(self):
+        print("Starting test_y.")
+        training_data = make_synthetic_data(3000)
+        self.decision_tree.build_tree(training_data, SYNTHETIC_BOUNDS)
+        queries = training_data[:200] * 3
+        expected = [self.decision_tree.predict(answer_group) for answer_group in queries]
+
+        cache = self.decision_tree.enable_prediction_cache(max_size=1000)
+        self.assertEqual([self.decision_tree.predict(answer_group) for answer_group in queries], expected)
+        stats = self.decision_tree.prediction_cache_stats()
+        num_distinct = len({(answer_group.get_attribute_for_name("x"), answer_group.get_attribute_for_name("y"))
+                            for answer_group in queries})
+        self.assertEqual(stats.misses, num_distinct)
+        self.assertEqual(stats.hits, len(queries) - num_distinct)
+        self.assertEqual(stats.size, num_distinct)
+        print(f"  cache: {stats}.")
+
+        small_tree = DecisionTree()
+        small_cache = small_tree.enable_prediction_cache(max_size=10)
+        small_tree.build_tree(training_data, SYNTHETIC_BOUNDS)
+        for answer_group in training_data[:50]:
+            small_tree.predict(answer_group)
+        self.assertEqual(len(small_cache), 10)
+        self.assertGreater(small_cache.evictions, 0, "A full cache should drop its oldest answers.")
+        print("  a full cache stayed within its size.")
+
+        # a new tree that gives the opposite answers - the old ones mustn't come out of the cache.
+        flipped = [AnswerGroup(["x", "y"], [answer_group.get_attribute_for_name("x"),
+                                            answer_group.get_attribute_for_name("y")],
+                               "water" if answer_group.label == "land" else "land")
+                   for answer_group in training_data]
+        self.decision_tree.build_tree(flipped, SYNTHETIC_BOUNDS)
+        self.assertEqual(len(cache), 0, "Rebuilding the tree should empty the cache.")
+        self.assertEqual([self.decision_tree.predict(answer_group) for answer_group in queries],
+                         [self.decision_tree.predict_uncached(answer_group) for answer_group in queries])
+        self.decision_tree.prune(alpha=5.0)
+        self.assertEqual(len(cache), 0, "Pruning should empty the cache.")
+        self.decision_tree.disable_prediction_cache()
+        self.assertIsNone(self.decision_tree.prediction_cache_stats())
+        print("Test_y completed.")
+
+    def test_z_summed_area_splitter(self):
+        print("Starting test_z.")
+        training_data = make_synthetic_data(5000)
+        data = ColumnarData.from_answer_groups(training_data, ["x", "y"])
+        splitter = SummedAreaSplitter(data, self.decision_tree.build_conditions_for_range)
+        rows = splitter.root()
+        self.assertEqual(list(splitter.label_counts(rows)), list(data.label_counts()))
+        best_split = splitter.find_best_split(rows, SYNTHETIC_BOUNDS)
+        grid_splitter = GridSplitter(data, self.decision_tree.build_conditions_for_range)
+        grid_split = grid_splitter.find_best_split(grid_splitter.root(), SYNTHETIC_BOUNDS)
+        self.assertIs(type(best_split.condition), type(grid_split.condition))
+        self.assertEqual(f"{best_split.condition}", f"{grid_split.condition}")
+        self.assertTrue(np.array_equal(best_split.candidate_no_counts, grid_split.candidate_no_counts))
+        no_rows, yes_rows = splitter.partition(rows, best_split.condition)
+        self.assertEqual(list(splitter.label_counts(no_rows)), list(best_split.no_counts))
+        self.assertEqual(list(splitter.label_counts(yes_rows)), list(best_split.yes_counts))
+        print("  counts matched the grid splitter.")
+
+        grid_tree = DecisionTree()
+        grid_tree.build_tree(training_data, SYNTHETIC_BOUNDS, splitter="grid")
+        for growth in ("depth_first", "best_first"):
+            self.decision_tree.build_tree(training_data, SYNTHETIC_BOUNDS, splitter="summed_area", growth=growth)
+            self.assertEqual(f"{self.decision_tree.decision_tree_root}", f"{grid_tree.decision_tree_root}",
+                             f"The {growth} summed_area tree should be the grid tree.")
+        # (the nodes are just rectangles of the table, so the leaves don't know their rows.)
+        self.assertTrue(all(leaf.sample_ids is None for leaf in
+                            self.decision_tree.leaves_under(self.decision_tree.decision_tree_root)))
+        with self.assertRaises(ValueError):
+            self.decision_tree.update(make_synthetic_data(10))
+        parallel_tree = DecisionTree()
+        parallel_tree.build_tree(training_data, SYNTHETIC_BOUNDS, splitter="summed_area", n_jobs=2)
+        self.assertEqual(f"{parallel_tree.decision_tree_root}", f"{grid_tree.decision_tree_root}")
+        table = AnswerGroupTable.from_answer_groups(training_data, ["x", "y"], ["land", "water"])
+        table.label_codes = table.label_codes.astype(np.int8)  # (as generate_N_data_table makes them.)
+        table_tree = DecisionTree()
+        table_tree.build_tree(table, SYNTHETIC_BOUNDS, splitter="summed_area")
+        self.assertEqual(f"{table_tree.decision_tree_root}", f"{grid_tree.decision_tree_root}")
+        print("  trees matched the grid splitter.")
+
+        with self.assertRaises(ValueError):
+            DecisionTree().build_tree([AnswerGroup(["x", "y", "elevation"], [1, 2, 3.0], "land")], SYNTHETIC_BOUNDS,
+                                      splitter="summed_area", feature_names=["x", "y", "elevation"])
+        with self.assertRaises(ValueError):
+            DecisionTree().build_tree(training_data, (0.5, 0, 800, 600), splitter="summed_area")
+        print("Test_z completed.")
+
+    def test_za_generated_code(self):
+        print("Starting test_za.")
+        training_data = make_synthetic_data(3000)
+        self.decision_tree.build_tree(training_data, SYNTHETIC_BOUNDS)
+        module = self.decision_tree.to_module()
+        points = [(answer_group.get_attribute_for_name("x"), answer_group.get_attribute_for_name("y"))
+                  for answer_group in training_data]
+        expected = [self.decision_tree.predict(answer_group) for answer_group in training_data]
+        self.assertEqual([module.predict_one(x, y) for x, y in points], expected)
+        self.assertEqual([module.predict(answer_group) for answer_group in training_data], expected)
+        self.assertEqual(list(module.predict_batch(np.array(points))), expected)
+        self.assertIs(self.decision_tree.to_module(), module, "The same tree should come from the cache.")
+        print("  generated code matched the tree.")
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "generated_tree.py")
+            GeneratedCodeFile.write_generated_module(path, self.decision_tree.compile())
+            spec = importlib.util.spec_from_file_location("generated_tree", path)
+            imported = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(imported)
+            self.assertEqual([imported.predict_one(x, y) for x, y in points[:100]], expected[:100])
+        print("  the saved module could be imported.")
+
+        names = ["x", "y", "terrain", "class"]  # ("class" can't be an argument name.)
+        rng = np.random.default_rng(5)
+        x = rng.integers(0, 800, size=2000)
+        y = rng.integers(0, 600, size=2000)
+        terrain = rng.choice(["grass", "rock", "sand"], size=2000)
+        kind = rng.random(2000)
+        labels = np.where(terrain == "sand", "beach", np.where(kind > 0.5, "water", "land"))
+        data = [AnswerGroup(names, [int(a), int(b), str(c), float(d)], str(label))
+                for a, b, c, d, label in zip(x, y, terrain, kind, labels)]
+        tree = DecisionTree()
+        tree.build_tree(data, SYNTHETIC_BOUNDS, feature_names=names)
+        module = tree.to_module()
+        self.assertIn("def predict_one(x, y, terrain, feature_3):", tree.to_source())
+        self.assertEqual([module.predict(answer_group) for answer_group in data],
+                         [tree.predict(answer_group) for answer_group in data])
+        table = AnswerGroupTable({"x": x, "y": y, "terrain": terrain, "class": kind})
+        self.assertEqual(list(module.predict_batch(tree.compile().as_array(table))), list(tree.predict_batch(table)))
+        print("  categorical features matched.")
+
+        with unittest.mock.patch("GeneratedCodeFile.MAX_GENERATED_DEPTH", 3):
+            with self.assertRaises(ValueError):
+                self.decision_tree.to_source()
+        print("Test_za completed.")
+
+    def test_zb_prediction_service(self):
+        print("Starting test_zb.")
+        training_data = make_synthetic_data(3000)
+        self.decision_tree.build_tree(training_data, SYNTHETIC_BOUNDS)
+        flipped = [AnswerGroup(["x", "y"], [answer_group.get_attribute_for_name("x"),
+                                            answer_group.get_attribute_for_name("y")],
+                               "water" if answer_group.label == "land" else "land")
+                   for answer_group in training_data]
+        flipped_tree = DecisionTree()
+        flipped_tree.build_tree(flipped, SYNTHETIC_BOUNDS)
+        points = [(answer_group.get_attribute_for_name("x"), answer_group.get_attribute_for_name("y"))
+                  for answer_group in training_data[:500]]
+        expected = [self.decision_tree.predict(answer_group) for answer_group in training_data[:500]]
+        flipped_expected = [flipped_tree.predict(answer_group) for answer_group in training_data[:500]]
+
+        async def exercise_service():
+            service = PredictionService(self.decision_tree, max_batch_size=64, max_wait_seconds=0.005)
+            await service.start()
+            labels = await asyncio.gather(*[service.predict(point) for point in points])
+            self.assertEqual(labels, expected)
+            metrics = service.metrics()
+            self.assertEqual(metrics.num_requests, len(points))
+            self.assertLess(metrics.num_batches, len(points), "Requests that arrive together should share a batch.")
+            self.assertLessEqual(metrics.latency_p50, metrics.latency_max)
+            print(f"  answered {metrics.num_requests} requests in {metrics.num_batches} batches.")
+
+            with self.assertRaises(ValueError):
+                await service.predict((1, 2, 3))
+
+            # swap the tree while requests are waiting: none are lost, and the later ones get the new tree.
+            first_half = [asyncio.ensure_future(service.predict(point)) for point in points[:250]]
+            await asyncio.sleep(0)
+            service.swap_tree(flipped_tree)
+            second_half = await asyncio.gather(*[service.predict(point) for point in points[250:]])
+            first_half = await asyncio.gather(*first_half)
+            self.assertEqual(len(first_half), 250)
+            self.assertTrue(all(label in (a, b) for label, a, b in zip(first_half, expected, flipped_expected)))
+            self.assertEqual(second_half, flipped_expected[250:])
+            self.assertEqual(service.metrics().num_swaps, 1)
+            print("  the tree was swapped without losing requests.")
+
+            server = await service.serve("127.0.0.1", 0)
+            host, port = server.sockets[0].getsockname()[:2]
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write("".join(f"{x} {y}\n" for x, y in points[:20]).encode() + b"1 2 3\nMETRICS\n")
+            await writer.drain()
+            answers = [(await reader.readline()).decode().strip() for _ in range(22)]
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            await service.stop()
+            return answers
+
+        answers = asyncio.run(exercise_service())
+        self.assertEqual(answers[:20], flipped_expected[:20])
+        self.assertTrue(answers[20].startswith("ERROR"))
+        self.assertIn("num_requests", answers[21])
+        print("  requests over TCP were answered.")
+        print("Test_zb completed.")
+
+    def test_zc_evaluation(self):
+        print("Starting test_zc.")
+        training_data = make_synthetic_data(3000)
+        testing_data = make_synthetic_data(5000, seed=2)
+        self.decision_tree.build_tree(training_data, SYNTHETIC_BOUNDS)
+        labels = [answer_group.label for answer_group in testing_data]
+        predictions = [self.decision_tree.predict(answer_group) for answer_group in testing_data]
+
+        report = self.decision_tree.evaluate(testing_data, region_size=100)
+        self.assertEqual(report.num_points, len(testing_data))
+        self.assertEqual(report.num_correct, sum(a == b for a, b in zip(labels, predictions)))
+        self.assertEqual(int(report.confusion_matrix[0, 1]),
+                         sum(a == "land" and b == "water" for a, b in zip(labels, predictions)))
+        self.assertEqual(report.region_points.shape, (6, 8))
+        self.assertEqual(int(report.region_points.sum()), len(testing_data))
+        self.assertEqual(int(report.region_errors.sum()), report.num_points - report.num_correct)
+        self.assertEqual([answer_group.label for answer_group in testing_data], labels, "The data shouldn't change.")
+        print(f"  accuracy {report.accuracy:0.3f}, as expected.")
+
+        table = AnswerGroupTable.from_answer_groups(testing_data, ["x", "y"])
+        label_codes = table.label_codes.copy()
+        in_parallel = self.decision_tree.evaluate(table, labels, region_size=100, n_jobs=2, chunk_size=1000)
+        self.assertTrue(np.array_equal(in_parallel.confusion_matrix, report.confusion_matrix))
+        self.assertTrue(np.array_equal(in_parallel.region_errors, report.region_errors))
+        self.assertTrue(np.array_equal(table.label_codes, label_codes), "The table's labels shouldn't change.")
+        print("  chunks in worker processes gave the same report.")
+
+        flipped_codes = 1 - label_codes
+        flipped = self.decision_tree.evaluate(table, flipped_codes, true_label_names=["land", "water"])
+        self.assertEqual(flipped.num_correct, report.num_points - report.num_correct)
+        self.assertIn("points correctly", flipped.summary())
+        with self.assertRaises(ValueError):
+            self.decision_tree.evaluate(table, labels[:10])
+        print("Test_zc completed.")
+
+    def test_zd_label_counts_from_parent_split(self):
+        print("Starting test_zd.")
+        training_data = make_synthetic_data(3000)
+        labels = np.array([answer_group.label for answer_group in training_data])
+        for splitter_class, kind in ((GridSplitter, "grid"), (ExactSplitter, "exact"), (HistogramSplitter, "histogram"),
+                                     (SummedAreaSplitter, "summed_area")):
+            for growth in ("depth_first", "best_first"):
+                with unittest.mock.patch.object(splitter_class, "label_counts", autospec=True,
+                                                side_effect=splitter_class.label_counts) as label_counts:
+                    self.decision_tree.build_tree(training_data, SYNTHETIC_BOUNDS, splitter=kind, growth=growth)
+                self.assertEqual(label_counts.call_count, 1, f"{kind} ({growth}) should only count the root's labels.")
+
+                # every node's counts should still be right: a leaf's are its own rows', a branch's its children's sum.
+                # (the tree isn't updatable, so the leaves don't keep their rows - we find them by asking the tree.)
+                rows_for_leaf: Dict[int, List[int]] = {}
+                for i, answer_group in enumerate(training_data):
+                    node = self.decision_tree.decision_tree_root
+                    while isinstance(node, BranchNode):
+                        node = node.__yes_node__ if node.my_condition.ask(answer_group) else node.__no_node__
+                    rows_for_leaf.setdefault(id(node), []).append(i)
+                to_visit = [self.decision_tree.decision_tree_root]
+                while len(to_visit) > 0:
+                    node = to_visit.pop()
+                    if isinstance(node, BranchNode):
+                        self.assertTrue(np.array_equal(node.label_counts, node.__yes_node__.label_counts +
+                                                       node.__no_node__.label_counts))
+                        self.assertGreater(np.count_nonzero(node.label_counts), 1, "A pure node shouldn't be split.")
+                        to_visit += [node.__yes_node__, node.__no_node__]
+                    else:
+                        leaf_rows = rows_for_leaf[id(node)]
+                        leaf_labels = labels[leaf_rows]
+                        self.assertEqual(list(node.label_counts),
+                                         [int(np.count_nonzero(leaf_labels == name))
+                                          for name in self.decision_tree.label_names])
+                        self.assertAlmostEqual(gini_coefficient_for_counts(node.label_counts),
+                                               self.decision_tree.gini_coefficient_for_list(
+                                                   [training_data[i] for i in leaf_rows]))
+            print(f"  {kind} trees counted the labels once.")
+        print("Test_zd completed.")
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,283 @@
+"""
+Measures how well a trained tree does on labeled data: its accuracy, its confusion matrix, and where on the map its
+mistakes are. The points are predicted in chunks with batch prediction (in a pool of processes, for very large test
+sets), and the inputs are never changed - the predictions and the true labels are only ever compared, never written
+back.
+
+        report = tree.evaluate(testing_data, testing_answers, region_size=50, n_jobs=4)
+        print(report.summary())
+"""
+import math
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from AnswerGroupFile import AnswerGroup, AnswerGroupTable, NO_LABEL
+from CompiledTreeFile import CompiledTree
+
+EVALUATION_CHUNK_SIZE = 262144  # how many points are predicted at once (and sent to a worker process at a time).
+
+
+class RegionGrid:
+    """
+    divides the map, from (x_min, y_min), into square regions region_size pixels on a side: region (row, column)
+    holds the points with x_min + column * region_size <= x < x_min + (column + 1) * region_size, and likewise for y.
+    """
+    def __init__(self, bounds: Sequence[float], region_size: float):
+        """
+        :param bounds: (x_min, y_min, x_max, y_max) - the part of the map to cover
+        :param region_size: the width and height of each region
+        """
+        if region_size <= 0:
+            raise ValueError(f"region_size must be positive, not {region_size}.")
+        self.x_min, self.y_min = bounds[0], bounds[1]
+        self.region_size = region_size
+        self.num_columns = max(1, int(math.ceil((bounds[2] - bounds[0]) / region_size)))
+        self.num_rows = max(1, int(math.ceil((bounds[3] - bounds[1]) / region_size)))
+
+    def region_for_points(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """
+        :return: the number of each point's region (row * num_columns + column). Points off the edges of the map count
+        as being in the nearest region.
+        """
+        column = np.clip(((np.asarray(x) - self.x_min) // self.region_size).astype(np.int64), 0, self.num_columns - 1)
+        row = np.clip(((np.asarray(y) - self.y_min) // self.region_size).astype(np.int64), 0, self.num_rows - 1)
+        return row * self.num_columns + column
+
+
+class EvaluationReport:
+    """
+    the results of evaluating a tree on some labeled points.
+    """
+    def __init__(self,
+                 label_names: List[str],
+                 confusion_matrix: np.ndarray,
+                 region_grid: Optional[RegionGrid] = None,
+                 region_points: Optional[np.ndarray] = None,
+                 region_errors: Optional[np.ndarray] = None):
+        """
+        :param label_names: the labels, in the order of the confusion matrix's rows and columns
+        :param confusion_matrix: confusion_matrix[true code, predicted code] is how many points with that true label
+        were given that prediction
+        :param region_grid: how the map was divided for the error maps (None if there are no error maps)
+        :param region_points: a (rows, columns) array of how many points were in each region
+        :param region_errors: a (rows, columns) array of how many of those were predicted wrong
+        """
+        self.label_names = label_names
+        self.confusion_matrix = confusion_matrix
+        self.region_grid = region_grid
+        self.region_points = region_points
+        self.region_errors = region_errors
+
+    @property
+    def num_points(self) -> int:
+        return int(self.confusion_matrix.sum())
+
+    @property
+    def num_correct(self) -> int:
+        return int(np.trace(self.confusion_matrix))
+
+    @property
+    def accuracy(self) -> float:
+        return 0.0 if self.num_points == 0 else self.num_correct / self.num_points
+
+    def recall(self) -> np.ndarray:
+        """
+        :return: for each label, the fraction of the points that really have it that were predicted to have it (NaN
+        for a label no point has).
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.diag(self.confusion_matrix) / self.confusion_matrix.sum(axis=1)
+
+    def precision(self) -> np.ndarray:
+        """
+        :return: for each label, the fraction of the points predicted to have it that really do (NaN for a label that
+        was never predicted).
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.diag(self.confusion_matrix) / self.confusion_matrix.sum(axis=0)
+
+    def region_error_rates(self) -> np.ndarray:
+        """
+        :return: a (rows, columns) array of the fraction of each region's points that were predicted wrong (NaN for a
+        region with no points).
+        """
+        if self.region_points is None:
+            raise ValueError("This report has no error maps - evaluate with a region_size to get them.")
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.region_errors / self.region_points
+
+    def worst_regions(self, count: int = 5) -> List[Tuple[Tuple[float, float, float, float], int, int]]:
+        """
+        :param count: how many regions to list
+        :return: the regions with the most mistakes, most first: each one's (x_min, y_min, x_max, y_max) on the map,
+        its number of mistakes and its number of points.
+        """
+        if self.region_points is None:
+            raise ValueError("This report has no error maps - evaluate with a region_size to get them.")
+        grid = self.region_grid
+        result = []
+        for region in np.argsort(-self.region_errors, axis=None, kind="stable")[:count]:
+            row, column = divmod(int(region), grid.num_columns)
+            if self.region_errors[row, column] == 0:
+                break
+            x = grid.x_min + column * grid.region_size
+            y = grid.y_min + row * grid.region_size
+            result.append(((x, y, x + grid.region_size, y + grid.region_size),
+                           int(self.region_errors[row, column]), int(self.region_points[row, column])))
+        return result
+
+    def summary(self) -> str:
+        """
+        :return: a few lines describing the results, ready to print.
+        """
+        corner = "true \\ predicted"
+        first_width = max([len(name) for name in self.label_names] + [len(corner)])
+        width = max([len(name) for name in self.label_names] + [9])
+        lines = [f"Predicted {self.num_correct} out of {self.num_points} points correctly, for "
+                 f"{100 * self.accuracy:3.2f}%.",
+                 f"{corner:>{first_width}} " + " ".join(f"{name:>{width}}" for name in self.label_names) +
+                 f" {'recall':>7}"]
+        for name, row, recall in zip(self.label_names, self.confusion_matrix, self.recall()):
+            lines.append(f"{name:>{first_width}} " + " ".join(f"{count:>{width}}" for count in row) +
+                         f" {recall:>7.3f}")
+        lines.append(f"{'precision':>{first_width}} " + " ".join(f"{precision:>{width}.3f}"
+                                                                for precision in self.precision()))
+        if self.region_points is not None:
+            for (x_min, y_min, x_max, y_max), num_errors, num_points in self.worst_regions():
+                lines.append(f"\t{num_errors} of {num_points} wrong in x {x_min}-{x_max}, y {y_min}-{y_max}")
+        return "\n".join(lines)
+
+
+def evaluate(tree: CompiledTree,
+             data: List[AnswerGroup]|AnswerGroupTable|np.ndarray,
+             true_labels: Optional[Sequence[str]|np.ndarray] = None,
+             true_label_names: Optional[Sequence[str]] = None,
+             region_size: Optional[float] = None,
+             bounds: Optional[Sequence[float]] = None,
+             n_jobs: int = 1,
+             chunk_size: int = EVALUATION_CHUNK_SIZE) -> EvaluationReport:
+    """
+    predicts every point and compares the predictions with the true labels.
+    :param tree: the compiled tree to evaluate
+    :param data: the points - a list of AnswerGroups, an AnswerGroupTable, or an (N, number of features) array (as from
+    CompiledTree.as_array)
+    :param true_labels: the correct label for each point, as strings or as label codes. If left out, the labels in data
+    are used.
+    :param true_label_names: the label each code in true_labels stands for (defaults to the tree's label_names)
+    :param region_size: if given, also count the mistakes in each region_size x region_size square of the map
+    :param bounds: (x_min, y_min, x_max, y_max) - the part of the map to divide into regions (defaults to the smallest
+    rectangle holding all the points)
+    :param n_jobs: how many processes to predict the chunks in
+    :param chunk_size: how many points to predict at a time
+    :return: the report.
+    """
+    label_names = list(tree.label_names)
+    if isinstance(data, list):
+        data = AnswerGroupTable.from_answer_groups(data, tree.feature_names, label_names)
+    if true_labels is None:
+        if not isinstance(data, AnswerGroupTable):
+            raise ValueError("Give true_labels, or data with labels in it.")
+        true_labels, true_label_names = data.label_codes, data.label_names
+        if np.any(true_labels == NO_LABEL):
+            raise ValueError("Some of the points aren't labeled.")
+    X = tree.as_array(data) if isinstance(data, AnswerGroupTable) else np.asarray(data)
+    true_codes = label_codes_for(true_labels, true_label_names, label_names)  # (this adds any new labels to the end.)
+    if len(true_codes) != len(X):
+        raise ValueError(f"There are {len(X)} points, but {len(true_codes)} true labels.")
+
+    region_grid = None
+    if region_size is not None:
+        if "x" not in tree.feature_names or "y" not in tree.feature_names:
+            raise ValueError(f"Error maps need x and y, not just {tree.feature_names}.")
+        x = X[:, tree.feature_names.index("x")]
+        y = X[:, tree.feature_names.index("y")]
+        if bounds is None:
+            bounds = (x.min(), y.min(), x.max() + 1, y.max() + 1) if len(X) > 0 else (0, 0, 1, 1)
+        region_grid = RegionGrid(bounds, region_size)
+
+    chunks = [(X[start:start + chunk_size], true_codes[start:start + chunk_size])
+              for start in range(0, len(X), chunk_size)]
+    settings = (tree, len(label_names), region_grid)
+    if n_jobs > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs,
+                                 initializer=set_worker_evaluation_settings,
+                                 initargs=settings) as executor:
+            counts = list(executor.map(evaluate_chunk_in_worker, chunks))
+    else:
+        set_worker_evaluation_settings(*settings)
+        counts = [evaluate_chunk_in_worker(chunk) for chunk in chunks]
+        set_worker_evaluation_settings(None, None, None)
+
+    num_labels = len(label_names)
+    confusion_matrix = np.zeros((num_labels, num_labels), dtype=np.int64)
+    num_regions = 0 if region_grid is None else region_grid.num_rows * region_grid.num_columns
+    region_points = np.zeros(num_regions, dtype=np.int64)
+    region_errors = np.zeros(num_regions, dtype=np.int64)
+    for chunk_confusion, chunk_points, chunk_errors in counts:
+        confusion_matrix += chunk_confusion
+        region_points += chunk_points
+        region_errors += chunk_errors
+    if region_grid is None:
+        return EvaluationReport(label_names, confusion_matrix)
+    shape = (region_grid.num_rows, region_grid.num_columns)
+    return EvaluationReport(label_names, confusion_matrix, region_grid, region_points.reshape(shape),
+                            region_errors.reshape(shape))
+
+
+def label_codes_for(labels: Sequence[str]|np.ndarray,
+                    label_names: Optional[Sequence[str]],
+                    tree_label_names: List[str]) -> np.ndarray:
+    """
+    :param labels: labels, as strings or as codes
+    :param label_names: what each code in labels stands for (defaults to tree_label_names)
+    :param tree_label_names: the tree's labels. Any label in labels that isn't one of these is added to the end.
+    :return: the position of each label in tree_label_names.
+    """
+    labels = np.asarray(labels)
+    if labels.dtype.kind in "iu":
+        names = list(tree_label_names if label_names is None else label_names)
+        distinct_codes, inverse = np.unique(labels, return_inverse=True)
+        distinct_labels = [names[code] for code in distinct_codes.tolist()]
+    else:
+        distinct_labels, inverse = np.unique(labels.astype(str), return_inverse=True)
+        distinct_labels = distinct_labels.tolist()
+    for label in distinct_labels:
+        if label not in tree_label_names:
+            tree_label_names.append(label)
+    code_for_label = np.array([tree_label_names.index(label) for label in distinct_labels], dtype=np.int64)
+    return code_for_label[inverse.reshape(-1)]
+
+
+# the tree to evaluate, the number of labels and the RegionGrid (if any), set once in each worker process (rather than
+# sent along with every chunk).
+worker_evaluation_settings: Optional[Tuple[CompiledTree, int, Optional[RegionGrid]]] = None
+
+
+def set_worker_evaluation_settings(tree: Optional[CompiledTree],
+                                   num_labels: Optional[int],
+                                   region_grid: Optional[RegionGrid]):
+    global worker_evaluation_settings
+    worker_evaluation_settings = None if tree is None else (tree, num_labels, region_grid)
+
+
+def evaluate_chunk_in_worker(chunk: Tuple[np.ndarray, np.ndarray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    predicts one chunk of points with the tree given to set_worker_evaluation_settings.
+    :param chunk: the points' features, and their true label codes
+    :return: the chunk's confusion matrix, and its number of points and mistakes in each region (empty arrays if there
+    is no RegionGrid).
+    """
+    tree, num_labels, region_grid = worker_evaluation_settings
+    X, true_codes = chunk
+    predicted_codes = tree.predict_codes(X).astype(np.int64)
+    confusion_matrix = np.bincount(true_codes * num_labels + predicted_codes,
+                                   minlength=num_labels * num_labels).reshape(num_labels, num_labels)
+    if region_grid is None:
+        return confusion_matrix, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    num_regions = region_grid.num_rows * region_grid.num_columns
+    regions = region_grid.region_for_points(X[:, tree.feature_names.index("x")], X[:, tree.feature_names.index("y")])
+    region_points = np.bincount(regions, minlength=num_regions)
+    region_errors = np.bincount(regions[predicted_codes != true_codes], minlength=num_regions)
+    return confusion_matrix, region_points, region_errors
@@ -0,0 +1,176 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from AnswerGroupFile import AnswerGroup, AnswerGroupTable
+from CompiledTreeFile import CompiledTree, save_compiled_tree, load_compiled_tree
+from ConditionFile import NumericCondition
+from DecisionTree import DecisionTree
+from SplitEngineFile import ColumnarData
+
+VOTING_CHUNK_SIZE = 65536  # how many (point, tree) pairs we send down the trees at once when voting.
+
+
+class RandomizedDecisionTree(DecisionTree):
+    """
+    A DecisionTree that, at every node, only gets to consider a random selection of the conditions that
+    build_conditions_for_range would normally offer - a random subset of the attributes and a random subset of the
+    thresholds. Used by Forest so that its trees don't all make the same choices.
+    """
+    def __init__(self, seed: int, max_features: Optional[int] = None, threshold_fraction: float = 1.0):
+        """
+        :param seed: seeds this tree's random number generator, so that the same seed gives the same tree.
+        :param max_features: how many attributes each node may choose from (None means all of them).
+        :param threshold_fraction: the fraction of each attribute's thresholds each node may choose from.
+        """
+        super(RandomizedDecisionTree, self).__init__()
+        self.rng = np.random.default_rng(seed)
+        self.max_features = max_features
+        self.threshold_fraction = threshold_fraction
+
+    def build_conditions_for_range(self, range: List[int]|Tuple[int, int, int, int]) -> List[NumericCondition]:
+        all_conditions = super(RandomizedDecisionTree, self).build_conditions_for_range(range)
+        attribute_names = sorted({condition.attribute_name for condition in all_conditions})
+        if self.max_features is not None and self.max_features < len(attribute_names):
+            attribute_names = list(self.rng.choice(attribute_names, size=self.max_features, replace=False))
+
+        conditions_out: List[NumericCondition] = []
+        for name in attribute_names:
+            conditions = [condition for condition in all_conditions if condition.attribute_name == name]
+            num_to_keep = max(1, int(round(len(conditions) * self.threshold_fraction)))
+            keep = np.sort(self.rng.choice(len(conditions), size=num_to_keep, replace=False))
+            conditions_out += [conditions[i] for i in keep]
+        return conditions_out
+
+
+class Forest:
+    """
+    A "Forest" (a.k.a. random forest) is a collection of DecisionTrees, each trained on a different bootstrap sample of
+    the training data (drawn with replacement), and each limited to random subsets of the conditions at every node. To
+    make a prediction, every tree votes and the most popular label wins (ties go to the label listed first).
+
+    The trained trees are kept stacked together as one CompiledTree, so a batch of points goes down every tree at once,
+    rather than one Python call per tree.
+    """
+    def __init__(self,
+                 num_trees: int = 100,
+                 max_features: Optional[int] = None,
+                 threshold_fraction: float = 1.0,
+                 seed: Optional[int] = None):
+        """
+        :param num_trees: how many trees to train
+        :param max_features: how many attributes each node may choose from (None means all of them).
+        :param threshold_fraction: the fraction of each attribute's thresholds each node may choose from.
+        :param seed: seeds the bootstrap samples and each tree's random choices.
+        """
+        self.num_trees = num_trees
+        self.max_features = max_features
+        self.threshold_fraction = threshold_fraction
+        self.seed = seed
+        self.trees: List[CompiledTree] = []
+        self.stacked_trees: Optional[CompiledTree] = None
+        self.roots: Optional[np.ndarray] = None
+
+    def build_forest(self,
+                     training_data: List[AnswerGroup]|AnswerGroupTable,
+                     bounds: List[int]|Tuple[int, int, int, int],
+                     n_jobs: int = 1):
+        """
+        trains num_trees trees on bootstrap samples of the training data.
+        :param training_data: a list (or AnswerGroupTable) of labeled AnswerGroups
+        :param bounds: (x_min, y_min, x_max, y_max) - the part of the map the data comes from.
+        :param n_jobs: how many processes to train trees in. The forest is the same whatever this is.
+        """
+        data = ColumnarData.from_answer_groups(training_data)
+        tree_seeds = np.random.SeedSequence(self.seed).generate_state(self.num_trees)
+        settings = (data, tuple(bounds), self.max_features, self.threshold_fraction)
+        if n_jobs > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs,
+                                     initializer=set_worker_training_settings,
+                                     initargs=settings) as executor:
+                self.trees = list(executor.map(train_tree_in_worker, tree_seeds))
+        else:
+            set_worker_training_settings(*settings)
+            self.trees = [train_tree_in_worker(tree_seed) for tree_seed in tree_seeds]
+            set_worker_training_settings(None, None, None, None)
+        self.stacked_trees, self.roots = CompiledTree.stack(self.trees)
+
+    def vote_counts(self, X: np.ndarray) -> np.ndarray:
+        """
+        :param X: an (N, number of features) array - one row per point, columns in feature_names order
+        :return: a (number of labels, N) array of how many trees voted for each label, for each point.
+        """
+        X = np.asarray(X)
+        num_labels = len(self.stacked_trees.label_names)
+        votes = np.zeros((num_labels, len(X)), dtype=np.int32)
+        # every point in a chunk walks every tree at once, so the more trees there are, the fewer points per chunk.
+        chunk_size = max(1, VOTING_CHUNK_SIZE // len(self.roots))
+        for start in range(0, len(X), chunk_size):
+            chunk = X[start:start + chunk_size]
+            leaves = self.stacked_trees.leaf_for_points(chunk, roots=self.roots)  # (number of trees, chunk size)
+            codes = self.stacked_trees.leaf_label[leaves]
+            for label in range(num_labels):
+                votes[label, start:start + len(chunk)] = np.count_nonzero(codes == label, axis=0)
+        return votes
+
+    def predict_batch(self, X: np.ndarray) -> np.ndarray:
+        """
+        :param X: an (N, number of features) array - one row per point, columns in feature_names order
+        :return: an array with the majority-vote label for each point.
+        """
+        return np.array(self.stacked_trees.label_names)[np.argmax(self.vote_counts(X), axis=0)]
+
+    def predict(self, answer_group: AnswerGroup) -> str:
+        point = [[answer_group.get_attribute_for_name(name) for name in self.stacked_trees.feature_names]]
+        return str(self.predict_batch(np.array(point))[0])
+
+    def save(self, path: str):
+        """
+        saves the trained forest to one compact binary file (see CompiledTreeFile.save_compiled_tree).
+        :param path: where to write the file
+        """
+        save_compiled_tree(path, self.stacked_trees, roots=self.roots, extra={"num_trees": len(self.roots)})
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "Forest":
+        """
+        loads a forest saved by save. With mmap, the trees are read-only views of the file, so every worker process
+        that loads the same forest shares one copy of it in memory.
+        :param path: the file to read
+        :param mmap: whether to memory-map the file rather than reading it into memory
+        :return: a Forest, ready to predict.
+        """
+        stacked_trees, roots, extra = load_compiled_tree(path, mmap=mmap)
+        forest = cls(num_trees=extra.get("num_trees", len(roots)))
+        forest.stacked_trees = stacked_trees
+        forest.roots = roots
+        return forest
+
+
+# The training settings for the trees in this process. They are set once per worker process (rather than being sent
+# along with every tree), since the training data may be large.
+worker_training_settings: Optional[Tuple[ColumnarData, tuple, Optional[int], float]] = None
+
+
+def set_worker_training_settings(data: Optional[ColumnarData],
+                                 bounds: Optional[tuple],
+                                 max_features: Optional[int],
+                                 threshold_fraction: Optional[float]):
+    global worker_training_settings
+    worker_training_settings = None if data is None else (data, bounds, max_features, threshold_fraction)
+
+
+def train_tree_in_worker(tree_seed: int) -> CompiledTree:
+    """
+    trains one tree of a forest on a bootstrap sample of the data given to set_worker_training_settings.
+    :param tree_seed: decides the bootstrap sample and the tree's random choices
+    :return: the trained tree, compiled.
+    """
+    data, bounds, max_features, threshold_fraction = worker_training_settings
+    tree = RandomizedDecisionTree(seed=tree_seed, max_features=max_features, threshold_fraction=threshold_fraction)
+    sample = tree.rng.integers(0, len(data), size=len(data))
+    bootstrap = data.take(sample)
+    tree.label_names = data.label_names
+    tree.decision_tree_root = tree.make_node_for_columns_at_depth(data=bootstrap, depth=0, range=bounds)
+    return tree.compile()
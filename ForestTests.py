@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+import numpy as np
+
+from DecisionTreeTests import make_synthetic_data, SYNTHETIC_BOUNDS
+from ForestFile import Forest
+
+
+class ForestTestCase(unittest.TestCase):
+
+    def test_a_forest_votes(self):
+        print("Starting test_a.")
+        training_data = make_synthetic_data(1500)
+        test_data = make_synthetic_data(500, seed=2)
+        points = np.array([[ag.get_attribute_for_name("x"), ag.get_attribute_for_name("y")] for ag in test_data])
+        truth = np.array([ag.get_label() for ag in test_data])
+
+        forest = Forest(num_trees=15, max_features=1, threshold_fraction=0.5, seed=3)
+        forest.build_forest(training_data, SYNTHETIC_BOUNDS)
+        votes = forest.vote_counts(points)
+        self.assertTrue((votes.sum(axis=0) == 15).all(), "Every tree should vote once for every point.")
+        predictions = forest.predict_batch(points)
+        self.assertGreater(np.mean(predictions == truth), 0.85, "The forest should mostly be right.")
+        print("  votes passed.")
+        self.assertEqual(forest.predict(test_data[0]), predictions[0])
+        print("  single prediction passed.")
+        with unittest.mock.patch("ForestFile.VOTING_CHUNK_SIZE", 100):
+            # 100 (point, tree) pairs at a time is 6 points per chunk with 15 trees.
+            self.assertTrue((forest.vote_counts(points) == votes).all(), "Chunking shouldn't change the votes.")
+        print("  chunked votes passed.")
+
+        parallel_forest = Forest(num_trees=15, max_features=1, threshold_fraction=0.5, seed=3)
+        parallel_forest.build_forest(training_data, SYNTHETIC_BOUNDS, n_jobs=2)
+        self.assertTrue((parallel_forest.vote_counts(points) == votes).all(),
+                        "Training in worker processes should give the same forest.")
+        print("  parallel training passed.")
+
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "forest.bin")
+            forest.save(path)
+            loaded_forest = Forest.load(path)
+            self.assertTrue((loaded_forest.vote_counts(points) == votes).all(),
+                            "A loaded forest should vote the same way.")
+            del loaded_forest
+        print("  save and load passed.")
+        print("Test_a completed.")
+
+
+if __name__ == '__main__':
+    unittest.main()
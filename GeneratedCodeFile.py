@@ -0,0 +1,202 @@
+"""
+Turns a trained tree into Python source code - one nested if/else per BranchNode - and loads it as a module. The
+generated predict_one takes the features as plain arguments and returns the label, so predicting one point costs a
+handful of comparisons: no Node objects, no Conditions and no AnswerGroup dictionaries. (For a batch, predict_batch
+does the same with nested np.where calls; that asks every question of every point, so it suits small-to-medium trees.)
+
+        module = tree.to_module()
+        module.predict_one(412, 233)        # -> "water"
+        module.predict_batch(np.array([[412, 233], [10, 10]]))
+
+Generated modules are cached, keyed by a hash of the tree, so asking again for the same tree costs one hash.
+"""
+import hashlib
+import json
+import keyword
+import linecache
+import types
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from CompiledTreeFile import CompiledTree, NODE_ARRAY_NAMES, NO_FEATURE
+from PredictionCacheFile import PredictionCache
+
+MAX_GENERATED_DEPTH = 90  # Python won't compile code nested much deeper than this (it allows 100 levels of indentation).
+MAX_CACHED_MODULES = 32
+GENERATED_MODULES = PredictionCache(max_size=MAX_CACHED_MODULES)  # tree hash -> module.
+RESERVED_NAMES = {"np", "X", "answer_group", "FEATURE_NAMES", "LABEL_NAMES", "LABEL_ARRAY", "CATEGORIES", "TREE_HASH"}
+
+
+def tree_hash(tree: CompiledTree) -> str:
+    """
+    :return: a hash of everything about the tree that affects its predictions - two trees with the same hash give the
+    same generated code.
+    """
+    digest = hashlib.sha256()
+    for name in NODE_ARRAY_NAMES:
+        array = np.ascontiguousarray(getattr(tree, name))
+        digest.update(f"{name}:{array.dtype.str}:{array.shape}".encode())
+        digest.update(array.tobytes())
+    digest.update(json.dumps([tree.feature_names, tree.label_names, tree.categories]).encode())
+    return digest.hexdigest()
+
+
+def argument_names(feature_names: List[str]) -> List[str]:
+    """
+    :return: the names to give each feature in the generated functions - the feature's own name, if that is a usable
+    Python name, or "feature_<number>" if it isn't.
+    """
+    return [name if name.isidentifier() and not keyword.iskeyword(name) and name not in RESERVED_NAMES
+            else f"feature_{i}"
+            for i, name in enumerate(feature_names)]
+
+
+def threshold_text(threshold: float) -> str:
+    """
+    :return: the threshold as Python source: a whole number without the ".0", or else the float's exact repr.
+    """
+    value = float(threshold)
+    return f"{int(value)}" if value.is_integer() else repr(value)
+
+
+def generate_source(tree: CompiledTree) -> str:
+    """
+    writes the Python source for a module that makes the same predictions as the given tree. The module has:
+        predict_one(<one argument per feature>) - the label for one point, by nested if/else
+        predict(answer_group) - the same, for an AnswerGroup
+        predict_batch(X) - the labels for an (N, number of features) array (as from CompiledTree.as_array), by nested
+                           np.where calls
+    along with FEATURE_NAMES, LABEL_NAMES, CATEGORIES and TREE_HASH.
+    :param tree: the compiled tree
+    :return: the source code.
+    """
+    depth = deepest_leaf(tree)
+    if depth > MAX_GENERATED_DEPTH:
+        raise ValueError(f"The tree is {depth} levels deep - too deep to turn into Python code (the most is "
+                         f"{MAX_GENERATED_DEPTH}). Use predict or predict_batch instead.")
+    names = argument_names(tree.feature_names)
+
+    def one_point_question(node: int) -> str:
+        name = names[tree.feature[node]]
+        if tree.asks_equal[node]:
+            category = tree.categories[tree.feature_names[tree.feature[node]]][int(tree.threshold[node])]
+            return f"{name} == {category!r}"
+        return f"{name} > {threshold_text(tree.threshold[node])}"
+
+    def batch_question(node: int) -> str:
+        # in a batch, categorical features are already category positions.
+        operator = "==" if tree.asks_equal[node] else ">"
+        return f"{names[tree.feature[node]]} {operator} {threshold_text(tree.threshold[node])}"
+
+    lines = ['"""',
+             "generated by GeneratedCodeFile.generate_source - do not edit.",
+             '"""',
+             "import numpy as np",
+             "",
+             f"FEATURE_NAMES = {tree.feature_names!r}",
+             f"LABEL_NAMES = {tree.label_names!r}",
+             "LABEL_ARRAY = np.array(LABEL_NAMES)",
+             f"CATEGORIES = {tree.categories!r}",
+             f"TREE_HASH = {tree_hash(tree)!r}",
+             "",
+             "",
+             f"def predict_one({', '.join(names)}):"]
+    # each entry is a node to write out (with its indentation), or a finished line.
+    to_write: List[Tuple[int, int]|str] = [(0, 1)]
+    while len(to_write) > 0:
+        item = to_write.pop()
+        if isinstance(item, str):
+            lines.append(item)
+            continue
+        node, indent = item
+        spaces = "    " * indent
+        if tree.feature[node] == NO_FEATURE:
+            lines.append(f"{spaces}return {tree.label_names[tree.leaf_label[node]]!r}")
+            continue
+        to_write.append((int(tree.no_child[node]), indent + 1))
+        to_write.append(f"{spaces}else:")
+        to_write.append((int(tree.yes_child[node]), indent + 1))
+        to_write.append(f"{spaces}if {one_point_question(node)}:")
+
+    lines += ["",
+              "",
+              "def predict(answer_group):",
+              "    return predict_one(" +
+              ", ".join(f"answer_group.get_attribute_for_name({name!r})" for name in tree.feature_names) + ")",
+              "",
+              "",
+              "def predict_batch(X):",
+              "    X = np.asarray(X)"]
+    lines += [f"    {name} = X[:, {i}]" for i, name in enumerate(names)]
+    lines.append(f"    return LABEL_ARRAY[np.broadcast_to({batch_expression(tree, batch_question)}, (len(X),))]")
+    return "\n".join(lines) + "\n"
+
+
+def batch_expression(tree: CompiledTree, question) -> str:
+    """
+    :return: an expression for the label codes of a batch: np.where(question, <yes expression>, <no expression>) for a
+    BranchNode, and the label code for a LeafNode. (Worked out children first, with a stack, so deep trees are fine.)
+    """
+    expressions: Dict[int, str] = {}
+    to_visit = [(0, False)]
+    while len(to_visit) > 0:
+        node, children_done = to_visit.pop()
+        if tree.feature[node] == NO_FEATURE:
+            expressions[node] = f"{int(tree.leaf_label[node])}"
+        elif children_done:
+            expressions[node] = (f"np.where({question(node)}, {expressions.pop(int(tree.yes_child[node]))}, "
+                                 f"{expressions.pop(int(tree.no_child[node]))})")
+        else:
+            to_visit.append((node, True))
+            to_visit.append((int(tree.yes_child[node]), False))
+            to_visit.append((int(tree.no_child[node]), False))
+    return expressions[0]
+
+
+def deepest_leaf(tree: CompiledTree) -> int:
+    """
+    :return: the depth of the deepest leaf (0 if the root is a leaf).
+    """
+    deepest = 0
+    to_visit = [(0, 0)]
+    while len(to_visit) > 0:
+        node, depth = to_visit.pop()
+        if tree.feature[node] == NO_FEATURE:
+            deepest = max(deepest, depth)
+        else:
+            to_visit.append((int(tree.yes_child[node]), depth + 1))
+            to_visit.append((int(tree.no_child[node]), depth + 1))
+    return deepest
+
+
+def load_generated_module(tree: CompiledTree) -> types.ModuleType:
+    """
+    generates the code for this tree (see generate_source) and runs it as a module - or, if we have already done that
+    for a tree with the same hash, returns that module again.
+    :param tree: the compiled tree
+    :return: the module, with predict_one, predict and predict_batch.
+    """
+    key = tree_hash(tree)
+    found, module = GENERATED_MODULES.get(key)
+    if found:
+        return module
+    source = generate_source(tree)
+    filename = f"<generated tree {key[:16]}>"
+    # so that tracebacks (and inspect.getsource) can show the generated lines.
+    linecache.cache[filename] = (len(source), None, source.splitlines(keepends=True), filename)
+    module = types.ModuleType(f"generated_tree_{key[:16]}")
+    module.__file__ = filename
+    exec(compile(source, filename, "exec"), module.__dict__)
+    GENERATED_MODULES.put(key, module)
+    return module
+
+
+def write_generated_module(path: str, tree: CompiledTree):
+    """
+    saves the generated code as a .py file, to import (or read) later.
+    :param path: where to write the file
+    :param tree: the compiled tree
+    """
+    with open(path, "w") as file:
+        file.write(generate_source(tree))
@@ -1,5 +1,7 @@
 from abc import ABC
-from typing import Optional
+from typing import Optional, List
+
+import numpy as np
 
 from AnswerGroupFile import AnswerGroup
 from ConditionFile import GenericCondition
@@ -13,6 +15,23 @@ class GenericNode(ABC):
     """
     def __init__(self, depth: int=0):
         self.my_depth = depth
+        # how many training AnswerGroups with each label reached this node (if the tree that built it kept track).
+        self.label_counts: Optional[np.ndarray] = None
+
+    @property
+    def num_items(self) -> int:
+        """
+        :return: how many training AnswerGroups reached this node.
+        """
+        return int(self.label_counts.sum())
+
+    @property
+    def num_misclassified(self) -> int:
+        """
+        :return: how many of the training AnswerGroups that reached this node would be labeled wrong if this node were
+        a leaf (i.e., all the ones that don't have its most frequent label).
+        """
+        return int(self.label_counts.sum() - self.label_counts.max())
 
     def predict(self, answer_group: AnswerGroup) -> str:
         pass
@@ -37,6 +56,12 @@ class BranchNode(GenericNode):
         self.my_condition = condition
         self.__yes_node__:Optional[GenericNode] = None
         self.__no_node__:Optional[GenericNode] = None
+        # the conditions this node chose between, and the label counts on the "no" side of each - kept (for a tree built
+        # with updatable=True) so that we can tell whether new data would change this node's choice.
+        self.candidate_conditions: Optional[List[GenericCondition]] = None
+        self.candidate_no_counts: Optional[np.ndarray] = None
+        # the cost-complexity alpha at which pruning turns this node into a leaf (see PruningFile).
+        self.prune_alpha: Optional[float] = None
 
     def set_yes_node(self, node: GenericNode):
         self.__yes_node__ = node
@@ -46,23 +71,42 @@ class BranchNode(GenericNode):
 
     def predict(self, answer_group: AnswerGroup) -> str:
         """
-        Given an instance, pick which category this instance belongs to. This is done recursively - i.e., by asking
-        another Node for the answer.
+        Given an instance, pick which category this instance belongs to. We ask this node's condition, step to the
+        yes or no node, and keep going until we reach a leaf - a loop, rather than asking the next Node to make the
+        prediction, so that it takes no extra Python calls (and no recursion) however deep the tree is.
         :param answer_group: the instance of AnswerGroup for which we wish to predict
         :return: which category is predicted for this Instance.
         """
-        if self.my_condition.ask(answer_group):
-            return self.__yes_node__.predict(answer_group)
-        else:
-            return self.__no_node__.predict(answer_group)
+        node: GenericNode = self
+        while isinstance(node, BranchNode):
+            if node.my_condition.ask(answer_group):
+                node = node.__yes_node__
+            else:
+                node = node.__no_node__
+        return node.predict(answer_group)
 
     def __repr__(self):
         """
-        get a representation of this node (and its children) that we can draw to the screen
+        get a representation of this node (and its children) that we can draw to the screen: the "yes" subtree, then
+        this node's condition, then the "no" subtree. The pieces are collected with a stack and joined once at the end,
+        rather than by nesting strings inside strings, so a deep tree takes neither recursion nor repeated copying.
         :return: a string describing this node and its children
         """
-        indent = "\t"*self.my_depth
-        return f"{self.__yes_node__}{indent}{self.my_condition}\n{self.__no_node__}"
+        pieces: List[str] = []
+        # each entry is either a node still to describe, or a finished piece of text.
+        to_visit: List[GenericNode|str|None] = [self]
+        while len(to_visit) > 0:
+            item = to_visit.pop()
+            if isinstance(item, BranchNode):
+                to_visit.append(item.__no_node__)
+                indent = "\t"*item.my_depth
+                to_visit.append(f"{indent}{item.my_condition}\n")
+                to_visit.append(item.__yes_node__)
+            elif isinstance(item, str):
+                pieces.append(item)
+            else:
+                pieces.append(f"{item}")  # a LeafNode (or None, for a missing child).
+        return "".join(pieces)
 
 # ====================================================================================================================
 class LeafNode(GenericNode):
@@ -74,6 +118,9 @@ class LeafNode(GenericNode):
     def __init__(self, category: str, depth: int):
         super(LeafNode, self).__init__(depth)
         self.my_label = category
+        # the row numbers (in the tree's training data) of the AnswerGroups that reached this leaf, if kept (see
+        # DecisionTree.build_tree's updatable).
+        self.sample_ids: Optional[np.ndarray] = None
 
     def predict(self, answer_group: AnswerGroup) -> str:
         """
@@ -0,0 +1,90 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+class CacheStats:
+    """
+    how well a PredictionCache has been doing - enough to tell whether it is the right size.
+    """
+    def __init__(self, hits: int, misses: int, evictions: int, size: int, max_size: int):
+        self.hits = hits
+        self.misses = misses
+        self.evictions = evictions  # answers thrown out to make room - lots of these suggests a bigger cache.
+        self.size = size
+        self.max_size = max_size
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        :return: the fraction of lookups that were answered from the cache (0 if there haven't been any).
+        """
+        lookups = self.hits + self.misses
+        return 0.0 if lookups == 0 else self.hits / lookups
+
+    def __repr__(self):
+        return f"{self.hits} hits, {self.misses} misses ({self.hit_rate:0.1%} hit rate), {self.evictions} evictions, " \
+               f"{self.size}/{self.max_size} entries"
+
+
+class PredictionCache:
+    """
+    remembers the most recent predictions, so that when the same point is asked about again (the same map tile, a
+    popular region...) we can answer without walking the tree. It holds at most max_size answers; when it is full, the
+    one that was used least recently is thrown out.
+
+    The cache doesn't know anything about the tree - DecisionTree.enable_prediction_cache sets one up, and the tree
+    clears it whenever its decision_tree_root is replaced, so the answers are never out of date.
+    """
+    def __init__(self, max_size: int = 65536):
+        """
+        :param max_size: the most answers to keep.
+        """
+        if max_size < 1:
+            raise ValueError(f"The cache needs room for at least one answer, not {max_size}.")
+        self.max_size = max_size
+        self.entries: OrderedDict[Hashable, Any] = OrderedDict()  # least recently used first.
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key: Hashable) -> Tuple[bool, Optional[Any]]:
+        """
+        looks up a key, counting the hit or miss.
+        :param key: e.g., the tuple of a point's attribute values
+        :return: (found, value) - value is None if the key wasn't found.
+        """
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return False, None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return True, value
+
+    def put(self, key: Hashable, value: Any):
+        """
+        stores a value, making room by throwing out the least recently used one if need be.
+        """
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """
+        forgets all the answers (e.g., because the tree has changed). The hit and miss counts are kept.
+        """
+        self.entries.clear()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> CacheStats:
+        return CacheStats(self.hits, self.misses, self.evictions, len(self.entries), self.max_size)
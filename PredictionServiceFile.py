@@ -0,0 +1,266 @@
+"""
+Serves a DecisionTree's predictions with asyncio. Predicting one point at a time spends most of its time on Python
+overhead, so rather than answering each request as it comes in, the service waits a few milliseconds to collect the
+requests that arrive together, and answers them all with one call to predict_batch.
+
+        service = PredictionService(tree)
+        await service.start()
+        label = await service.predict((412, 233))     # from any number of tasks at once
+        server = await service.serve("127.0.0.1", 8765)
+
+Over the network, each request is one line holding a point's feature values, separated by spaces (in the tree's
+feature_names order); the answer is a line holding the label, or "ERROR <message>". The line "METRICS" gets the
+service's metrics, as JSON.
+"""
+import asyncio
+import collections
+import json
+import time
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from AnswerGroupFile import AnswerGroupTable
+from DecisionTree import DecisionTree
+
+DEFAULT_MAX_BATCH_SIZE = 256
+DEFAULT_MAX_WAIT_SECONDS = 0.002  # how long the first request in a batch may wait for others to join it.
+LATENCY_WINDOW = 10000  # the metrics' latency percentiles are over this many most recent requests.
+
+
+class ServiceMetrics:
+    """
+    a snapshot of how a PredictionService is doing.
+    """
+    def __init__(self,
+                 queue_depth: int,
+                 num_requests: int,
+                 num_batches: int,
+                 num_errors: int,
+                 num_swaps: int,
+                 latencies: Sequence[float]):
+        self.queue_depth = queue_depth  # requests waiting for a batch right now.
+        self.num_requests = num_requests  # requests answered so far.
+        self.num_batches = num_batches
+        self.num_errors = num_errors
+        self.num_swaps = num_swaps  # how many times the tree has been replaced.
+        latencies = np.asarray(latencies, dtype=np.float64)
+        # the time from a request arriving to its answer being ready, in seconds (None before the first request).
+        self.latency_p50, self.latency_p99, self.latency_max = \
+            (None, None, None) if len(latencies) == 0 else \
+            (float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99)), float(latencies.max()))
+
+    @property
+    def mean_batch_size(self) -> float:
+        return 0.0 if self.num_batches == 0 else self.num_requests / self.num_batches
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"queue_depth": self.queue_depth, "num_requests": self.num_requests, "num_batches": self.num_batches,
+                "mean_batch_size": self.mean_batch_size, "num_errors": self.num_errors, "num_swaps": self.num_swaps,
+                "latency_p50": self.latency_p50, "latency_p99": self.latency_p99, "latency_max": self.latency_max}
+
+    def __repr__(self):
+        return json.dumps(self.as_dict())
+
+
+class PredictionService:
+    """
+    answers prediction requests for a trained DecisionTree, in batches. All of its methods must be called from the
+    event loop it was started on.
+    """
+    def __init__(self,
+                 tree: DecisionTree,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_wait_seconds: float = DEFAULT_MAX_WAIT_SECONDS):
+        """
+        :param tree: a trained tree (built, or loaded from a file)
+        :param max_batch_size: the most requests to answer with one predict_batch
+        :param max_wait_seconds: how long to wait for more requests once one has arrived
+        """
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be at least 1, not {max_batch_size}.")
+        tree.compile()  # (so that the first batch doesn't pay for it.)
+        self.tree = tree
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        # each request is its point, the future for its answer, and when it arrived.
+        self.queue: Optional[asyncio.Queue[Tuple[Sequence[Any], asyncio.Future, float]]] = None
+        self.batcher: Optional[asyncio.Task] = None
+        self.num_requests = 0
+        self.num_batches = 0
+        self.num_errors = 0
+        self.num_swaps = 0
+        self.latencies: Deque[float] = collections.deque(maxlen=LATENCY_WINDOW)
+
+    async def start(self):
+        """
+        starts answering requests.
+        """
+        if self.batcher is not None:
+            raise RuntimeError("The service has already been started.")
+        self.queue = asyncio.Queue()
+        self.batcher = asyncio.get_running_loop().create_task(self.run_batches())
+
+    async def stop(self):
+        """
+        answers the requests already waiting, then stops.
+        """
+        if self.batcher is None:
+            return
+        await self.queue.join()
+        self.batcher.cancel()
+        try:
+            await self.batcher
+        except asyncio.CancelledError:
+            pass
+        self.batcher = None
+
+    async def predict(self, point: Sequence[Any]) -> str:
+        """
+        :param point: the point's feature values, in the tree's feature_names order (e.g., (x, y))
+        :return: the predicted label.
+        """
+        if self.batcher is None:
+            raise RuntimeError("Call start before asking for predictions.")
+        if len(point) != len(self.tree.feature_names):
+            raise ValueError(f"Expected {len(self.tree.feature_names)} values ({self.tree.feature_names}), "
+                             f"not {len(point)}.")
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((point, future, time.perf_counter()))
+        return await future
+
+    def swap_tree(self, tree: DecisionTree):
+        """
+        replaces the tree (e.g., with one just built from newer data). Requests already in a batch are answered by the
+        old tree, and everything after by the new one; no request is dropped. The new tree is compiled before the swap,
+        so no request has to wait for that.
+        :param tree: the new trained tree. (It should have the same feature_names as the old one.)
+        """
+        if tree.feature_names != self.tree.feature_names:
+            raise ValueError(f"The new tree asks about {tree.feature_names}, not {self.tree.feature_names}.")
+        tree.compile()
+        self.tree = tree
+        self.num_swaps += 1
+
+    def metrics(self) -> ServiceMetrics:
+        return ServiceMetrics(0 if self.queue is None else self.queue.qsize(), self.num_requests, self.num_batches,
+                              self.num_errors, self.num_swaps, self.latencies)
+
+    async def next_batch(self) -> List[Tuple[Sequence[Any], asyncio.Future, float]]:
+        """
+        waits for a request, then collects more until the batch is full or max_wait_seconds have passed.
+        :return: the requests in the batch.
+        """
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait_seconds
+        while len(batch) < self.max_batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run_batches(self):
+        while True:
+            batch = await self.next_batch()
+            tree = self.tree  # (a swap from here on waits for the next batch.)
+            try:
+                columns = list(zip(*[point for point, _, _ in batch]))
+                table = AnswerGroupTable({name: np.array(column) for name, column in zip(tree.feature_names, columns)})
+                labels = tree.predict_batch(table).tolist()
+            except Exception:
+                # a bad request spoils its whole batch, so answer the others one at a time.
+                labels = [self.predict_one_or_error(tree, point) for point, _, _ in batch]
+            finished = time.perf_counter()
+            for (_, future, arrived), label in zip(batch, labels):
+                if isinstance(label, Exception):
+                    self.num_errors += 1
+                    if not future.done():
+                        future.set_exception(label)
+                elif not future.done():  # (the caller may have given up waiting.)
+                    future.set_result(label)
+                self.latencies.append(finished - arrived)
+                self.queue.task_done()
+            self.num_requests += len(batch)
+            self.num_batches += 1
+
+    @staticmethod
+    def predict_one_or_error(tree: DecisionTree, point: Sequence[Any]) -> str|Exception:
+        try:
+            table = AnswerGroupTable({name: np.array([value]) for name, value in zip(tree.feature_names, point)})
+            return str(tree.predict_batch(table)[0])
+        except Exception as error:
+            return error
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.AbstractServer:
+        """
+        listens for requests over TCP (see the top of this file for the protocol), starting the service if need be.
+        :param host: the address to listen on
+        :param port: the port to listen on (0 picks a free one - see server.sockets[0].getsockname())
+        :return: the server. (Close it, then stop the service, to shut down.)
+        """
+        if self.batcher is None:
+            await self.start()
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        answers the requests on one connection, in order. A client may send many lines without waiting for the
+        answers; they all join the batches as they arrive.
+        """
+        # the answers still to be written, in order (None after the last one).
+        answers: asyncio.Queue[Optional[asyncio.Future]] = asyncio.Queue()
+
+        async def write_answers():
+            while True:
+                answer = await answers.get()
+                if answer is None:
+                    return
+                try:
+                    text = await answer
+                except Exception as error:
+                    text = f"ERROR {error}"
+                writer.write(f"{text}\n".encode())
+                await writer.drain()
+
+        writing = asyncio.get_running_loop().create_task(write_answers())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                text = line.decode().strip()
+                if text == "METRICS":
+                    answer = asyncio.get_running_loop().create_future()
+                    answer.set_result(repr(self.metrics()))
+                else:
+                    answer = asyncio.ensure_future(self.predict(parse_point(text)))
+                await answers.put(answer)
+            await answers.put(None)
+            await writing
+        finally:
+            writing.cancel()
+            writer.close()
+
+
+def parse_point(text: str) -> List[Any]:
+    """
+    :return: the values on a request line - numbers where they can be read as numbers, and strings (e.g., categories)
+    where they can't.
+    """
+    values: List[Any] = []
+    for word in text.split():
+        try:
+            values.append(int(word))
+        except ValueError:
+            try:
+                values.append(float(word))
+            except ValueError:
+                values.append(word)
+    return values
@@ -0,0 +1,192 @@
+"""
+Cost-complexity ("weakest link") pruning. A fully grown tree fits its training data very closely, including the noise,
+so it is bigger (and slower, and often less accurate on new data) than it needs to be. For a given alpha >= 0, we look
+for the pruned tree T with the lowest
+        cost(T) = (number of training points T labels wrong) + alpha * (number of leaves in T).
+As alpha grows, it pays to turn more and more BranchNodes back into LeafNodes. Every BranchNode has an alpha (its
+prune_alpha) above which it becomes a leaf, and we work all of those out at once, in compute_pruning_sequence.
+
+Everything here relies on the label_counts that the builder keeps on every node.
+"""
+import heapq
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from NodeFile import GenericNode, BranchNode, LeafNode
+from SplitEngineFile import ColumnarData
+
+
+def nodes_in_preorder(root: GenericNode) -> Tuple[List[GenericNode], Dict[int, GenericNode]]:
+    """
+    :return: all the nodes of the tree, each before its children, and each node's parent (keyed by the id of the node;
+    the root has no entry).
+    """
+    nodes: List[GenericNode] = []
+    parents: Dict[int, GenericNode] = {}
+    to_visit = [root]
+    while len(to_visit) > 0:
+        node = to_visit.pop()
+        if node.label_counts is None:
+            raise ValueError("Pruning needs the label counts that build_tree keeps on each node.")
+        nodes.append(node)
+        if isinstance(node, BranchNode):
+            for child in (node.__no_node__, node.__yes_node__):
+                parents[id(child)] = node
+                to_visit.append(child)
+    return nodes, parents
+
+
+def compute_pruning_sequence(root: GenericNode) -> List[float]:
+    """
+    sets prune_alpha on every BranchNode in the tree.
+
+    One bottom-up pass works out, for each BranchNode t, how many training points its subtree gets wrong, R(T_t), and
+    how many leaves it has, |T_t|. Turning t into a leaf would get R(t) points wrong instead, so its "link strength" is
+            g(t) = (R(t) - R(T_t)) / (|T_t| - 1)
+    - how many more mistakes per leaf removed. We keep the BranchNodes in a heap by g, and repeatedly prune the weakest
+    one, updating the cached R and leaf counts of its ancestors (the only nodes whose g changes). The alpha at which a
+    node is pruned never decreases as we go, so the trees for increasing alpha are nested.
+    :param root: the root of a tree built by DecisionTree.build_tree
+    :return: the distinct alphas at which the tree changes, smallest first.
+    """
+    nodes, parents = nodes_in_preorder(root)
+    subtree_misclassified: Dict[int, int] = {}
+    subtree_leaves: Dict[int, int] = {}
+    for node in reversed(nodes):  # children before parents.
+        if isinstance(node, BranchNode):
+            node.prune_alpha = None
+            subtree_misclassified[id(node)] = (subtree_misclassified[id(node.__yes_node__)] +
+                                               subtree_misclassified[id(node.__no_node__)])
+            subtree_leaves[id(node)] = subtree_leaves[id(node.__yes_node__)] + subtree_leaves[id(node.__no_node__)]
+        else:
+            subtree_misclassified[id(node)] = node.num_misclassified
+            subtree_leaves[id(node)] = 1
+
+    def link_strength(node: BranchNode) -> float:
+        return (node.num_misclassified - subtree_misclassified[id(node)]) / (subtree_leaves[id(node)] - 1)
+
+    # (g, tie-breaker, node). An entry is out of date if the node has been pruned, or if its g has changed since.
+    heap: List[Tuple[float, int, BranchNode]] = [(link_strength(node), i, node)
+                                                 for i, node in enumerate(nodes) if isinstance(node, BranchNode)]
+    heapq.heapify(heap)
+    next_tie_breaker = len(nodes)
+    alpha = 0.0
+    alphas: List[float] = []
+    while len(heap) > 0:
+        strength, _, node = heapq.heappop(heap)
+        if node.prune_alpha is not None or strength != link_strength(node):
+            continue
+        alpha = max(alpha, strength)
+        if len(alphas) == 0 or alphas[-1] != alpha:
+            alphas.append(alpha)
+        set_prune_alpha_below(node, alpha)
+
+        # this node's subtree is now a single leaf, so its ancestors' subtrees change.
+        misclassified_change = node.num_misclassified - subtree_misclassified[id(node)]
+        leaves_change = 1 - subtree_leaves[id(node)]
+        ancestor = parents.get(id(node))
+        while ancestor is not None:
+            subtree_misclassified[id(ancestor)] += misclassified_change
+            subtree_leaves[id(ancestor)] += leaves_change
+            heapq.heappush(heap, (link_strength(ancestor), next_tie_breaker, ancestor))
+            next_tie_breaker += 1
+            ancestor = parents.get(id(ancestor))
+    return alphas
+
+
+def set_prune_alpha_below(node: BranchNode, alpha: float):
+    """
+    sets prune_alpha on this node, and on any BranchNodes below it that haven't been pruned yet - they go when it does.
+    """
+    to_visit: List[GenericNode] = [node]
+    while len(to_visit) > 0:
+        node = to_visit.pop()
+        if isinstance(node, BranchNode) and node.prune_alpha is None:
+            node.prune_alpha = alpha
+            to_visit.append(node.__yes_node__)
+            to_visit.append(node.__no_node__)
+
+
+def prune_tree(root: GenericNode, alpha: float, label_names: List[str]) -> GenericNode:
+    """
+    turns every BranchNode whose prune_alpha is at most alpha into a LeafNode with its most frequent label. (Run
+    compute_pruning_sequence first.) This changes the tree in place.
+    :param root: the root of the tree
+    :param alpha: the cost of each leaf, in training points labeled wrong
+    :param label_names: the label for each label code
+    :return: the root of the pruned tree (which may now be a leaf).
+    """
+    new_root = [root]
+    to_visit = [(root, lambda node: new_root.__setitem__(0, node))]
+    while len(to_visit) > 0:
+        node, attach = to_visit.pop()
+        if not isinstance(node, BranchNode):
+            continue
+        if node.prune_alpha is not None and node.prune_alpha <= alpha:
+            attach(collapse(node, label_names))
+        else:
+            to_visit.append((node.__yes_node__, node.set_yes_node))
+            to_visit.append((node.__no_node__, node.set_no_node))
+    return new_root[0]
+
+
+def collapse(node: BranchNode, label_names: List[str]) -> LeafNode:
+    """
+    :return: a LeafNode to take the place of this BranchNode and everything under it.
+    """
+    # ties go to the first label (i.e., "land"), just as when the tree was built.
+    leaf = LeafNode(label_names[int(np.argmax(node.label_counts))], depth=node.my_depth)
+    leaf.label_counts = node.label_counts
+    sample_ids = []
+    to_visit: List[GenericNode] = [node]
+    while len(to_visit) > 0:
+        node = to_visit.pop()
+        if isinstance(node, BranchNode):
+            to_visit.append(node.__no_node__)
+            to_visit.append(node.__yes_node__)
+        else:
+            sample_ids.append(node.sample_ids)
+    if all(ids is not None for ids in sample_ids):
+        leaf.sample_ids = np.concatenate(sample_ids)
+    return leaf
+
+
+def best_alpha_for_validation(root: GenericNode, alphas: List[float], validation_data: ColumnarData) -> float:
+    """
+    picks the alpha whose pruned tree labels the most validation points correctly (preferring the smaller tree when
+    there's a tie). Rather than pruning the tree once per alpha, we send the validation points down the full tree once,
+    counting how many each node would get right if it were a leaf; the score of each pruned tree then comes from
+    adding up those counts over its leaves.
+    :param root: the root of a tree that has been through compute_pruning_sequence
+    :param alphas: the candidate alphas (e.g., from compute_pruning_sequence)
+    :param validation_data: labeled points the tree was not trained on, with the same label names as the tree
+    :return: the best alpha.
+    """
+    correct_if_leaf: Dict[int, int] = {}
+    to_visit = [(root, np.arange(len(validation_data)))]
+    while len(to_visit) > 0:
+        node, rows = to_visit.pop()
+        majority_code = int(np.argmax(node.label_counts))
+        correct_if_leaf[id(node)] = int(np.count_nonzero(validation_data.label_codes[rows] == majority_code))
+        if isinstance(node, BranchNode):
+            goes_yes = validation_data.answers(node.my_condition, rows)
+            to_visit.append((node.__yes_node__, rows[goes_yes]))
+            to_visit.append((node.__no_node__, rows[~goes_yes]))
+
+    best_alpha = 0.0
+    best_correct = -1
+    for alpha in [0.0] + list(alphas):
+        num_correct = 0
+        to_visit_nodes: List[GenericNode] = [root]
+        while len(to_visit_nodes) > 0:
+            node = to_visit_nodes.pop()
+            if isinstance(node, BranchNode) and (node.prune_alpha is None or node.prune_alpha > alpha):
+                to_visit_nodes.append(node.__yes_node__)
+                to_visit_nodes.append(node.__no_node__)
+            else:
+                num_correct += correct_if_leaf[id(node)]
+        if num_correct >= best_correct:  # (">=" - a larger alpha means a smaller tree.)
+            best_alpha = alpha
+            best_correct = num_correct
+    return best_alpha
@@ -0,0 +1,757 @@
+from abc import ABC
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+import numpy as np
+
+from AnswerGroupFile import AnswerGroup, AnswerGroupTable, NO_LABEL
+from ConditionFile import GenericCondition, NumericCondition, CategoryCondition
+
+DEFAULT_ATTRIBUTE_NAMES = ["x", "y"]
+DEFAULT_LABEL_NAMES = ["land", "water"]
+MAP_ATTRIBUTE_NAMES = ("x", "y")  # the attributes whose conditions come from the node's range on the map.
+MAX_HISTOGRAM_BINS = 256  # so that each bin number fits in one byte.
+
+
+class ColumnarData:
+    """
+    A "ColumnarData" holds a whole training set as parallel NumPy arrays instead of a list of AnswerGroup objects: one
+    contiguous column per attribute, and one column of small-integer label codes. The label code for a row is the index
+    of its label in label_names, so counting labels becomes a bincount instead of a dictionary update per AnswerGroup,
+    and there can be any number of labels.
+
+    An attribute whose values are strings (e.g., "terrain") is categorical: its column holds the position of each
+    row's value in categories[attribute name], and it is asked about with CategoryConditions rather than
+    NumericConditions.
+    """
+    def __init__(self,
+                 columns: Dict[str, np.ndarray],
+                 label_codes: np.ndarray,
+                 label_names: Sequence[str],
+                 categories: Optional[Dict[str, List[str]]] = None):
+        self.columns = columns
+        self.label_codes = label_codes
+        self.label_names = list(label_names)
+        self.categories: Dict[str, List[str]] = categories if categories is not None else {}
+
+    @classmethod
+    def from_answer_groups(cls,
+                           groups: List[AnswerGroup]|AnswerGroupTable,
+                           attribute_names: Sequence[str] = DEFAULT_ATTRIBUTE_NAMES,
+                           label_names: Sequence[str] = DEFAULT_LABEL_NAMES,
+                           categories: Optional[Dict[str, List[str]]] = None) -> "ColumnarData":
+        """
+        copies the attributes and labels of a list of labeled AnswerGroups into columns. (If given an
+        AnswerGroupTable, which is already in columns, we just use its arrays.)
+        :param groups: a list or table of AnswerGroups, each labeled
+        :param attribute_names: the attributes to copy into columns
+        :param label_names: the labels we expect to see; their order determines the label codes. (Any others we find
+        are added to the end.)
+        :param categories: the values we already know for the categorical attributes, so that the codes match those of
+        another ColumnarData. (Any others we find are added to the end.)
+        :return: a new ColumnarData holding the same information as groups.
+        """
+        if isinstance(groups, AnswerGroupTable):
+            return cls.from_table(groups, attribute_names, label_names, categories)
+        label_names = list(label_names)
+        code_for_label = {name: code for code, name in enumerate(label_names)}
+
+        def code_for(label: str) -> int:
+            if label not in code_for_label:
+                code_for_label[label] = len(label_names)
+                label_names.append(label)
+            return code_for_label[label]
+
+        label_codes = np.fromiter((code_for(ag.get_label()) for ag in groups), dtype=np.int64, count=len(groups))
+        columns = {name: np.array([ag.get_attribute_for_name(name) for ag in groups]) for name in attribute_names}
+        return cls.from_columns(columns, label_codes, label_names, categories)
+
+    @classmethod
+    def from_columns(cls,
+                     columns: Dict[str, np.ndarray],
+                     label_codes: np.ndarray,
+                     label_names: Sequence[str],
+                     categories: Optional[Dict[str, List[str]]] = None) -> "ColumnarData":
+        """
+        makes a ColumnarData from raw columns: numeric columns are used as they are (not copied), and columns of
+        strings are encoded as category codes.
+        """
+        known_categories = categories if categories is not None else {}
+        new_columns: Dict[str, np.ndarray] = {}
+        new_categories: Dict[str, List[str]] = {}
+        for name, column in columns.items():
+            column = np.asarray(column)
+            if column.dtype.kind in "USO" or name in known_categories:
+                new_columns[name], new_categories[name] = encode_categories(column, known_categories.get(name, []))
+            else:
+                new_columns[name] = column
+        return cls(new_columns, label_codes, label_names, new_categories)
+
+    @classmethod
+    def from_table(cls,
+                   table: AnswerGroupTable,
+                   attribute_names: Sequence[str] = DEFAULT_ATTRIBUTE_NAMES,
+                   label_names: Sequence[str] = DEFAULT_LABEL_NAMES,
+                   categories: Optional[Dict[str, List[str]]] = None) -> "ColumnarData":
+        """
+        makes a ColumnarData that shares the columns of a labeled AnswerGroupTable.
+        :param table: the table, with every row labeled
+        :param attribute_names: the attributes to use
+        :param label_names: the labels we expect to see; their order determines the label codes. (Any others in the
+        table are added to the end.)
+        :param categories: the values we already know for the categorical attributes (see from_answer_groups)
+        :return: a new ColumnarData holding the same information as the table.
+        """
+        if np.any(table.label_codes == NO_LABEL):
+            raise ValueError("Every row of the training data needs a label.")
+        label_names = list(label_names) + [name for name in table.label_names if name not in label_names]
+        label_codes = table.label_codes
+        if table.label_names != label_names[:len(table.label_names)]:
+            new_code = np.array([label_names.index(name) for name in table.label_names], dtype=np.int64)
+            label_codes = new_code[label_codes]
+        return cls.from_columns({name: table.columns[name] for name in attribute_names}, label_codes, label_names,
+                                categories)
+
+    def __len__(self):
+        return len(self.label_codes)
+
+    def take(self, row_numbers: np.ndarray) -> "ColumnarData":
+        """
+        :param row_numbers: the rows we want
+        :return: a new ColumnarData with copies of just those rows.
+        """
+        return ColumnarData({name: column[row_numbers] for name, column in self.columns.items()},
+                            self.label_codes[row_numbers],
+                            self.label_names,
+                            self.categories)
+
+    def append(self, other: "ColumnarData") -> "ColumnarData":
+        """
+        :param other: more rows, with the same columns and label names as this one, and categories that start with
+        this one's (see from_answer_groups)
+        :return: a new ColumnarData with this one's rows followed by other's.
+        """
+        return ColumnarData({name: np.concatenate((column, other.columns[name])) for name, column in self.columns.items()},
+                            np.concatenate((self.label_codes, other.label_codes)),
+                            self.label_names,
+                            other.categories if len(other.categories) > 0 else self.categories)
+
+    def is_categorical(self, name: str) -> bool:
+        return name in self.categories
+
+    def numeric_names(self) -> List[str]:
+        """
+        :return: the names of the attributes that aren't categorical.
+        """
+        return [name for name in self.columns if name not in self.categories]
+
+    def answers(self, condition: GenericCondition, row_numbers: np.ndarray) -> np.ndarray:
+        """
+        asks a condition of many rows at once.
+        :param condition: a NumericCondition or CategoryCondition
+        :param row_numbers: the rows to ask about
+        :return: an array of True ("yes") or False ("no"), one per row.
+        """
+        values = self.columns[condition.attribute_name][row_numbers]
+        if isinstance(condition, CategoryCondition):
+            categories = self.categories[condition.attribute_name]
+            return values == (categories.index(condition.value) if condition.value in categories else -1)
+        return values > condition.threshold_value
+
+    def label_counts(self) -> np.ndarray:
+        """
+        :return: an array with the number of rows carrying each label, in label_names order.
+        """
+        return np.bincount(self.label_codes, minlength=len(self.label_names))
+
+
+def encode_categories(values: np.ndarray, known_categories: Sequence[str]) -> Tuple[np.ndarray, List[str]]:
+    """
+    replaces each value of a categorical attribute with its position in the list of categories.
+    :param values: the values (e.g., strings)
+    :param known_categories: categories that should keep their positions; any new values we find are added after these,
+    in sorted order.
+    :return: the codes (an int64 array), and the full list of categories.
+    """
+    distinct_values, inverse = np.unique(values, return_inverse=True)
+    categories = list(known_categories)
+    categories += [value for value in distinct_values.tolist() if value not in categories]
+    code_for_value = np.array([categories.index(value) for value in distinct_values.tolist()], dtype=np.int64)
+    return code_for_value[inverse.reshape(-1)], categories
+
+
+def gini_coefficient_for_counts(counts: np.ndarray) -> float:
+    """
+    the gini coefficient of a group, given only the number of each label in it. This is the same calculation as
+    DecisionTree.gini_coefficient_for_list, but it never has to look at the group itself.
+    :param counts: the number of each label in the group
+    :return: 1 - (Pa**2 + Pb**2 + ...), or zero for an empty group.
+    """
+    N = int(counts.sum())
+    if N == 0:
+        return 0
+    gini = 1
+    for p in counts:
+        gini -= (int(p)/N)**2
+    return gini
+
+
+def gini_indices_for_splits(no_counts: np.ndarray, yes_counts: np.ndarray) -> np.ndarray:
+    """
+    finds the weighted gini index of many candidate splits at once.
+    :param no_counts: a (number of splits) x (number of labels) array with the label counts on the "no" side of each split
+    :param yes_counts: the matching array for the "yes" side of each split
+    :return: p_yes * gini_yes + p_no * gini_no for each split, in the same order as the rows of the count arrays.
+    """
+    no_total = no_counts.sum(axis=1)
+    yes_total = yes_counts.sum(axis=1)
+    N = no_total + yes_total
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # subtract the squared proportions one label at a time, in the same order as gini_coefficient_for_list, so
+        # that we get bit-for-bit the same numbers (and so the same choice among near-ties) as the list version.
+        gini_no = np.ones(len(no_counts))
+        gini_yes = np.ones(len(yes_counts))
+        for label in range(no_counts.shape[1]):
+            gini_no -= (no_counts[:, label] / no_total) ** 2
+            gini_yes -= (yes_counts[:, label] / yes_total) ** 2
+        gini_no = np.where(no_total == 0, 0.0, gini_no)
+        gini_yes = np.where(yes_total == 0, 0.0, gini_yes)
+        return (yes_total / N) * gini_yes + (no_total / N) * gini_no
+
+
+def label_counts_for_thresholds(values: np.ndarray,
+                                label_codes: np.ndarray,
+                                thresholds: np.ndarray,
+                                num_labels: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    counts the labels on either side of every threshold in one pass: we sort the values once, keep a running count of
+    each label along the sorted order, and then look up where each threshold lands.
+    :param values: the value of one attribute for every row in the group
+    :param label_codes: the label code of every row in the group
+    :param thresholds: the thresholds to test; "yes" means value > threshold.
+    :param num_labels: how many different labels there are
+    :return: (no_counts, yes_counts) - each a (number of thresholds) x (number of labels) array.
+    """
+    order = np.argsort(values, kind="stable")
+    running_counts = np.zeros((len(values) + 1, num_labels), dtype=np.int64)
+    running_counts[1:] = np.cumsum(np.eye(num_labels, dtype=np.int64)[label_codes[order]], axis=0)
+
+    # everything up to (and including) the threshold is a "no."
+    num_no = np.searchsorted(values[order], thresholds, side="right")
+    no_counts = running_counts[num_no]
+    yes_counts = running_counts[-1] - no_counts
+    return no_counts, yes_counts
+
+
+def score_numeric_conditions(columns: Dict[str, np.ndarray],
+                             label_codes: np.ndarray,
+                             num_labels: int,
+                             attribute_names: Sequence[str],
+                             thresholds: Sequence[float]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    finds the gini index of every candidate condition "attribute > threshold" for a group, batching together all the
+    conditions that look at the same attribute.
+    :param columns: the values of each attribute for the rows in the group
+    :param label_codes: the label code of each row in the group
+    :param num_labels: how many different labels there are
+    :param attribute_names: the attribute for each candidate condition
+    :param thresholds: the threshold for each candidate condition
+    :return: (gini_indices, no_counts, yes_counts) - one row per candidate condition, in the order given.
+    """
+    attribute_names = np.asarray(attribute_names)
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    no_counts = np.zeros((len(thresholds), num_labels), dtype=np.int64)
+    yes_counts = np.zeros((len(thresholds), num_labels), dtype=np.int64)
+    for name in np.unique(attribute_names):
+        which = attribute_names == name
+        no_counts[which], yes_counts[which] = label_counts_for_thresholds(columns[str(name)],
+                                                                          label_codes,
+                                                                          thresholds[which],
+                                                                          num_labels)
+    return gini_indices_for_splits(no_counts, yes_counts), no_counts, yes_counts
+
+
+def score_category_conditions(codes: np.ndarray,
+                              label_codes: np.ndarray,
+                              num_labels: int,
+                              num_categories: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    finds the gini index of every condition "attribute == category" for a group, from one (category, label) count - a
+    one-hot count, rather than looking at the rows once per category.
+    :param codes: the category code of every row in the group
+    :param label_codes: the label code of every row in the group
+    :param num_labels: how many different labels there are
+    :param num_categories: how many different categories the attribute has
+    :return: (category_codes, gini_indices, no_counts, yes_counts) - one row per category that actually splits the group
+    (i.e., that some, but not all, of the rows have).
+    """
+    counts = np.bincount(codes * num_labels + label_codes,
+                         minlength=num_categories * num_labels).reshape(num_categories, num_labels)
+    total_counts = counts.sum(axis=0)
+    num_yes = counts.sum(axis=1)
+    useful = np.flatnonzero((num_yes > 0) & (num_yes < len(codes)))
+    yes_counts = counts[useful]
+    no_counts = total_counts - yes_counts
+    return useful, gini_indices_for_splits(no_counts, yes_counts), no_counts, yes_counts
+
+
+def best_split_index(gini_indices: np.ndarray) -> Optional[int]:
+    """
+    :param gini_indices: the gini index of each candidate split
+    :return: the position of the lowest gini index (the first one, if there's a tie), or None if there are no candidates.
+    """
+    if len(gini_indices) == 0:
+        return None
+    return int(np.argmin(gini_indices))
+
+
+# =====================================================================================================================
+class SplitChoice:
+    """
+    the best way a splitter found to split a node: the condition to ask, its gini index, and how many of each label
+    end up on the "no" and "yes" sides.
+    """
+    def __init__(self, condition: NumericCondition, gini_index: float, no_counts: np.ndarray, yes_counts: np.ndarray,
+                 candidate_conditions: Optional[List[NumericCondition]] = None,
+                 candidate_no_counts: Optional[np.ndarray] = None):
+        self.condition = condition
+        self.gini_index = gini_index
+        self.no_counts = no_counts
+        self.yes_counts = yes_counts
+        # (optionally) all the conditions that were considered, and the "no" side label counts for each.
+        self.candidate_conditions = candidate_conditions
+        self.candidate_no_counts = candidate_no_counts
+
+
+class GenericSplitter(ABC):
+    """
+    A splitter does the bookkeeping for building a tree out of one ColumnarData: it decides which conditions a node
+    may choose from, finds the best of them, and divides the node's rows between its children. We won't instantiate
+    this directly. Known subclasses: GridSplitter, ExactSplitter, HistogramSplitter, SummedAreaSplitter
+    Every splitter also considers a CategoryCondition for each category of each categorical attribute (see
+    category_candidates).
+
+    Rather than making new lists of rows for every node, a splitter keeps arrays of row numbers for the whole dataset;
+    each node owns one [start, end) slice of them. Splitting a node rearranges its slice in place so that the "no" rows
+    come first and the "yes" rows after them - just like the partition step in quicksort - and each child then owns one
+    half of the parent's slice. So however deep the tree gets, we only hold a fixed number of row numbers per data point.
+    (A splitter may use some other handle for a node's rows, as long as it gives the same answers - see
+    SummedAreaSplitter, which sets keeps_rows to False because it never needs to know which rows a node holds.)
+    """
+    keeps_rows = True  # whether row_numbers can say which rows each node holds.
+
+    def __init__(self,
+                 data: ColumnarData,
+                 conditions_for_range: Callable[[Sequence[float]], List[NumericCondition]],
+                 conditions_for_values: Optional[Callable[[str, float, float], List[NumericCondition]]] = None):
+        """
+        :param data: the training data
+        :param conditions_for_range: makes the candidate conditions for a part of the map (for splitters that use them)
+        :param conditions_for_values: makes the candidate conditions for an attribute that isn't a map coordinate,
+        given the lowest and highest values it takes in a node (for splitters that use them)
+        """
+        self.data = data
+        self.conditions_for_range = conditions_for_range
+        self.conditions_for_values = conditions_for_values
+        self.index = np.arange(len(data))
+
+    def root(self) -> Tuple[int, int]:
+        """
+        :return: the (start, end) slice that holds every row - the rows for the root node.
+        """
+        return 0, len(self.index)
+
+    def row_numbers(self, rows: Tuple[int, int]) -> Optional[np.ndarray]:
+        """
+        :param rows: a node's (start, end) slice
+        :return: the row numbers in that slice. (This is a view into the shared array, not a copy.) None for a
+        splitter that doesn't keep track of which rows each node holds (see keeps_rows).
+        """
+        return self.index[rows[0]:rows[1]]
+
+    def label_counts(self, rows: Tuple[int, int]) -> np.ndarray:
+        """
+        :param rows: a node's (start, end) slice
+        :return: the number of rows in that slice with each label.
+        """
+        return np.bincount(self.data.label_codes[self.row_numbers(rows)], minlength=len(self.data.label_names))
+
+    def find_best_split(self, rows: Tuple[int, int], range: Sequence[float],
+                        label_counts: Optional[np.ndarray] = None) -> Optional[SplitChoice]:
+        """
+        :param rows: a node's (start, end) slice
+        :param range: (x_min, y_min, x_max, y_max) - the part of the map this node covers.
+        :param label_counts: the node's label counts, if we already know them (from its parent's split), so that they
+        needn't be counted again
+        :return: the split with the lowest gini index, or None if there is nothing to split on.
+        """
+        pass
+
+    def settings_for_worker(self) -> Dict[str, Any]:
+        """
+        :return: the keyword arguments that a splitter for a subset of this data (in a worker process) needs, so that it
+        chooses the same splits as this one would - anything the splitter worked out from all of the data at the start.
+        """
+        return {}
+
+    def forget(self, rows: Tuple[int, int]):
+        """
+        called when a node becomes a leaf, so the splitter can let go of anything it was keeping for this slice.
+        :param rows: a node's (start, end) slice
+        """
+        pass
+
+    def category_candidates(self, rows: Tuple[int, int]) -> Tuple[List[CategoryCondition], np.ndarray]:
+        """
+        finds the "attribute == category" conditions that would split this slice, for every categorical attribute.
+        :param rows: a node's (start, end) slice
+        :return: the conditions, and a (number of conditions) x (number of labels) array of the "no" side label counts.
+        """
+        row_numbers = self.row_numbers(rows)
+        num_labels = len(self.data.label_names)
+        conditions: List[CategoryCondition] = []
+        all_no_counts = [np.zeros((0, num_labels), dtype=np.int64)]
+        for name, categories in self.data.categories.items():
+            category_codes, _, no_counts, _ = score_category_conditions(self.data.columns[name][row_numbers],
+                                                                        self.data.label_codes[row_numbers],
+                                                                        num_labels,
+                                                                        len(categories))
+            conditions += [CategoryCondition(name, categories[code]) for code in category_codes]
+            all_no_counts.append(no_counts)
+        return conditions, np.concatenate(all_no_counts)
+
+    def choose_best(self,
+                    rows: Tuple[int, int],
+                    conditions: List[GenericCondition],
+                    no_counts: np.ndarray,
+                    keep_candidates: bool = False,
+                    label_counts: Optional[np.ndarray] = None) -> Optional[SplitChoice]:
+        """
+        adds the category conditions to the given candidates, and picks the one with the lowest gini index (the first
+        one, if it's a tie).
+        :param rows: a node's (start, end) slice
+        :param conditions: the numeric candidate conditions
+        :param no_counts: the "no" side label counts for each of them
+        :param keep_candidates: whether the SplitChoice should keep the whole list of candidates
+        :param label_counts: the slice's label counts, if the caller already knows them
+        :return: the best split, or None if there were no candidates at all.
+        """
+        if len(self.data.categories) > 0:
+            category_conditions, category_no_counts = self.category_candidates(rows)
+            conditions = list(conditions) + category_conditions
+            no_counts = np.concatenate((no_counts.reshape(-1, len(self.data.label_names)), category_no_counts))
+        if len(conditions) == 0:
+            return None
+        if label_counts is None:
+            label_counts = self.label_counts(rows)
+        # each "yes" side is whatever the "no" side didn't get - no need to count it.
+        yes_counts = label_counts - no_counts
+        gini_indices = gini_indices_for_splits(no_counts, yes_counts)
+        best_index = best_split_index(gini_indices)
+        return SplitChoice(conditions[best_index],
+                           gini_indices[best_index],
+                           no_counts[best_index],
+                           yes_counts[best_index],
+                           candidate_conditions=conditions if keep_candidates else None,
+                           candidate_no_counts=no_counts if keep_candidates else None)
+
+    def partition(self, rows: Tuple[int, int], condition: GenericCondition) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+        """
+        rearranges this slice so that the rows that fail the condition come before the rows that meet it.
+        :param rows: a node's (start, end) slice
+        :param condition: the condition to split by
+        :return: the (start, end) slices for the "no" rows and the "yes" rows.
+        """
+        start, end = rows
+        segment = self.index[start:end]
+        yes_mask = self.data.answers(condition, segment)
+        middle = start + int(np.count_nonzero(~yes_mask))
+        # the scratch copies here are the size of this one node, and they are gone before we move on to the children.
+        segment[:] = np.concatenate((segment[~yes_mask], segment[yes_mask]))
+        return (start, middle), (middle, end)
+
+
+class GridSplitter(GenericSplitter):
+    """
+    chooses among the evenly spaced conditions from DecisionTree.build_conditions_for_range - this is the original way
+    of building the tree. Any other numeric attributes get evenly spaced conditions between their lowest and highest
+    values in the node, from conditions_for_values.
+    """
+    def score_conditions(self, rows: Tuple[int, int], condition_list: List[NumericCondition]) \
+            -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        finds the gini index of each of the given conditions for the rows in this slice.
+        :param rows: a node's (start, end) slice
+        :param condition_list: the candidate conditions
+        :return: (gini_indices, no_counts, yes_counts) - one row per condition, in the order given.
+        """
+        row_numbers = self.row_numbers(rows)
+        attribute_names = [condition.attribute_name for condition in condition_list]
+        return score_numeric_conditions({name: self.data.columns[name][row_numbers] for name in set(attribute_names)},
+                                        self.data.label_codes[row_numbers],
+                                        len(self.data.label_names),
+                                        attribute_names,
+                                        [condition.threshold_value for condition in condition_list])
+
+    def find_best_split(self, rows: Tuple[int, int], range: Sequence[float],
+                        label_counts: Optional[np.ndarray] = None) -> Optional[SplitChoice]:
+        numeric_names = self.data.numeric_names()
+        condition_list = [condition for condition in self.conditions_for_range(range)
+                          if condition.attribute_name in numeric_names]
+        if self.conditions_for_values is not None:
+            row_numbers = self.row_numbers(rows)
+            for name in numeric_names:
+                if name not in MAP_ATTRIBUTE_NAMES and len(row_numbers) > 0:
+                    values = self.data.columns[name][row_numbers]
+                    condition_list += self.conditions_for_values(name, values.min().item(), values.max().item())
+        # score every condition at once, and pick the one with the lowest gini index (the first one, if it's a tie).
+        _, no_counts, _ = self.score_conditions(rows, condition_list)
+        return self.choose_best(rows, condition_list, no_counts, keep_candidates=True, label_counts=label_counts)
+
+
+class ExactSplitter(GenericSplitter):
+    """
+    considers every possible split, rather than a fixed grid of them: for each attribute, a threshold halfway between
+    every pair of neighboring distinct values.
+
+    To do this without sorting at every node, we sort the rows by each attribute just once, at the start, and keep one
+    array of row numbers per attribute. When a node is split, each of those arrays has the node's slice partitioned
+    stably, so that every child's slice is still in sorted order. A node can then scan its slice from left to right,
+    keeping running counts of the labels, and score every threshold in one pass - O(N) per node per attribute.
+    """
+    def __init__(self,
+                 data: ColumnarData,
+                 conditions_for_range: Callable[[Sequence[float]], List[NumericCondition]],
+                 conditions_for_values: Optional[Callable[[str, float, float], List[NumericCondition]]] = None):
+        super(ExactSplitter, self).__init__(data, conditions_for_range, conditions_for_values)
+        self.sorted_index = {name: np.argsort(data.columns[name], kind="stable") for name in data.numeric_names()}
+        if len(self.sorted_index) > 0:
+            # any one of the sorted arrays will do as this node's list of rows.
+            self.index = next(iter(self.sorted_index.values()))
+        self.goes_yes = np.zeros(len(data), dtype=bool)
+
+    def find_best_split(self, rows: Tuple[int, int], range: Sequence[float],
+                        label_counts: Optional[np.ndarray] = None) -> Optional[SplitChoice]:
+        start, end = rows
+        num_labels = len(self.data.label_names)
+        conditions: List[NumericCondition] = []
+        all_no_counts = [np.zeros((0, num_labels), dtype=np.int64)]
+        for name, sorted_rows in self.sorted_index.items():
+            segment = sorted_rows[start:end]
+            values = self.data.columns[name][segment]
+            running_counts = np.cumsum(np.eye(num_labels, dtype=np.int64)[self.data.label_codes[segment]], axis=0)
+
+            # a split can go after position i whenever the next value is different.
+            split_after = np.flatnonzero(values[:-1] < values[1:])
+            thresholds = (values[split_after] + values[split_after + 1]) / 2
+            conditions += [NumericCondition(name, float(threshold)) for threshold in thresholds]
+            all_no_counts.append(running_counts[split_after])
+        return self.choose_best(rows, conditions, np.concatenate(all_no_counts), label_counts=label_counts)
+
+    def partition(self, rows: Tuple[int, int], condition: GenericCondition) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+        if len(self.sorted_index) == 0:
+            # with only categorical attributes, there are no sorted arrays - just the plain index to partition.
+            return super(ExactSplitter, self).partition(rows, condition)
+        start, end = rows
+        segment = self.index[start:end]
+        self.goes_yes[segment] = self.data.answers(condition, segment)
+        middle = start + int(np.count_nonzero(~self.goes_yes[segment]))
+        for sorted_rows in self.sorted_index.values():
+            segment = sorted_rows[start:end]
+            yes_mask = self.goes_yes[segment]
+            # a stable partition, so each half stays in sorted order.
+            segment[:] = np.concatenate((segment[~yes_mask], segment[yes_mask]))
+        return (start, middle), (middle, end)
+
+
+class HistogramSplitter(GenericSplitter):
+    """
+    for very large datasets: each attribute is divided once, at the start, into at most MAX_HISTOGRAM_BINS bins (with
+    about the same number of rows in each), and each row's value is replaced by its one-byte bin number. A node's
+    candidate thresholds are the boundaries between bins, and it scores them all from a histogram of (bin, label) counts
+    rather than from the rows themselves.
+
+    We only ever count up a histogram for the smaller child of a split; the larger child's histogram is its parent's
+    minus its sibling's. So each level of the tree costs about O(N) however many thresholds there are.
+    """
+    def __init__(self,
+                 data: ColumnarData,
+                 conditions_for_range: Callable[[Sequence[float]], List[NumericCondition]],
+                 conditions_for_values: Optional[Callable[[str, float, float], List[NumericCondition]]] = None,
+                 bin_edges: Optional[Dict[str, np.ndarray]] = None):
+        """
+        :param bin_edges: optional - the bin edges for each numeric attribute, e.g. from the splitter for the whole
+        training data when this one is for part of it (see settings_for_worker). By default, they come from this data.
+        """
+        super(HistogramSplitter, self).__init__(data, conditions_for_range, conditions_for_values)
+        self.num_labels = len(data.label_names)
+        self.bin_edges: Dict[str, np.ndarray] = {}
+        self.bin_codes: Dict[str, np.ndarray] = {}
+        for name in data.numeric_names():
+            column = data.columns[name]
+            if bin_edges is not None:
+                edges = bin_edges[name]
+            else:
+                distinct_values = np.unique(column)
+                if len(distinct_values) <= MAX_HISTOGRAM_BINS:
+                    edges = (distinct_values[:-1] + distinct_values[1:]) / 2
+                else:
+                    edges = np.unique(np.quantile(column, np.arange(1, MAX_HISTOGRAM_BINS) / MAX_HISTOGRAM_BINS))
+            self.bin_edges[name] = edges
+            # a row's bin is the number of edges below its value, so "value > edges[b]" is the same as "bin > b".
+            self.bin_codes[name] = np.searchsorted(edges, column, side="left").astype(np.uint8)
+        self.histograms: Dict[Tuple[int, int], np.ndarray] = {self.root(): self.histogram_for_rows(self.root())}
+
+    def histogram_for_rows(self, rows: Tuple[int, int]) -> np.ndarray:
+        """
+        counts the rows in this slice by bin and label, the slow way.
+        :param rows: a node's (start, end) slice
+        :return: an (attribute, bin, label) array of counts, with attributes in data.columns order.
+        """
+        row_numbers = self.row_numbers(rows)
+        label_codes = self.data.label_codes[row_numbers]
+        if len(self.bin_codes) == 0:
+            # with no numeric attributes, we still keep one histogram (with everything in bin 0) for the label counts.
+            histogram = np.zeros((1, MAX_HISTOGRAM_BINS, self.num_labels), dtype=np.int64)
+            histogram[0, 0] = np.bincount(label_codes, minlength=self.num_labels)
+            return histogram
+        return np.stack([np.bincount(codes[row_numbers].astype(np.int64) * self.num_labels + label_codes,
+                                     minlength=MAX_HISTOGRAM_BINS * self.num_labels)
+                         .reshape(MAX_HISTOGRAM_BINS, self.num_labels)
+                         for codes in self.bin_codes.values()])
+
+    def settings_for_worker(self) -> Dict[str, Any]:
+        # a subset's own quantiles would give it different bins (and so different thresholds) from the whole data's.
+        return {"bin_edges": self.bin_edges}
+
+    def forget(self, rows: Tuple[int, int]):
+        self.histograms.pop(rows, None)
+
+    def find_best_split(self, rows: Tuple[int, int], range: Sequence[float],
+                        label_counts: Optional[np.ndarray] = None) -> Optional[SplitChoice]:
+        histogram = self.histograms.pop(rows)
+        total_counts = histogram[0].sum(axis=0)
+        conditions: List[NumericCondition] = []
+        all_no_counts = [np.zeros((0, self.num_labels), dtype=np.int64)]
+        for name, attribute_histogram in zip(self.bin_codes.keys(), histogram):
+            edges = self.bin_edges[name]
+            no_counts = np.cumsum(attribute_histogram, axis=0)[:len(edges)]
+            # only keep the boundaries that actually put some rows on each side.
+            num_no = no_counts.sum(axis=1)
+            useful = np.flatnonzero((num_no > 0) & (num_no < total_counts.sum()))
+            conditions += [NumericCondition(name, float(edges[b])) for b in useful]
+            all_no_counts.append(no_counts[useful])
+        # put this back until the node is partitioned, since the children's histograms are worked out from it.
+        self.histograms[rows] = histogram
+        return self.choose_best(rows, conditions, np.concatenate(all_no_counts), label_counts=label_counts)
+
+    def partition(self, rows: Tuple[int, int], condition: GenericCondition) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+        no_rows, yes_rows = super(HistogramSplitter, self).partition(rows, condition)
+        parent_histogram = self.histograms.pop(rows)
+        if no_rows[1] - no_rows[0] <= yes_rows[1] - yes_rows[0]:
+            smaller, larger = no_rows, yes_rows
+        else:
+            smaller, larger = yes_rows, no_rows
+        self.histograms[smaller] = self.histogram_for_rows(smaller)
+        self.histograms[larger] = parent_histogram - self.histograms[smaller]
+        return no_rows, yes_rows
+
+
+class SummedAreaSplitter(GenericSplitter):
+    """
+    makes the same tree as the GridSplitter, for data that has just x and y, but without looking at the points once the
+    table below is made. Each of the grid's conditions cuts the node's rectangle of the map in two, so the label counts
+    on either side are just the counts in two smaller rectangles.
+
+    At the start, we count the points of each label in each pixel of the map, and add those counts up into a
+    "summed-area table" (or integral image): table[label, j, i] is the number of points with that label in all the
+    pixels above and to the left of pixel (i, j). The count in any rectangle then takes four lookups, however many
+    points are in it. So rather than a slice of rows, each node is just the (left, top, right, bottom) rectangle of
+    pixels it covers: scoring a candidate condition takes four lookups, and splitting a node is cutting its rectangle in
+    two - nothing per node depends on how many points there are. (Which means the leaves don't know which rows they
+    hold, so their sample_ids are None, and trees built this way can't be updated.)
+
+    A point's pixel is its coordinate rounded up, so that "x > t" for a whole-number t is the same as "pixel > t". That
+    means the conditions' thresholds must be whole numbers - as they are when the tree's bounds are.
+    """
+    keeps_rows = False
+
+    def __init__(self,
+                 data: ColumnarData,
+                 conditions_for_range: Callable[[Sequence[float]], List[NumericCondition]],
+                 conditions_for_values: Optional[Callable[[str, float, float], List[NumericCondition]]] = None):
+        super(SummedAreaSplitter, self).__init__(data, conditions_for_range, conditions_for_values)
+        if set(data.columns.keys()) != set(MAP_ATTRIBUTE_NAMES):
+            raise ValueError(f"The summed_area splitter only works on {list(MAP_ATTRIBUTE_NAMES)}, not "
+                             f"{list(data.columns.keys())}.")
+        self.index = None  # (no rows to keep track of.)
+        self.num_labels = len(data.label_names)
+        pixel_x = np.ceil(data.columns["x"]).astype(np.int64)
+        pixel_y = np.ceil(data.columns["y"]).astype(np.int64)
+        # the pixel at the top left corner of the table (so that it only covers the pixels that have points in them).
+        self.origin = (int(pixel_x.min()), int(pixel_y.min())) if len(data) > 0 else (0, 0)
+        self.width = int(pixel_x.max()) - self.origin[0] + 1 if len(data) > 0 else 0
+        self.height = int(pixel_y.max()) - self.origin[1] + 1 if len(data) > 0 else 0
+        # (label codes may be as small as int8 - widen them before they become positions in the table.)
+        label_codes = data.label_codes.astype(np.int64)
+        pixel_counts = np.bincount((label_codes * self.height + (pixel_y - self.origin[1])) * self.width +
+                                   (pixel_x - self.origin[0]),
+                                   minlength=self.num_labels * self.height * self.width)
+        # one row and column of zeros on the top and left, so that a rectangle starting at the edge needs no special case.
+        self.table = np.zeros((self.num_labels, self.height + 1, self.width + 1),
+                              dtype=np.int32 if len(data) < 2 ** 31 else np.int64)
+        pixel_counts = pixel_counts.reshape(self.num_labels, self.height, self.width)
+        self.table[:, 1:, 1:] = pixel_counts.cumsum(axis=1).cumsum(axis=2)
+
+    def root(self) -> Tuple[int, int, int, int]:
+        """
+        :return: the pixel rectangle (in table coordinates, with right and bottom not included) that holds every row.
+        """
+        return 0, 0, self.width, self.height
+
+    def row_numbers(self, rows: Tuple[int, int, int, int]) -> None:
+        return None
+
+    def counts_in_rectangles(self, left: np.ndarray, top: np.ndarray, right: np.ndarray, bottom: np.ndarray) \
+            -> np.ndarray:
+        """
+        :return: a (number of rectangles) x (number of labels) array of the label counts in each of the given pixel
+        rectangles (in table coordinates, with right and bottom not included).
+        """
+        counts = (self.table[:, bottom, right] - self.table[:, top, right] -
+                  self.table[:, bottom, left] + self.table[:, top, left])
+        return counts.T.astype(np.int64)
+
+    def label_counts(self, rows: Tuple[int, int, int, int]) -> np.ndarray:
+        return self.counts_in_rectangles(*np.array([rows]).T)[0]
+
+    def cut(self, rows: Tuple[int, int, int, int], condition: NumericCondition) \
+            -> Tuple[Tuple[int, int, int, int], Tuple[int, int, int, int]]:
+        """
+        :return: the pixel rectangles of the "no" and "yes" sides of the condition, within this node's rectangle.
+        """
+        left, top, right, bottom = rows
+        if condition.threshold_value != int(condition.threshold_value):
+            raise ValueError(f"The summed_area splitter needs whole-number thresholds, not {condition}.")
+        if condition.attribute_name == "x":
+            # the first pixel that says "yes", kept within the rectangle.
+            first_yes = min(max(int(condition.threshold_value) + 1 - self.origin[0], left), right)
+            return (left, top, first_yes, bottom), (first_yes, top, right, bottom)
+        first_yes = min(max(int(condition.threshold_value) + 1 - self.origin[1], top), bottom)
+        return (left, top, right, first_yes), (left, first_yes, right, bottom)
+
+    def find_best_split(self, rows: Tuple[int, int, int, int], range: Sequence[float],
+                        label_counts: Optional[np.ndarray] = None) -> Optional[SplitChoice]:
+        condition_list = self.conditions_for_range(range)
+        if len(condition_list) == 0:
+            return None
+        no_rectangles = np.array([self.cut(rows, condition)[0] for condition in condition_list])
+        no_counts = self.counts_in_rectangles(*no_rectangles.T)
+        return self.choose_best(rows, condition_list, no_counts, keep_candidates=True, label_counts=label_counts)
+
+    def partition(self, rows: Tuple[int, int, int, int], condition: GenericCondition) \
+            -> Tuple[Tuple[int, int, int, int], Tuple[int, int, int, int]]:
+        return self.cut(rows, condition)
+
+
+SPLITTERS: Dict[str, Type[GenericSplitter]] = {"grid": GridSplitter, "exact": ExactSplitter, "histogram": HistogramSplitter,
+                                               "summed_area": SummedAreaSplitter}
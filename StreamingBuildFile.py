@@ -0,0 +1,199 @@
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from AnswerGroupFile import AnswerGroup, AnswerGroupTable
+from ConditionFile import NumericCondition
+from DecisionTree import DecisionTree, MAX_DEPTH, MIN_ITEMS_PER_BRANCH_NODE
+from NodeFile import GenericNode, BranchNode, LeafNode
+from SplitEngineFile import ColumnarData, gini_indices_for_splits, best_split_index
+
+NOT_OPEN = -1  # the "open node" number for a node that has already been decided.
+
+
+class OpenNode:
+    """
+    a node on the growing edge of a tree being built by StreamingTreeBuilder - we know which part of the map it covers
+    and which conditions it may choose from, but we haven't seen its data yet. As chunks stream past, it keeps a
+    histogram of its points' labels for each attribute, binned by that attribute's thresholds.
+    """
+    def __init__(self, node_id: int, range: Tuple[float, float, float, float], depth: int,
+                 conditions: List[NumericCondition], num_labels: int, attach: Callable[[GenericNode], None]):
+        self.node_id = node_id  # where this node is in the builder's node arrays.
+        self.range = range
+        self.depth = depth
+        self.conditions = conditions
+        self.num_labels = num_labels
+        self.attach = attach  # sets this node into its parent (or as the root), once we know what it is.
+        self.attribute_names = sorted({condition.attribute_name for condition in conditions})
+        self.thresholds = {name: np.array(sorted({condition.threshold_value for condition in conditions
+                                                  if condition.attribute_name == name}), dtype=np.float64)
+                           for name in self.attribute_names}
+        self.histograms = {name: np.zeros((len(thresholds) + 1, num_labels), dtype=np.int64)
+                           for name, thresholds in self.thresholds.items()}
+        self.label_counts = np.zeros(num_labels, dtype=np.int64)
+
+    def add_points(self, data: ColumnarData, row_numbers: np.ndarray):
+        """
+        counts the given rows of a chunk into this node's histograms.
+        """
+        label_codes = data.label_codes[row_numbers]
+        self.label_counts += np.bincount(label_codes, minlength=self.num_labels)
+        for name, thresholds in self.thresholds.items():
+            # a point's bin is how many thresholds are below its value - i.e., how many of the conditions it says
+            # "yes" to.
+            bins = np.searchsorted(thresholds, data.columns[name][row_numbers], side="left")
+            self.histograms[name] += np.bincount(bins * self.num_labels + label_codes,
+                                                 minlength=self.histograms[name].size).reshape(self.histograms[name].shape)
+
+    def count_conditions(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: (no_counts, yes_counts) - the label counts on each side of each of this node's conditions, in order.
+        """
+        no_counts = np.zeros((len(self.conditions), self.num_labels), dtype=np.int64)
+        running_counts = {name: np.cumsum(histogram, axis=0) for name, histogram in self.histograms.items()}
+        for i, condition in enumerate(self.conditions):
+            position = np.searchsorted(self.thresholds[condition.attribute_name], condition.threshold_value)
+            no_counts[i] = running_counts[condition.attribute_name][position]
+        return no_counts, self.label_counts - no_counts
+
+
+class StreamingTreeBuilder:
+    """
+    builds a DecisionTree from data that comes in chunks - from a file on disk, or from a generator like
+    DecisionTree3Main.generate_data_chunks - so that the whole dataset never has to be in memory at once.
+
+    The tree is built breadth-first, one level at a time. For each level we stream through all the data once: each
+    chunk is sent down the tree built so far to find which open node each point belongs to, and each open node adds its
+    points to its label counts for each of the conditions from build_conditions_for_range. Once the pass is over, each
+    open node has everything it needs to become a LeafNode or pick its best condition and become a BranchNode. So the
+    memory used is one chunk, plus a few counts per condition per open node, and the tree is the same one that
+    build_tree would have made with the grid splitter.
+    """
+    def __init__(self, tree: DecisionTree):
+        self.tree = tree
+        self.start_over()
+
+    def start_over(self):
+        # the tree so far, as parallel lists (like a CompiledTree), so that we can send whole chunks down it. A node
+        # that is still open has feature -1 and its position in open_nodes in open_number.
+        self.feature: List[int] = []
+        self.threshold: List[float] = []
+        self.yes_child: List[int] = []
+        self.no_child: List[int] = []
+        self.open_number: List[int] = []
+        self.open_nodes: List[OpenNode] = []
+        self.root: Optional[GenericNode] = None
+
+    def build(self,
+              chunk_source: Callable[[], Iterable[List[AnswerGroup]|AnswerGroupTable]],
+              bounds: List[int]|Tuple[int, int, int, int]):
+        """
+        builds the tree, setting its decision_tree_root.
+        :param chunk_source: called once per level of the tree; each call should return a fresh iterator over the same
+        chunks of labeled data. (e.g., lambda: (table for table, _ in generate_data_chunks(N, 10000, rng=SEED)))
+        :param bounds: (x_min, y_min, x_max, y_max) - the part of the map the data comes from.
+        """
+        tree = self.tree
+        self.start_over()
+        tree.max_depth_used = 0
+        tree.bounds = tuple(bounds)
+        # the data never sits in memory all at once, so there is nothing for update to rebuild from.
+        tree.updatable = False
+        tree.training_data = None
+        self.add_open_node(tuple(bounds), 0, self.set_root)
+
+        while len(self.open_nodes) > 0:
+            # one pass through the data, counting each point into the open node it reaches.
+            node_arrays = (np.array(self.feature), np.array(self.threshold),
+                           np.array(self.yes_child), np.array(self.no_child))
+            open_number = np.array(self.open_number)
+            for chunk in chunk_source():
+                data = ColumnarData.from_answer_groups(chunk, tree.feature_names, tree.label_names)
+                if len(data.label_names) != len(tree.label_names):
+                    raise ValueError(f"Found labels other than {tree.label_names} in the training data.")
+                node_for_point = self.route(data, *node_arrays)
+                order = np.argsort(node_for_point, kind="stable")
+                node_ids, starts = np.unique(node_for_point[order], return_index=True)
+                ends = np.append(starts[1:], len(order))
+                for node_id, start, end in zip(node_ids, starts, ends):
+                    if open_number[node_id] != NOT_OPEN:  # (points that reach a finished leaf are done.)
+                        self.open_nodes[open_number[node_id]].add_points(data, order[start:end])
+
+            # now decide what each open node should be; its children (if any) are the next level's open nodes.
+            level = self.open_nodes
+            self.open_nodes = []
+            for node in level:
+                self.open_number[node.node_id] = NOT_OPEN
+                self.decide(node)
+        tree.decision_tree_root = self.root
+
+    def set_root(self, node: GenericNode):
+        self.root = node
+
+    def add_open_node(self, range: Tuple[float, float, float, float], depth: int,
+                      attach: Callable[[GenericNode], None]) -> OpenNode:
+        """
+        adds a node whose data we will count on the next pass.
+        :param range: (x_min, y_min, x_max, y_max) - the part of the map this node covers.
+        :param depth: the depth in the tree where this node will go
+        :param attach: sets this node into its parent, once we know what it is.
+        :return: the new OpenNode
+        """
+        node = OpenNode(len(self.feature), range, depth, self.tree.build_conditions_for_range(range),
+                        len(self.tree.label_names), attach)
+        self.feature.append(-1)
+        self.threshold.append(0.0)
+        self.yes_child.append(-1)
+        self.no_child.append(-1)
+        self.open_number.append(len(self.open_nodes))
+        self.open_nodes.append(node)
+        return node
+
+    def decide(self, node: OpenNode):
+        """
+        turns an open node whose data has all been counted into a LeafNode or a BranchNode, adding any children to the
+        next level of open nodes.
+        """
+        tree = self.tree
+        N = int(node.label_counts.sum())
+        if (node.depth == MAX_DEPTH or
+                N < MIN_ITEMS_PER_BRANCH_NODE or
+                len(node.conditions) == 0 or
+                np.count_nonzero(node.label_counts) <= 1):
+            # ties go to the first label (i.e., "land").
+            leaf = LeafNode(tree.label_names[int(np.argmax(node.label_counts))], depth=node.depth)
+            leaf.label_counts = node.label_counts
+            node.attach(leaf)
+            tree.max_depth_used = max(tree.max_depth_used, node.depth)
+            return
+
+        no_counts, yes_counts = node.count_conditions()
+        best_condition = node.conditions[best_split_index(gini_indices_for_splits(no_counts, yes_counts))]
+        branch = BranchNode(best_condition, depth=node.depth)
+        branch.label_counts = node.label_counts
+        node.attach(branch)
+
+        no_range, yes_range = tree.split_range(node.range, best_condition)
+        self.feature[node.node_id] = tree.feature_names.index(best_condition.attribute_name)
+        self.threshold[node.node_id] = best_condition.threshold_value
+        self.yes_child[node.node_id] = self.add_open_node(yes_range, node.depth + 1, branch.set_yes_node).node_id
+        self.no_child[node.node_id] = self.add_open_node(no_range, node.depth + 1, branch.set_no_node).node_id
+
+    def route(self, data: ColumnarData, feature: np.ndarray, threshold: np.ndarray, yes_child: np.ndarray,
+              no_child: np.ndarray) -> np.ndarray:
+        """
+        sends every point in a chunk down the tree built so far, until it reaches an open node or a leaf.
+        :return: the id of the node each point ends up in.
+        """
+        X = np.column_stack([data.columns[name] for name in self.tree.feature_names])
+        node = np.zeros(len(X), dtype=np.int64)
+        still_moving = np.arange(len(X))
+        while len(still_moving) > 0:
+            current = node[still_moving]
+            at_branch = feature[current] != -1
+            still_moving = still_moving[at_branch]
+            current = current[at_branch]
+            answer_is_yes = X[still_moving, feature[current]] > threshold[current]
+            node[still_moving] = np.where(answer_is_yes, yes_child[current], no_child[current])
+        return node